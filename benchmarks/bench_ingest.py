@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+WIN NOC - Benchmark de la ingesta de métricas en lote
+Envía cuerpos NDJSON y MessagePack a POST /api/metrics/batch con el test
+client de Flask (decodificación, validación y aplicación en un solo
+worker) y reporta muestras por segundo.
+
+Objetivo: más de 100k muestras/s por worker.
+
+Uso:
+    python benchmarks/bench_ingest.py --devices 20000 --samples 200000
+    python benchmarks/bench_ingest.py --formats ndjson --invalid 0.05
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+# Servidor sin persistencia y con historial acotado (ver bench_load.py)
+os.environ.update({
+    'NOC_PERSISTENCE': '0',
+    'NOC_HISTORY_CAPACITY': '360',
+    'NOC_ROLLUP_RETENTION': '{"minute": 60, "hour": 24, "day": 7, "week": 0, "month": 0}',
+})
+
+import win_noc_server  # noqa: E402
+from noc import ingest, seed  # noqa: E402
+
+CONTENT_TYPES = {'ndjson': 'application/x-ndjson', 'msgpack': 'application/msgpack'}
+
+
+def build_samples(n, first_id, devices, start, invalid, rng):
+    samples = []
+    for k in range(n):
+        sample = {'device_id': rng.randint(first_id, first_id + devices - 1),
+                  'cpu': rng.randint(0, 100), 'memory': rng.randint(0, 100),
+                  'timestamp': start + k * 10 // devices}
+        if invalid and rng.random() < invalid:
+            sample['cpu'] = 'n/a'
+        samples.append(sample)
+    return samples
+
+
+def encode(samples, fmt):
+    if fmt == 'ndjson':
+        return '\n'.join(json.dumps(sample) for sample in samples).encode('utf-8')
+    return b''.join(ingest.msgpack.packb(sample) for sample in samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de POST /api/metrics/batch')
+    parser.add_argument('--devices', type=int, default=20_000)
+    parser.add_argument('--samples', type=int, default=200_000, help='muestras por request')
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--formats', nargs='*', default=['ndjson', 'msgpack'], choices=sorted(CONTENT_TYPES))
+    parser.add_argument('--invalid', type=float, default=0.0, help='fracción de muestras inválidas')
+    args = parser.parse_args()
+    if 'msgpack' in args.formats and ingest.msgpack is None:
+        print('msgpack no está instalado; sólo se mide NDJSON')
+        args.formats = [fmt for fmt in args.formats if fmt != 'msgpack']
+
+    first_id = win_noc_server.fleet.next_id()
+    columns = seed.device_columns(args.devices, first_id, np.random.default_rng(0))
+    with win_noc_server.write_lock:
+        win_noc_server.fleet.add_many(**columns)
+        win_noc_server.publish_changes('devices', invalidate=True)
+    client = win_noc_server.app.test_client()
+    rng = random.Random(0)
+    start = int(time.time())
+
+    print(f"{args.samples:,} muestras por request sobre {args.devices:,} dispositivos\n")
+    for fmt in args.formats:
+        rates = []
+        for _ in range(args.rounds):
+            body = encode(build_samples(args.samples, first_id, args.devices, start, args.invalid, rng), fmt)
+            start += args.samples * 10 // args.devices + 10
+            t0 = time.perf_counter()
+            result = client.post('/api/metrics/batch', data=body, content_type=CONTENT_TYPES[fmt]).get_json()
+            elapsed = time.perf_counter() - t0
+            rates.append(args.samples / elapsed)
+        print(f"  {fmt:<8} {np.median(rates):>12,.0f} muestras/s (mediana de {args.rounds}), "
+              f"{len(body) / args.samples:.0f} bytes/muestra, "
+              f"aceptadas {result['accepted']:,}, rechazadas {result['rejected']:,}")
+
+
+if __name__ == '__main__':
+    main()
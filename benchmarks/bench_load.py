@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+WIN NOC - Benchmark de carga y latencia de la API
+Siembra el servidor con POST /api/simulate/bulk-seed y luego recorre los
+endpoints GET con clientes concurrentes; reporta throughput y p50/p95/p99
+por endpoint y guarda el resultado en JSON (con el commit) para comparar
+entre versiones.
+
+El historial en memoria reserva ``capacidad * 9`` bytes por dispositivo
+más sus rollups (con la configuración por defecto ~190 KB por dispositivo),
+así que el servidor se levanta con ``--history-capacity`` y
+``--rollup-retention`` reducidos para que 1M de dispositivos quepa en RAM.
+
+Destinos:
+    testclient   el servidor en este proceso con el test client de Flask
+    gunicorn     un proceso gunicorn local (1 worker gthread: el estado vive
+                 en memoria del worker)
+    http://...   un servidor ya en ejecución
+
+Uso:
+    python benchmarks/bench_load.py --devices 10000 --incidents 100000
+    python benchmarks/bench_load.py --target gunicorn --devices 100000 --clients 16
+    python benchmarks/bench_load.py --devices 1000000 --incidents 1000000 --skip devices
+    python benchmarks/bench_load.py --baseline benchmarks/results/<anterior>.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+# Historial acotado: 1 h de minutos, 1 día de horas y 1 semana de días
+DEFAULT_ROLLUP_RETENTION = '{"minute": 60, "hour": 24, "day": 7, "week": 0, "month": 0}'
+
+# Endpoints GET: nombre -> ruta ({device} / {incident} se eligen al azar)
+ENDPOINTS = {
+    'overview': '/api/dashboard/overview',
+    'devices': '/api/devices',
+    'device_history': '/api/devices/{device}/history',
+    'incidents_page': '/api/incidents?limit=50',
+    'incidents_filtered': '/api/incidents?status=open&sort=-created&limit=50',
+    'incident': '/api/incidents/{incident}',
+    'customers': '/api/customers',
+    'predict_network': '/api/predict/network?limit=100',
+    'analytics_incidents': '/api/analytics/incidents?days=30',
+}
+
+
+# ===== DESTINOS =====
+
+class TestClientTarget:
+    """El servidor importado en este proceso (sin persistencia)"""
+
+    name = 'testclient'
+
+    def __init__(self, env):
+        os.environ.update(env)
+        sys.path.insert(0, ROOT)
+        import win_noc_server
+        self.app = win_noc_server.app
+        self._local = threading.local()
+
+    def _client(self):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        return client
+
+    def get(self, path):
+        response = self._client().get(path)
+        return response.status_code, len(response.get_data())
+
+    def post(self, path, payload):
+        response = self._client().post(path, json=payload)
+        return response.status_code, response.get_json()
+
+    def close(self):
+        pass
+
+
+class HttpTarget:
+    """Un servidor HTTP (una sesión keep-alive por hilo)"""
+
+    name = 'http'
+
+    def __init__(self, base_url):
+        import requests
+        self._requests = requests
+        self.base_url = base_url.rstrip('/')
+        self._local = threading.local()
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = self._requests.Session()
+        return session
+
+    def get(self, path):
+        response = self._session().get(self.base_url + path, timeout=300)
+        return response.status_code, len(response.content)
+
+    def post(self, path, payload):
+        response = self._session().post(self.base_url + path, json=payload, timeout=3600)
+        return response.status_code, response.json()
+
+    def close(self):
+        pass
+
+
+class GunicornTarget(HttpTarget):
+    """gunicorn local con un worker gthread de ``threads`` hilos"""
+
+    name = 'gunicorn'
+
+    def __init__(self, threads, env):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        env = dict(os.environ, **env)
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--workers', '1', '--worker-class', 'gthread',
+             '--threads', str(threads), '--bind', f'127.0.0.1:{port}', '--timeout', '3600',
+             '--log-level', 'warning', 'win_noc_server:app'],
+            cwd=ROOT, env=env)
+        super().__init__(f'http://127.0.0.1:{port}')
+        deadline = time.time() + 60
+        while True:
+            try:
+                if self.get('/api/dashboard/overview')[0] == 200:
+                    break
+            except self._requests.ConnectionError:
+                pass
+            if self.process.poll() is not None or time.time() > deadline:
+                raise RuntimeError('gunicorn no inició')
+            time.sleep(0.2)
+
+    def close(self):
+        self.process.terminate()
+        self.process.wait(timeout=30)
+
+
+# ===== CARGA =====
+
+def drive(target, path, clients, requests, totals, rng_seed):
+    """``requests`` GET por cliente; retorna latencias (ms), errores, bytes y duración"""
+    def client(k):
+        rng = random.Random(rng_seed + k)
+        timings, errors, sizes, codes = [], 0, 0, {}
+        for _ in range(requests):
+            url = path.format(device=rng.randint(1, totals['devices']),
+                              incident=rng.randint(1, totals['incidents']))
+            start = time.perf_counter()
+            try:
+                status, size = target.get(url)
+            except Exception:
+                status, size = 'error', 0
+            timings.append((time.perf_counter() - start) * 1000)
+            codes[status] = codes.get(status, 0) + 1
+            errors += status != 200
+            sizes += size
+        return timings, errors, sizes, codes
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        results = list(pool.map(client, range(clients)))
+    elapsed = time.perf_counter() - start
+    timings = np.array([t for result in results for t in result[0]])
+    codes = {}
+    for result in results:
+        for status, count in result[3].items():
+            codes[str(status)] = codes.get(str(status), 0) + count
+    return {
+        'requests': int(timings.size),
+        'errors': sum(result[1] for result in results),
+        'status_codes': codes,
+        'throughput_rps': round(timings.size / elapsed, 1),
+        'p50_ms': round(float(np.percentile(timings, 50)), 3),
+        'p95_ms': round(float(np.percentile(timings, 95)), 3),
+        'p99_ms': round(float(np.percentile(timings, 99)), 3),
+        'max_ms': round(float(timings.max()), 3),
+        'mean_bytes': int(sum(result[2] for result in results) / max(1, timings.size)),
+    }
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                    cwd=ROOT, capture_output=True, text=True).stdout.strip())
+        return commit + ('-dirty' if dirty else '')
+    except OSError:
+        return None
+
+
+def compare(results, baseline_path, threshold):
+    """Imprimir la variación de p95 y throughput contra un resultado anterior"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    print(f"\nComparación contra {baseline['meta'].get('commit')} ({baseline_path}):")
+    differs = [key for key in ('target', 'devices', 'incidents', 'clients', 'history_capacity')
+               if baseline['meta'].get(key) != results['meta'].get(key)]
+    if differs:
+        print(f"  AVISO: la línea base difiere en {', '.join(differs)}; los números no son comparables")
+    regressions = 0
+    for name, current in results['endpoints'].items():
+        previous = baseline['endpoints'].get(name)
+        if not previous:
+            continue
+        p95 = (current['p95_ms'] / previous['p95_ms'] - 1) * 100 if previous['p95_ms'] else 0.0
+        rps = (current['throughput_rps'] / previous['throughput_rps'] - 1) * 100 \
+            if previous['throughput_rps'] else 0.0
+        flag = '  <-- REGRESIÓN' if p95 > threshold else ''
+        regressions += bool(flag)
+        print(f"  {name:<22} p95 {previous['p95_ms']:>9.2f} -> {current['p95_ms']:>9.2f} ms "
+              f"({p95:+6.1f}%)  rps {rps:+6.1f}%{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de carga de la API')
+    parser.add_argument('--target', default='testclient', help="testclient | gunicorn | http://host:puerto")
+    parser.add_argument('--devices', type=int, default=10_000)
+    parser.add_argument('--incidents', type=int, default=10_000)
+    parser.add_argument('--customers', type=int, default=1_000)
+    parser.add_argument('--clients', type=int, default=8, help='clientes concurrentes')
+    parser.add_argument('--requests', type=int, default=100, help='requests por cliente y endpoint')
+    parser.add_argument('--threads', type=int, default=8, help='hilos del worker gunicorn')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--history-capacity', type=int, default=360,
+                        help='muestras crudas por dispositivo (NOC_HISTORY_CAPACITY)')
+    parser.add_argument('--rollup-retention', default=DEFAULT_ROLLUP_RETENTION,
+                        help='JSON de buckets por rollup (NOC_ROLLUP_RETENTION)')
+    parser.add_argument('--only', nargs='*', choices=sorted(ENDPOINTS), help='endpoints a medir')
+    parser.add_argument('--skip', nargs='*', default=[], choices=sorted(ENDPOINTS))
+    parser.add_argument('--output', help='archivo JSON (por defecto benchmarks/results/)')
+    parser.add_argument('--baseline', help='resultado JSON anterior para comparar')
+    parser.add_argument('--threshold', type=float, default=20.0, help='% de aumento de p95 que se marca')
+    args = parser.parse_args()
+
+    env = {'NOC_PERSISTENCE': '0', 'NOC_HISTORY_CAPACITY': str(args.history_capacity),
+           'NOC_ROLLUP_RETENTION': args.rollup_retention}
+    if args.target == 'testclient':
+        target = TestClientTarget(env)
+    elif args.target == 'gunicorn':
+        target = GunicornTarget(args.threads, env)
+    else:
+        target = HttpTarget(args.target)
+
+    try:
+        start = time.perf_counter()
+        status, seeded = target.post('/api/simulate/bulk-seed', {
+            'devices': args.devices, 'incidents': args.incidents,
+            'customers': args.customers, 'seed': args.seed,
+        })
+        if status != 200:
+            raise SystemExit(f'Error en la carga masiva ({status}): {seeded}')
+        seed_seconds = time.perf_counter() - start
+        summary = seeded['summary']
+        totals = {'devices': summary['total_devices'], 'incidents': summary['total_incidents']}
+        print(f"[{target.name}] carga: {summary['total_devices']:,} dispositivos, "
+              f"{summary['total_incidents']:,} incidencias, {summary['total_customers']:,} clientes "
+              f"en {seed_seconds:.1f} s")
+        print(f"{args.clients} clientes x {args.requests} requests por endpoint\n")
+        print(f"  {'endpoint':<22}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+              f"{'errores':>9}{'bytes':>12}")
+
+        endpoints = {}
+        for name, path in ENDPOINTS.items():
+            if (args.only and name not in args.only) or name in args.skip:
+                continue
+            drive(target, path, args.clients, max(1, args.requests // 10), totals, args.seed)
+            result = drive(target, path, args.clients, args.requests, totals, args.seed + 1000)
+            endpoints[name] = dict(result, path=path)
+            print(f"  {name:<22}{result['throughput_rps']:>10.1f}{result['p50_ms']:>10.2f}"
+                  f"{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}{result['errors']:>9}"
+                  f"{result['mean_bytes']:>12,}")
+    finally:
+        target.close()
+
+    results = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'target': args.target,
+            'devices': totals['devices'],
+            'incidents': totals['incidents'],
+            'customers': summary['total_customers'],
+            'clients': args.clients,
+            'requests_per_client': args.requests,
+            'seed': args.seed,
+            'history_capacity': args.history_capacity if not args.target.startswith('http') else None,
+            'rollup_retention': args.rollup_retention if not args.target.startswith('http') else None,
+            'seed_seconds': round(seed_seconds, 3),
+        },
+        'endpoints': endpoints,
+    }
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        label = 'http' if args.target.startswith('http') else args.target
+        output = os.path.join(RESULTS_DIR, f"load-{label}-{results['meta']['commit'] or 'local'}-"
+                                           f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados guardados en {output}")
+
+    if args.baseline and compare(results, args.baseline, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+WIN NOC - Benchmark de memoria por registro
+Compara la representación anterior de dispositivos e incidencias (un
+diccionario por registro, con las cadenas que entrega SQLite o json.loads)
+con la compacta: columnas de FleetState y filas de IncidentStore. Reporta
+bytes por registro (tracemalloc), objetos seguidos por el GC y la duración
+de una recolección completa, y verifica que el JSON resultante sea
+idéntico.
+
+Uso:
+    python benchmarks/bench_memory.py --devices 1000000 --incidents 1000000
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from noc import seed  # noqa: E402
+from noc.codes import DEVICE_STATUSES  # noqa: E402
+from noc.fleet import FleetState  # noqa: E402
+from noc.incidents import IncidentRecord, IncidentStore, json_default, pack  # noqa: E402
+
+
+def device_dicts(n, rng):
+    columns = seed.device_columns(n, 1, rng)
+    return [
+        {'id': i, 'name': name, 'ip': ip, 'status': DEVICE_STATUSES[s],
+         'cpu': cpu, 'memory': memory, 'location': location}
+        for i, name, ip, s, cpu, memory, location in zip(
+            columns['ids'].tolist(), columns['names'], columns['ips'],
+            columns['status_codes'].tolist(), columns['cpu'].tolist(),
+            columns['memory'].tolist(), columns['locations'])
+    ]
+
+
+def incident_dicts(n, rng):
+    incidents = seed.incidents(n, rng)
+    for incident_id, incident in enumerate(incidents, 1):
+        incident['id'] = incident_id
+    return incidents
+
+
+def measure(payload, build, serialize):
+    """(bytes retenidos, objetos seguidos por el GC, ms de gc.collect) de
+    la estructura que ``build`` arma a partir del JSON decodificado;
+    ``serialize`` debe reproducir el mismo JSON"""
+    gc.collect()
+    tracked = len(gc.get_objects())
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    structure = build(json.loads(payload))
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    timings = []
+    for _ in range(3):
+        start = time.perf_counter()
+        gc.collect()
+        timings.append(time.perf_counter() - start)
+    tracked = max(0, len(gc.get_objects()) - tracked)
+    if serialize(structure) != payload:
+        raise AssertionError('El JSON de la representación compacta difiere')
+    return retained, tracked, np.median(timings) * 1000
+
+
+def report(label, n, results):
+    print(f"{label} ({n:,} registros)")
+    print(f"  {'':<22} {'bytes/reg':>10} {'objetos GC':>12} {'gc.collect':>12} {'ahorro':>8}")
+    before = results[0][1][0]
+    for name, (retained, tracked, collect_ms) in results:
+        print(f"  {name:<22} {retained / n:>10,.0f} {tracked:>12,} {collect_ms:>9.1f} ms "
+              f"{1 - retained / before:>8.0%}")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de memoria por registro')
+    parser.add_argument('--devices', type=int, default=200_000)
+    parser.add_argument('--incidents', type=int, default=200_000)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    # Cadenas independientes por registro, como al cargar desde SQLite
+    payload = json.dumps(device_dicts(args.devices, rng))
+    report('Dispositivos', args.devices, [
+        ('diccionarios', measure(payload, lambda devices: devices, json.dumps)),
+        ('FleetState', measure(payload, FleetState.from_devices,
+                               lambda fleet: json.dumps(fleet.snapshot().to_dicts()))),
+    ])
+
+    payload = json.dumps(incident_dicts(args.incidents, rng))
+    report('Incidencias', args.incidents, [
+        ('diccionarios', measure(payload, lambda incidents: incidents, json.dumps)),
+        ('filas compactas', measure(payload, lambda incidents: [pack(incident) for incident in incidents],
+                                    lambda rows: json.dumps(list(map(IncidentRecord, rows)),
+                                                            default=json_default))),
+        ('IncidentStore (+índices)', measure(payload, IncidentStore,
+                                             lambda store: json.dumps(list(store.values()),
+                                                                      default=json_default))),
+    ])
+
+if __name__ == '__main__':
+    main()
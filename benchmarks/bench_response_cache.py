@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+WIN NOC - Benchmark de la caché de respuestas por versión
+Compara GET /api/devices serializando en cada request (jsonify) contra un
+acierto de caché (cuerpo gzip ya comprimido) y una revalidación 304.
+
+Uso:
+    python benchmarks/bench_response_cache.py --devices 50000 --requests 50
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from flask import Flask, jsonify  # noqa: E402
+
+from bench_fleet_tick import build_fleet  # noqa: E402
+from noc.httpcache import ResponseCache  # noqa: E402
+
+
+def timed(client, path, requests, headers=None):
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = client.get(path, headers=headers or {})
+        timings.append(time.perf_counter() - start)
+    return np.array(timings) * 1000, response
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de la caché de respuestas')
+    parser.add_argument('--devices', type=int, default=50_000)
+    parser.add_argument('--requests', type=int, default=50)
+    args = parser.parse_args()
+
+    snapshot = build_fleet(args.devices).snapshot()
+    app = Flask(__name__)
+    cache = ResponseCache(lambda data: app.json.response(data).get_data())
+
+    @app.route('/plain')
+    def plain():
+        return jsonify(snapshot.to_dicts())
+
+    @app.route('/cached')
+    def cached():
+        return cache.respond('devices', 1, snapshot.to_dicts)
+
+    client = app.test_client()
+    gzip_headers = {'Accept-Encoding': 'gzip'}
+    _, first = timed(client, '/cached', 1, gzip_headers)
+    etag = first.headers['ETag']
+
+    results = [
+        ('jsonify por request', *timed(client, '/plain', args.requests)),
+        ('caché (gzip)', *timed(client, '/cached', args.requests, gzip_headers)),
+        ('304 If-None-Match', *timed(client, '/cached', args.requests, {'If-None-Match': etag})),
+    ]
+
+    print(f"Dispositivos: {args.devices:,}")
+    for label, timings, response in results:
+        print(f"{label:<22} p50: {np.percentile(timings, 50):8.2f} ms | "
+              f"p95: {np.percentile(timings, 95):8.2f} ms | bytes: {len(response.data):,}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+WIN NOC - Benchmark de rollups multi-resolución
+Compara consultas de 30 días y el perfil horario del pronóstico leyendo las
+muestras crudas contra los rollups, y mide el costo de ingesta de mantenerlos.
+
+Uso:
+    python benchmarks/bench_rollups.py --devices 1000 --days 30 --step 300
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from noc.rollups import DEFAULT_RETENTION  # noqa: E402
+from noc.timeseries import DeviceHistoryStore  # noqa: E402
+
+NO_ROLLUPS = {name: 0 for name in DEFAULT_RETENTION}
+
+
+def feed(store, n_devices, days, step, seed=0):
+    """Cargar ``days`` días de muestras cada ``step`` segundos; retorna s/tick"""
+    rng = np.random.default_rng(seed)
+    ids = np.arange(1, n_devices + 1)
+    status = np.zeros(n_devices, dtype=np.uint8)
+    end = int(time.time()) // step * step
+    ticks = days * 86400 // step
+    start = time.perf_counter()
+    for k in range(ticks):
+        cpu = rng.uniform(10, 95, n_devices)
+        store.append_many(ids, end - (ticks - 1 - k) * step, cpu, cpu, status)
+    return (time.perf_counter() - start) / ticks, end
+
+
+def timed(fn, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de rollups')
+    parser.add_argument('--devices', type=int, default=1000)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--step', type=int, default=300, help='segundos entre muestras')
+    args = parser.parse_args()
+
+    capacity = args.days * 86400 // args.step
+    stores = {
+        'crudo': DeviceHistoryStore(capacity, args.devices, rollup_retention=NO_ROLLUPS),
+        'rollups': DeviceHistoryStore(capacity, args.devices),
+    }
+    print(f"Dispositivos: {args.devices:,} | {args.days} días cada {args.step} s "
+          f"({capacity:,} muestras por dispositivo)")
+    for name, store in stores.items():
+        per_tick, end = feed(store, args.devices, args.days, args.step)
+        print(f"[{name}] ingesta: {per_tick * 1000:.2f} ms/tick | memoria: "
+              f"{(store.nbytes + store.rollup_nbytes) / 1e6:.1f} MB")
+
+    start = end - 30 * 86400
+    for name, store in stores.items():
+        elapsed, result = timed(lambda: store.query(1, start, end, 300))
+        print(f"[{name}] consulta 30 días: {elapsed:.2f} ms | resolución={result['resolution']} "
+              f"puntos={len(result['timestamps'])}")
+        elapsed, _ = timed(lambda: [store.query(i, start, end, 300) for i in range(1, 101)], repeat=2)
+        print(f"[{name}] consulta 30 días x 100 dispositivos: {elapsed:.1f} ms")
+        elapsed, _ = timed(store.hourly_profile, repeat=3)
+        print(f"[{name}] perfil horario de la flota: {elapsed:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+WIN NOC - Benchmark de inserción de muestras de métricas en SQLite
+Compara el escritor por lotes de SQLitePersistence contra un commit por fila.
+
+Uso:
+    python benchmarks/bench_sqlite_insert.py --devices 10000 --ticks 30
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from noc.persistence import INSERT_SAMPLE, SQLitePersistence, connect  # noqa: E402
+
+
+def bench_batched(path, n_devices, n_ticks):
+    """Muestras encoladas por tick y confirmadas por el hilo escritor"""
+    rng = np.random.default_rng(0)
+    ids = np.arange(1, n_devices + 1)
+    store = SQLitePersistence(path).start()
+    start = time.perf_counter()
+    for tick in range(n_ticks):
+        store.record_metrics(ids, 1_700_000_000 + tick * 10,
+                             rng.integers(10, 96, n_devices), rng.integers(20, 96, n_devices),
+                             rng.integers(0, 4, n_devices))
+    store.flush()
+    elapsed = time.perf_counter() - start
+    rows = store.rows_written
+    store.close()
+    return rows, elapsed
+
+
+def bench_row_by_row(path, n_rows):
+    """Línea base: un INSERT y un COMMIT por muestra"""
+    conn = connect(path)
+    start = time.perf_counter()
+    for i in range(n_rows):
+        conn.execute(INSERT_SAMPLE, (i % 1000, i, 50.0, 60.0, 0))
+        conn.commit()
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return n_rows, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de inserción en SQLite')
+    parser.add_argument('--devices', type=int, default=10_000)
+    parser.add_argument('--ticks', type=int, default=30)
+    parser.add_argument('--baseline-rows', type=int, default=2_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        rows, elapsed = bench_batched(os.path.join(tmp, 'batched.db'), args.devices, args.ticks)
+        print(f"Escritor por lotes: {rows:,} filas en {elapsed:.2f} s -> {rows / elapsed:,.0f} filas/s")
+
+        rows, elapsed = bench_row_by_row(os.path.join(tmp, 'row.db'), args.baseline_rows)
+        print(f"Commit por fila:    {rows:,} filas en {elapsed:.2f} s -> {rows / elapsed:,.0f} filas/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -8,15 +8,17 @@ Versión: 1.0.0
 """
 
 import os
+import time
 import logging
 from datetime import datetime, timedelta
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 from flask_restful import Api, Resource
 from apscheduler.schedulers.background import BackgroundScheduler
 import atexit
 
 # Configuración de logging
+os.makedirs('logs', exist_ok=True)
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -27,16 +29,16 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Importar módulos locales
+# Importar módulos locales (los servicios se importan al usarlos)
 from config.settings import Config
 from models.database import db, init_db
-from services.prediction_service import PredictionService
-from services.anomaly_detection import AnomalyDetectionService
-from services.network_analysis import NetworkAnalysisService
-from services.incident_prediction import IncidentPredictionService
-from services.performance_forecasting import PerformanceForecastingService
-from utils.data_preprocessor import DataPreprocessor
-from utils.model_manager import ModelManager
+from utils.lazy import LazyService, warm_up
+from services.training_jobs import QueueFull
+from utils.retention import ANOMALY_EVENT_COLUMNS, PartitionedTable, PartitionWriter, RetentionManager
+from utils.prediction_cache import PredictionCache
+from utils.rate_limit import AdmissionMiddleware, RateLimiter
+from utils.metrics import MLMetrics, serve as serve_metrics
+from utils.profiler import SamplingProfiler
 
 # Crear aplicación Flask
 app = Flask(__name__)
@@ -48,23 +50,122 @@ CORS(app, origins=['http://localhost:3000', 'http://localhost:3001'])
 # Configurar API REST
 api = Api(app)
 
+# API key y límite de tasa antes de que Flask procese la request
+rate_limiter = RateLimiter(Config.SECURITY_CONFIG, {
+    'host': Config.REDIS_HOST,
+    'port': Config.REDIS_PORT,
+    'password': Config.REDIS_PASSWORD,
+    'db': Config.REDIS_DB,
+})
+app.wsgi_app = AdmissionMiddleware(app.wsgi_app, rate_limiter)
+
+# Métricas Prometheus (latencia por endpoint, inferencia, tareas y caché)
+ml_metrics = MLMetrics(Config.MONITORING_CONFIG)
+ml_metrics.init_app(app)
+
+# Profiler por muestreo (stacks colapsados por endpoint y spans por servicio)
+PROFILING_CONFIG = Config.MONITORING_CONFIG['profiling']
+profiler = SamplingProfiler(
+    output_dir=PROFILING_CONFIG['output_dir'],
+    interval=PROFILING_CONFIG['interval_ms'] / 1000,
+    sample_rate=PROFILING_CONFIG['sample_rate'],
+    token=PROFILING_CONFIG['token'],
+)
+profiler.init_app(app)
+atexit.register(profiler.flush)
+
 # Inicializar base de datos
 db.init_app(app)
 init_db(app)
 
-# Inicializar servicios
-prediction_service = PredictionService()
-anomaly_service = AnomalyDetectionService()
-network_service = NetworkAnalysisService()
-incident_service = IncidentPredictionService()
-performance_service = PerformanceForecastingService()
-data_preprocessor = DataPreprocessor()
-model_manager = ModelManager()
+# Historial de anomalías en la tabla particionada anomaly_events (lo expira
+# cleanup_old_data); se escribe en segundo plano para no frenar la detección
+PARTITIONING_CONFIG = Config.DATA_CONFIG['partitioning']
+
+def _anomaly_events_table():
+    with app.app_context():
+        return PartitionedTable(db.engine, 'anomaly_events', ANOMALY_EVENT_COLUMNS,
+                                partition=PARTITIONING_CONFIG['interval'])
+
+anomaly_events = PartitionWriter(_anomaly_events_table, queue_size=PARTITIONING_CONFIG['write_queue_size'])
+atexit.register(anomaly_events.flush)
+
+def record_anomalies(anomalies):
+    """Encolar las anomalías detectadas para guardarlas en anomaly_events"""
+    if 'anomaly_events' not in PARTITIONING_CONFIG['tables']:
+        return
+    ts = int(time.time())
+    anomaly_events.record([{
+        'ts': ts,
+        'device_id': None if a['device_id'] is None else str(a['device_id'])[:64],
+        'metric': a['metric'],
+        'value': a['value'],
+        'expected': a['expected'],
+        'score': a['score'],
+        'severity': a['severity'],
+    } for a in anomalies])
+
+# Servicios perezosos: cada uno (y sus librerías pesadas) se construye en
+# la primera request que lo usa o durante el warm-up
+prediction_service = LazyService('services.prediction_service', 'PredictionService')
+anomaly_service = LazyService('services.anomaly_detection', 'AnomalyDetectionService')
+network_service = LazyService('services.network_analysis', 'NetworkAnalysisService')
+incident_service = LazyService('services.incident_prediction', 'IncidentPredictionService')
+performance_service = LazyService('services.performance_forecasting', 'PerformanceForecastingService')
+data_preprocessor = LazyService('utils.data_preprocessor', 'DataPreprocessor')
+model_manager = LazyService('utils.model_manager', 'ModelManager')
+
+SERVICES = (prediction_service, anomaly_service, network_service, incident_service,
+            performance_service, data_preprocessor, model_manager)
+ml_metrics.instrument(SERVICES)
+profiler.instrument(SERVICES)
+
+# Caché de predicciones (el nivel compartido se abre en el primer uso de cada worker)
+prediction_cache = PredictionCache(Config.CACHE_CONFIG, {
+    'host': Config.REDIS_HOST,
+    'port': Config.REDIS_PORT,
+    'password': Config.REDIS_PASSWORD,
+    'db': Config.REDIS_DB,
+})
+
+def cached_prediction(endpoint, params, model_type, device_id, compute):
+    """Resultado de ``compute()`` a través de la caché; retorna (valor, encabezados).
+
+    La clave incluye la versión y la marca de datos del modelo usado, así un
+    reentrenamiento u observaciones nuevas invalidan las entradas.
+    """
+    watermark = model_manager.watermark(model_type, device_id)
+    value, origin = prediction_cache.get_or_compute(endpoint, params, watermark, compute)
+    ml_metrics.cache_lookup(endpoint, origin)
+    return value, {'X-Cache': origin.upper()}
+
+def warm_up_services():
+    """Construir todos los servicios por adelantado (ML_WARMUP_MODULES agrega
+    librerías a importar, separadas por coma)"""
+    modules = [m.strip() for m in os.getenv('ML_WARMUP_MODULES', '').split(',') if m.strip()]
+    return warm_up(SERVICES, modules)
+
+# Configurar scheduler para tareas periódicas. Con ML_SCHEDULER_AUTOSTART
+# (por defecto) arranca al importar; gunicorn.conf.py lo desactiva y llama a
+# start_scheduler en un solo worker (con preload el import ocurre en el
+# master, donde no deben correr los jobs). Los procesos de entrenamiento
+# 'spawn' reimportan este módulo como __mp_main__ al ejecutar `python app.py`;
+# ahí tampoco debe correr.
+scheduler = BackgroundScheduler(
+    timezone=Config.SCHEDULER_CONFIG['timezone'],
+    job_defaults=Config.SCHEDULER_CONFIG['job_defaults'],
+    executors=Config.SCHEDULER_CONFIG['executors']
+)
+
+def start_scheduler():
+    """Iniciar las tareas periódicas en el proceso actual"""
+    if not scheduler.running:
+        scheduler.start()
+        atexit.register(lambda: scheduler.shutdown())
+        logger.info(f"Scheduler de tareas iniciado (pid {os.getpid()})")
 
-# Configurar scheduler para tareas periódicas
-scheduler = BackgroundScheduler()
-scheduler.start()
-atexit.register(lambda: scheduler.shutdown())
+if __name__ != '__mp_main__' and os.getenv('ML_SCHEDULER_AUTOSTART', 'true').lower() == 'true':
+    start_scheduler()
 
 # ===== RECURSOS DE LA API =====
 
@@ -76,14 +177,15 @@ class HealthCheck(Resource):
             # Verificar conexión a base de datos
             db.session.execute('SELECT 1')
             
-            # Verificar estado de los modelos
-            model_status = model_manager.get_models_status()
+            # Verificar estado de los modelos (resumen desde metadatos en memoria)
+            model_status = model_manager.get_models_status(include_models=False)
             
             return {
                 'status': 'healthy',
                 'timestamp': datetime.utcnow().isoformat(),
                 'version': '1.0.0',
                 'models': model_status,
+                'rate_limit': rate_limiter.stats(),
                 'uptime': str(datetime.utcnow() - app.start_time)
             }, 200
         except Exception as e:
@@ -109,15 +211,19 @@ class NetworkPrediction(Resource):
             prediction_horizon = data.get('horizon', 24)  # horas
             
             # Obtener predicción
-            prediction = prediction_service.predict_network_performance(
-                device_id, prediction_horizon
+            prediction, headers = cached_prediction(
+                'network', {'device_id': device_id, 'horizon': prediction_horizon},
+                'forecast', device_id,
+                lambda: prediction_service.predict_network_performance(
+                    device_id, prediction_horizon
+                )
             )
             
             return {
                 'success': True,
                 'data': prediction,
                 'timestamp': datetime.utcnow().isoformat()
-            }, 200
+            }, 200, headers
             
         except Exception as e:
             logger.error(f"Network prediction error: {str(e)}")
@@ -138,6 +244,7 @@ class AnomalyDetection(Resource):
             
             # Detectar anomalías
             anomalies = anomaly_service.detect_anomalies(metrics, device_id)
+            record_anomalies(anomalies)
             
             return {
                 'success': True,
@@ -153,6 +260,50 @@ class AnomalyDetection(Resource):
             logger.error(f"Anomaly detection error: {str(e)}")
             return {'error': str(e)}, 500
 
+class AnomalyDetectionBatch(Resource):
+    """Detección de anomalías para muchos dispositivos en una sola request"""
+    
+    def post(self):
+        try:
+            data = request.get_json()
+            
+            # Formato columnar: {'device_ids': [...], 'metrics': {métrica: [...]}}
+            # o lista de muestras: {'samples': [{'device_id': ..., 'metrics': {...}}]}
+            if data and 'samples' in data:
+                samples = data['samples']
+                device_ids = [sample.get('device_id') for sample in samples]
+                columns = {}
+                for i, sample in enumerate(samples):
+                    for metric, value in (sample.get('metrics') or {}).items():
+                        columns.setdefault(metric, [None] * len(samples))[i] = value
+            elif data and 'device_ids' in data and 'metrics' in data:
+                device_ids = data['device_ids']
+                columns = data['metrics']
+            else:
+                return {'error': 'device_ids y metrics (o samples) son requeridos'}, 400
+            
+            try:
+                anomalies = anomaly_service.detect_batch(device_ids, columns)
+            except ValueError as e:
+                return {'error': str(e)}, 400
+            record_anomalies(anomalies)
+            
+            return {
+                'success': True,
+                'data': {
+                    'samples_scored': len(device_ids),
+                    'anomalies_detected': len(anomalies) > 0,
+                    'anomalies': anomalies,
+                    'devices_with_anomalies': len({a['device_id'] for a in anomalies}),
+                    'risk_score': anomaly_service.calculate_risk_score(anomalies)
+                },
+                'timestamp': datetime.utcnow().isoformat()
+            }, 200
+            
+        except Exception as e:
+            logger.error(f"Batch anomaly detection error: {str(e)}")
+            return {'error': str(e)}, 500
+
 class IncidentPrediction(Resource):
     """Predicción de incidencias"""
     
@@ -164,15 +315,19 @@ class IncidentPrediction(Resource):
             time_window = data.get('time_window', 24)  # horas
             
             # Generar predicción de incidencias
-            prediction = incident_service.predict_incidents(
-                prediction_type, time_window
+            prediction, headers = cached_prediction(
+                'incidents', {'type': prediction_type, 'time_window': time_window},
+                'anomaly', None,
+                lambda: incident_service.predict_incidents(
+                    prediction_type, time_window
+                )
             )
             
             return {
                 'success': True,
                 'data': prediction,
                 'timestamp': datetime.utcnow().isoformat()
-            }, 200
+            }, 200, headers
             
         except Exception as e:
             logger.error(f"Incident prediction error: {str(e)}")
@@ -190,15 +345,20 @@ class PerformanceForecasting(Resource):
             forecast_days = data.get('forecast_days', 7)
             
             # Generar pronóstico
-            forecast = performance_service.forecast_performance(
-                metric_type, device_id, forecast_days
+            forecast, headers = cached_prediction(
+                'performance',
+                {'metric_type': metric_type, 'device_id': device_id, 'forecast_days': forecast_days},
+                'forecast', device_id,
+                lambda: performance_service.forecast_performance(
+                    metric_type, device_id, forecast_days
+                )
             )
             
             return {
                 'success': True,
                 'data': forecast,
                 'timestamp': datetime.utcnow().isoformat()
-            }, 200
+            }, 200, headers
             
         except Exception as e:
             logger.error(f"Performance forecasting error: {str(e)}")
@@ -248,7 +408,7 @@ class ModelTraining(Resource):
             if not model_type:
                 return {'error': 'model_type es requerido'}, 400
             
-            # Iniciar entrenamiento
+            # Encolar entrenamiento (se ejecuta en un proceso aparte)
             training_job = model_manager.train_model(
                 model_type, training_data, parameters
             )
@@ -258,11 +418,16 @@ class ModelTraining(Resource):
                 'data': {
                     'job_id': training_job['id'],
                     'status': training_job['status'],
-                    'estimated_time': training_job['estimated_time']
+                    'estimated_time': training_job['estimated_time'],
+                    'status_url': f"/api/models/training/{training_job['id']}"
                 },
                 'timestamp': datetime.utcnow().isoformat()
-            }, 200
+            }, 202
             
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        except QueueFull as e:
+            return {'error': str(e)}, 503
         except Exception as e:
             logger.error(f"Model training error: {str(e)}")
             return {'error': str(e)}, 500
@@ -282,6 +447,132 @@ class ModelTraining(Resource):
             logger.error(f"Get models status error: {str(e)}")
             return {'error': str(e)}, 500
 
+class TrainingJob(Resource):
+    """Estado y cancelación de un trabajo de entrenamiento"""
+    
+    def get(self, job_id):
+        try:
+            job = model_manager.get_training_job(job_id)
+            if job is None:
+                return {'error': 'Trabajo no encontrado'}, 404
+            
+            return {
+                'success': True,
+                'data': job,
+                'timestamp': datetime.utcnow().isoformat()
+            }, 200
+            
+        except Exception as e:
+            logger.error(f"Get training job error: {str(e)}")
+            return {'error': str(e)}, 500
+    
+    def delete(self, job_id):
+        try:
+            job = model_manager.cancel_training_job(job_id)
+            if job is None:
+                return {'error': 'Trabajo no encontrado'}, 404
+            
+            return {
+                'success': True,
+                'data': job,
+                'timestamp': datetime.utcnow().isoformat()
+            }, 200
+            
+        except Exception as e:
+            logger.error(f"Cancel training job error: {str(e)}")
+            return {'error': str(e)}, 500
+
+class ModelObservations(Resource):
+    """Observaciones nuevas para el reentrenamiento nocturno"""
+    
+    def post(self):
+        try:
+            data = request.get_json()
+            
+            model_type = data.get('model_type')
+            series = data.get('series')
+            
+            if not model_type or not series:
+                return {'error': 'model_type y series son requeridos'}, 400
+            
+            pending = model_manager.add_observations(
+                model_type, data.get('device_id'), series, data.get('timestamps')
+            )
+            
+            return {
+                'success': True,
+                'data': {'pending_samples': pending},
+                'timestamp': datetime.utcnow().isoformat()
+            }, 200
+            
+        except KeyError:
+            return {'error': 'Modelo no encontrado'}, 404
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        except Exception as e:
+            logger.error(f"Model observations error: {str(e)}")
+            return {'error': str(e)}, 500
+
+class PredictionCacheStatus(Resource):
+    """Métricas e invalidación de la caché de predicciones"""
+    
+    def get(self):
+        return {
+            'success': True,
+            'data': prediction_cache.stats(),
+            'timestamp': datetime.utcnow().isoformat()
+        }, 200
+    
+    def delete(self):
+        endpoint = request.args.get('endpoint')
+        if endpoint and endpoint not in Config.CACHE_CONFIG['ttl']:
+            return {'error': f"endpoint debe ser uno de: {', '.join(Config.CACHE_CONFIG['ttl'])}"}, 400
+        prediction_cache.invalidate(endpoint)
+        return {
+            'success': True,
+            'data': {'invalidated': endpoint or 'all'},
+            'timestamp': datetime.utcnow().isoformat()
+        }, 200
+
+def profiler_authorized():
+    token = request.headers.get('X-Profile-Token')
+    return bool(PROFILING_CONFIG['token']) and token == PROFILING_CONFIG['token']
+
+class ProfilerAdmin(Resource):
+    """Estado y configuración del profiler por muestreo"""
+    
+    def get(self):
+        if not profiler_authorized():
+            return {'error': 'No autorizado'}, 403
+        return {'success': True, 'data': profiler.status()}, 200
+    
+    def post(self):
+        if not profiler_authorized():
+            return {'error': 'No autorizado'}, 403
+        data = request.get_json(silent=True) or {}
+        try:
+            status = profiler.configure(data.get('enabled'), data.get('sample_rate'))
+        except (TypeError, ValueError) as e:
+            return {'error': str(e)}, 400
+        if data.get('flush'):
+            status['written'] = profiler.flush()
+        return {'success': True, 'data': status}, 200
+    
+    def delete(self):
+        if not profiler_authorized():
+            return {'error': 'No autorizado'}, 403
+        profiler.reset()
+        return {'success': True, 'data': profiler.status()}, 200
+
+class ProfilerStacks(Resource):
+    """Stacks colapsados (flamegraph.pl / speedscope); ``endpoint`` filtra,
+    p. ej. ``POST:/api/predict/network``"""
+    
+    def get(self):
+        if not profiler_authorized():
+            return {'error': 'No autorizado'}, 403
+        return Response(profiler.collapsed(request.args.get('endpoint')), mimetype='text/plain')
+
 class DataPreprocessing(Resource):
     """Preprocesamiento de datos"""
     
@@ -314,10 +605,16 @@ class DataPreprocessing(Resource):
 api.add_resource(HealthCheck, '/api/health')
 api.add_resource(NetworkPrediction, '/api/predict/network')
 api.add_resource(AnomalyDetection, '/api/detect/anomalies')
+api.add_resource(AnomalyDetectionBatch, '/api/detect/anomalies/batch')
 api.add_resource(IncidentPrediction, '/api/predict/incidents')
 api.add_resource(PerformanceForecasting, '/api/forecast/performance')
 api.add_resource(NetworkAnalysis, '/api/analyze/network')
 api.add_resource(ModelTraining, '/api/models/training')
+api.add_resource(TrainingJob, '/api/models/training/<string:job_id>')
+api.add_resource(ModelObservations, '/api/models/observations')
+api.add_resource(PredictionCacheStatus, '/api/cache/predictions')
+api.add_resource(ProfilerAdmin, '/api/admin/profiler')
+api.add_resource(ProfilerStacks, '/api/admin/profiler/stacks')
 api.add_resource(DataPreprocessing, '/api/data/preprocess')
 
 # ===== TAREAS PROGRAMADAS =====
@@ -326,8 +623,17 @@ def retrain_models():
     """Reentrenar modelos periódicamente"""
     try:
         logger.info("Iniciando reentrenamiento de modelos...")
-        model_manager.retrain_all_models()
-        logger.info("Reentrenamiento completado exitosamente")
+        workers = Config.SCHEDULER_CONFIG['executors']['default']['max_workers']
+        report = model_manager.retrain_all_models(max_workers=workers)
+        for entry in report['models']:
+            if entry['action'] != 'skipped':
+                logger.info(f"Reentrenamiento {entry['name']}: {entry['action']} "
+                            f"(deriva={entry.get('drift')}, tiempos={entry.get('timings_ms')}, "
+                            f"total={entry.get('total_ms')} ms)")
+        logger.info(f"Reentrenamiento completado en {report['total_seconds']} s con "
+                    f"{report['workers']} procesos: {report['incremental']} incrementales, "
+                    f"{report['full']} completos, {report['skipped']} omitidos, "
+                    f"{report['failed']} fallidos")
     except Exception as e:
         logger.error(f"Error en reentrenamiento: {str(e)}")
 
@@ -335,8 +641,15 @@ def cleanup_old_data():
     """Limpiar datos antiguos"""
     try:
         logger.info("Iniciando limpieza de datos antiguos...")
-        # Implementar lógica de limpieza
-        logger.info("Limpieza completada exitosamente")
+        with app.app_context():
+            retention = RetentionManager.from_config(db.engine, Config.DATA_CONFIG)
+            report = retention.run()
+        for table, entry in report['tables'].items():
+            logger.info(f"Limpieza {table}: {entry}")
+        logger.info(f"Limpieza completada en {report['seconds']} s (corte {report['cutoff']}): "
+                    f"{report['partitions_dropped']} particiones eliminadas, "
+                    f"{report['rows_dropped'] + report['rows_deleted']} filas, "
+                    f"{report['bytes_reclaimed']} bytes recuperados")
     except Exception as e:
         logger.error(f"Error en limpieza: {str(e)}")
 
@@ -351,7 +664,7 @@ def generate_insights():
 
 # Programar tareas
 scheduler.add_job(
-    func=retrain_models,
+    func=ml_metrics.timed_job('retrain_models', retrain_models),
     trigger="cron",
     hour=2,  # 2 AM
     minute=0,
@@ -359,7 +672,7 @@ scheduler.add_job(
 )
 
 scheduler.add_job(
-    func=cleanup_old_data,
+    func=ml_metrics.timed_job('cleanup_data', cleanup_old_data),
     trigger="cron",
     hour=3,  # 3 AM
     minute=0,
@@ -367,7 +680,7 @@ scheduler.add_job(
 )
 
 scheduler.add_job(
-    func=generate_insights,
+    func=ml_metrics.timed_job('generate_insights', generate_insights),
     trigger="interval",
     hours=6,  # Cada 6 horas
     id='generate_insights'
@@ -390,11 +703,9 @@ def internal_error(error):
         'timestamp': datetime.utcnow().isoformat()
     }), 500
 
-@app.before_first_request
-def before_first_request():
-    """Inicialización antes de la primera request"""
-    app.start_time = datetime.utcnow()
-    logger.info("WIN NOC ML Predictor iniciado exitosamente")
+# Momento de arranque (reportado como uptime en /api/health)
+app.start_time = datetime.utcnow()
+logger.info("WIN NOC ML Predictor iniciado exitosamente")
 
 # ===== PUNTO DE ENTRADA =====
 
@@ -409,6 +720,13 @@ if __name__ == '__main__':
     
     logger.info(f"Iniciando servidor en {host}:{port} (debug={debug_mode})")
     
+    # Con el reloader de debug el exportador corre sólo en el proceso hijo
+    if ml_metrics.enabled and (not debug_mode or os.getenv('WERKZEUG_RUN_MAIN') == 'true'):
+        try:
+            serve_metrics(Config.MONITORING_CONFIG['metrics_port'])
+        except OSError as e:
+            logger.warning(f"No se pudo abrir el puerto de métricas: {e}")
+    
     app.run(
         host=host,
         port=port,
@@ -35,6 +35,27 @@ class Config:
     REDIS_PASSWORD = os.getenv('REDIS_PASSWORD', '')
     REDIS_DB = int(os.getenv('REDIS_DB', 0))
     
+    # Caché de predicciones: LRU en memoria + Redis (si REDIS_HOST está
+    # definido) o diskcache local
+    CACHE_CONFIG = {
+        'enabled': os.getenv('PREDICTION_CACHE_ENABLED', 'true').lower() == 'true',
+        'backend': os.getenv('PREDICTION_CACHE_BACKEND', 'redis' if os.getenv('REDIS_HOST') else 'disk'),  # redis | disk | memory
+        'key_prefix': os.getenv('PREDICTION_CACHE_PREFIX', 'win-ml'),
+        'local_max_entries': int(os.getenv('PREDICTION_CACHE_LOCAL_ENTRIES', 2048)),
+        'disk_path': os.getenv('PREDICTION_CACHE_DIR', os.path.join(os.getenv('TEMP_PATH', 'temp/'), 'prediction_cache')),
+        'disk_size_limit_mb': int(os.getenv('PREDICTION_CACHE_DISK_MB', 256)),
+        'redis_timeout': float(os.getenv('PREDICTION_CACHE_REDIS_TIMEOUT', 0.25)),  # segundos
+        'default_ttl': int(os.getenv('PREDICTION_CACHE_TTL', 60)),
+        # Cada cuánto relee un worker la generación compartida (invalidaciones de otros workers)
+        'generation_check_seconds': float(os.getenv('PREDICTION_CACHE_GENERATION_CHECK', 1.0)),
+        # TTL por endpoint en segundos (0 desactiva la caché del endpoint)
+        'ttl': {
+            'network': int(os.getenv('PREDICTION_CACHE_TTL_NETWORK', 60)),
+            'incidents': int(os.getenv('PREDICTION_CACHE_TTL_INCIDENTS', 300)),
+            'performance': int(os.getenv('PREDICTION_CACHE_TTL_PERFORMANCE', 900)),
+        },
+    }
+    
     # Configuración de Machine Learning
     ML_CONFIG = {
         'models_path': os.getenv('MODELS_PATH', 'models/'),
@@ -49,6 +70,20 @@ class Config:
             'validation_split': float(os.getenv('ML_VALIDATION_SPLIT', 0.2)),
             'early_stopping_patience': int(os.getenv('ML_EARLY_STOPPING', 10)),
             'learning_rate': float(os.getenv('ML_LEARNING_RATE', 0.001)),
+            # Cola de entrenamiento en procesos separados de la inferencia
+            'max_concurrent_jobs': int(os.getenv('ML_TRAINING_WORKERS', 1)),
+            'max_queued_jobs': int(os.getenv('ML_TRAINING_MAX_QUEUE', 32)),
+            'cpu_affinity': os.getenv('ML_TRAINING_CPUS', ''),  # p. ej. "2,3" o "2-3"
+            'nice': int(os.getenv('ML_TRAINING_NICE', 10)),
+            'jobs_db': os.getenv('ML_JOBS_DB', os.path.join(os.getenv('DATA_PATH', 'data/'), 'training_jobs.db')),
+        },
+        
+        # Reentrenamiento nocturno según deriva
+        'retraining': {
+            'drift_threshold': float(os.getenv('ML_DRIFT_THRESHOLD', 0.5)),
+            'full_refit_threshold': float(os.getenv('ML_FULL_REFIT_THRESHOLD', 3.0)),
+            'min_new_samples': int(os.getenv('ML_RETRAIN_MIN_SAMPLES', 24)),
+            'max_training_samples': int(os.getenv('ML_MAX_TRAINING_SAMPLES', 10000)),
         },
         
         # Configuración de predicción
@@ -64,6 +99,21 @@ class Config:
             'n_estimators': int(os.getenv('ML_N_ESTIMATORS', 100)),
             'max_samples': int(os.getenv('ML_MAX_SAMPLES', 256)),
             'threshold_percentile': int(os.getenv('ML_THRESHOLD_PERCENTILE', 95)),
+            # Detector en streaming (estado O(1) por dispositivo)
+            'ewma_alpha': float(os.getenv('ML_ANOMALY_EWMA_ALPHA', 0.05)),
+            'z_threshold': float(os.getenv('ML_ANOMALY_Z_THRESHOLD', 3.5)),
+            'warmup_samples': int(os.getenv('ML_ANOMALY_WARMUP', 30)),
+            # Escala mínima por métrica: fracción del umbral de warning
+            'scale_floor_fraction': float(os.getenv('ML_ANOMALY_SCALE_FLOOR', 0.05)),
+            # Dispositivos con estado por worker (LRU); no menor que un lote
+            'max_devices': int(os.getenv('ML_ANOMALY_MAX_DEVICES', 200000)),
+            'max_batch_size': int(os.getenv('ML_ANOMALY_MAX_BATCH', 100000)),
+        },
+        
+        # Registro de modelos: carga perezosa, mmap y presupuesto de memoria
+        'registry': {
+            'memory_budget_mb': int(os.getenv('ML_MODEL_MEMORY_BUDGET_MB', 512)),
+            'mmap': os.getenv('ML_MODEL_MMAP', 'true').lower() == 'true',
         },
         
         # Configuración de series temporales
@@ -86,6 +136,19 @@ class Config:
             'week': 10080,
             'month': 43200
         },
+        # Series temporales particionadas y limpieza por lotes
+        'partitioning': {
+            'interval': os.getenv('DATA_PARTITION_INTERVAL', 'day'),  # day | week
+            # Tablas particionadas por ts (ver utils.retention); anomaly_events
+            # la escriben los endpoints de detección
+            'tables': [t for t in os.getenv('DATA_PARTITIONED_TABLES', 'anomaly_events').split(',') if t],
+            # Tablas sin particionar a limpiar, como "tabla:columna_de_tiempo"
+            'cleanup_tables': [t for t in os.getenv('DATA_CLEANUP_TABLES', '').split(',') if t],
+            'cleanup_chunk_size': int(os.getenv('DATA_CLEANUP_CHUNK_SIZE', 5000)),
+            'cleanup_pause_ms': int(os.getenv('DATA_CLEANUP_PAUSE_MS', 50)),
+            # Cola del escritor en segundo plano (filas por worker)
+            'write_queue_size': int(os.getenv('DATA_WRITE_QUEUE_SIZE', 10000)),
+        },
         'preprocessing': {
             'outlier_method': os.getenv('OUTLIER_METHOD', 'iqr'),
             'missing_value_strategy': os.getenv('MISSING_VALUE_STRATEGY', 'interpolate'),
@@ -145,8 +208,24 @@ class Config:
         'api_key_required': os.getenv('API_KEY_REQUIRED', 'false').lower() == 'true',
         'api_key': os.getenv('ML_API_KEY', 'win_ml_api_key_2024'),
         'rate_limit': {
+            'enabled': os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true',
             'requests_per_minute': int(os.getenv('RATE_LIMIT_RPM', 60)),
             'requests_per_hour': int(os.getenv('RATE_LIMIT_RPH', 1000)),
+            # Estado compartido entre workers: redis | shm | local
+            'backend': os.getenv('RATE_LIMIT_BACKEND', 'redis' if os.getenv('REDIS_HOST') else 'shm'),
+            'shm_path': os.getenv('RATE_LIMIT_SHM_PATH', ''),
+            'slots': int(os.getenv('RATE_LIMIT_SLOTS', 65536)),
+            'redis_timeout': float(os.getenv('RATE_LIMIT_REDIS_TIMEOUT', 0.1)),  # segundos
+            # Tokens que consume cada request (por defecto 1): 'METODO /ruta'
+            # aplica a ese método y ruta exacta, '/ruta' a todo path con ese prefijo
+            'endpoint_costs': {
+                'POST /api/models/training': int(os.getenv('RATE_LIMIT_COST_TRAINING', 20)),
+                '/api/forecast/performance': int(os.getenv('RATE_LIMIT_COST_FORECAST', 5)),
+                '/api/detect/anomalies/batch': int(os.getenv('RATE_LIMIT_COST_BATCH', 5)),
+                '/api/analyze/network': int(os.getenv('RATE_LIMIT_COST_ANALYSIS', 3)),
+                '/api/predict': int(os.getenv('RATE_LIMIT_COST_PREDICT', 2)),
+            },
+            'exempt_paths': ['/api/health'],
         },
         'cors_origins': os.getenv('CORS_ORIGINS', 'http://localhost:3000,http://localhost:3001').split(','),
     }
@@ -157,6 +236,14 @@ class Config:
         'metrics_port': int(os.getenv('METRICS_PORT', 8000)),
         'health_check_interval': int(os.getenv('HEALTH_CHECK_INTERVAL', 30)),  # segundos
         'performance_tracking': os.getenv('PERFORMANCE_TRACKING', 'true').lower() == 'true',
+        # Profiler por muestreo: encabezado X-Profile con el token o activación
+        # desde /api/admin/profiler (también requiere el token)
+        'profiling': {
+            'token': os.getenv('ML_PROFILE_TOKEN', ''),
+            'sample_rate': float(os.getenv('ML_PROFILE_SAMPLE_RATE', 0.01)),
+            'interval_ms': float(os.getenv('ML_PROFILE_INTERVAL_MS', 5)),
+            'output_dir': os.getenv('ML_PROFILE_DIR', os.path.join(os.getenv('LOGS_PATH', 'logs/'), 'profiles')),
+        },
     }
     
     # Configuración de tareas programadas
@@ -0,0 +1,91 @@
+"""
+Configuración de gunicorn para el módulo de Machine Learning
+WIN NOC - Centro de Operaciones de Red
+
+Con ML_PRELOAD=true (por defecto) la app se importa una sola vez en el
+master y el warm-up construye los servicios antes del fork: los workers
+nacen con los modelos y librerías ya cargados y comparten esas páginas
+(copy-on-write) en lugar de cargarlos cada uno.
+
+El scheduler de tareas (reentrenamiento, limpieza, insights) no corre en
+el master: import app no lo inicia (ML_SCHEDULER_AUTOSTART=false) y el
+master se lo asigna a un único worker en pre_fork; si ese worker termina,
+el siguiente que se cree lo toma. Para correrlo como proceso aparte, usar
+ML_SCHEDULER_WORKER=false y lanzar ``python app.py`` con otro puerto.
+
+El detector de anomalías en streaming guarda su estado en cada worker (no
+se comparte tras el fork): con N workers cada dispositivo se aprende sobre
+~1/N de sus muestras. Si eso importa, servir /api/detect/* desde una
+instancia con GUNICORN_WORKERS=1.
+
+Las métricas Prometheus corren en modo multiproceso: cada worker escribe
+sus valores en PROMETHEUS_MULTIPROC_DIR y el master los agrega y los sirve
+en METRICS_PORT.
+"""
+
+import os
+import shutil
+import tempfile
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('GUNICORN_WORKERS', 4))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+preload_app = os.getenv('ML_PRELOAD', 'true').lower() == 'true'
+scheduler_worker = os.getenv('ML_SCHEDULER_WORKER', 'true').lower() == 'true'
+
+# Debe definirse antes de importar la app (con preload, antes de on_starting)
+os.environ['ML_SCHEDULER_AUTOSTART'] = 'false'
+# Worker que corre el scheduler (sólo se usa en el master)
+_scheduler_owner = None
+
+# Debe definirse antes de que se importe prometheus_client (la app). El
+# directorio se vacía aquí, al cargar la configuración: con preload_app la app
+# se importa antes de on_starting y ya crea los archivos del master (p. ej.
+# las series que registra timed_job al importarse), que un borrado posterior
+# dejaría huérfanos
+metrics_enabled = os.getenv('ENABLE_METRICS', 'true').lower() == 'true'
+if metrics_enabled:
+    os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR',
+                          os.path.join(tempfile.gettempdir(), 'win-ml-prometheus'))
+    # Descartar los valores de una ejecución anterior
+    shutil.rmtree(os.environ['PROMETHEUS_MULTIPROC_DIR'], ignore_errors=True)
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+
+def on_starting(server):
+    """Master, antes de crear los workers"""
+    if preload_app and os.getenv('ML_WARMUP', 'true').lower() == 'true':
+        import app
+        app.warm_up_services()
+
+
+
+def when_ready(server):
+    """Master listo: exportar las métricas agregadas de los workers"""
+    if metrics_enabled:
+        from config.settings import Config
+        from utils.metrics import serve
+        serve(Config.MONITORING_CONFIG['metrics_port'])
+
+
+def pre_fork(server, worker):
+    """Master: asignar el scheduler a este worker si ninguno vivo lo tiene"""
+    global _scheduler_owner
+    worker.runs_scheduler = scheduler_worker and _scheduler_owner is None
+    if worker.runs_scheduler:
+        _scheduler_owner = worker
+
+
+def post_fork(server, worker):
+    if getattr(worker, 'runs_scheduler', False):
+        import app
+        app.start_scheduler()
+
+
+def child_exit(server, worker):
+    global _scheduler_owner
+    if worker is _scheduler_owner:
+        _scheduler_owner = None
+    if metrics_enabled:
+        from utils.metrics import mark_process_dead
+        mark_process_dead(worker.pid)
@@ -0,0 +1,4 @@
+"""
+Modelos de datos del módulo de Machine Learning
+WIN NOC - Centro de Operaciones de Red
+"""
@@ -0,0 +1,34 @@
+"""
+Base de datos del módulo de Machine Learning
+WIN NOC - Centro de Operaciones de Red
+
+Instancia de Flask-SQLAlchemy compartida por la app, la retención y el
+almacenamiento de muestras. ``init_db`` no impide el arranque si la base no
+responde: los endpoints que la usan reportan el error en cada request.
+"""
+
+import logging
+
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.exc import SQLAlchemyError
+
+logger = logging.getLogger(__name__)
+
+db = SQLAlchemy()
+
+
+def init_db(app):
+    """Crear las tablas declaradas en ``db.metadata`` (si faltan).
+
+    Las conexiones abiertas aquí se descartan al terminar: con preload de
+    gunicorn esto corre en el master y los workers no deben heredar sockets
+    del pool.
+    """
+    with app.app_context():
+        try:
+            db.create_all()
+        except SQLAlchemyError as e:
+            logger.warning(f"Base de datos no disponible al iniciar ({e.__class__.__name__}); "
+                           f"se reintentará en cada uso")
+        finally:
+            db.engine.dispose()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+WIN NOC - Verificación del tiempo de importación del módulo de ML
+Importa ``app`` en un proceso nuevo y falla si supera el presupuesto, para
+detectar librerías pesadas que vuelvan a cargarse en el import.
+
+Uso:
+    python scripts/check_import_time.py --budget-ms 1500
+    ML_IMPORT_BUDGET_MS=1500 python scripts/check_import_time.py
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+ML_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def measure(module, runs):
+    """Mejor tiempo (ms) de importar ``module`` y el detalle -X importtime"""
+    best, report = None, ''
+    code = ('import time; start = time.perf_counter(); import {0}; '
+            'print((time.perf_counter() - start) * 1000)').format(module)
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                                cwd=ML_ROOT, capture_output=True, text=True)
+        if result.returncode != 0:
+            sys.stderr.write(result.stderr[-4000:])
+            raise SystemExit(f'No se pudo importar {module}')
+        elapsed = float(result.stdout.strip().splitlines()[-1])
+        if best is None or elapsed < best:
+            best, report = elapsed, result.stderr
+    return best, report
+
+
+def slowest_imports(report, top):
+    """Módulos con mayor tiempo acumulado según -X importtime"""
+    rows = []
+    for line in report.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len('import time:'):].split('|'))
+        rows.append((int(cumulative), name))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Presupuesto de tiempo de "import app"')
+    parser.add_argument('--budget-ms', type=float,
+                        default=float(os.getenv('ML_IMPORT_BUDGET_MS', 1500)))
+    parser.add_argument('--module', default='app')
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    elapsed, report = measure(args.module, args.runs)
+    print(f"import {args.module}: {elapsed:.0f} ms (presupuesto {args.budget_ms:.0f} ms)")
+    for cumulative, name in slowest_imports(report, 10):
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+    if elapsed > args.budget_ms:
+        print('FALLO: el import supera el presupuesto')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,4 @@
+"""
+Servicios de análisis del módulo de Machine Learning
+WIN NOC - Centro de Operaciones de Red
+"""
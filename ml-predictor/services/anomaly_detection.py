@@ -0,0 +1,314 @@
+"""
+Servicio de detección de anomalías
+WIN NOC - Centro de Operaciones de Red
+
+Detector en streaming: cada dispositivo guarda un estado de tamaño fijo por
+métrica (media y varianza EWMA, mediana y MAD aproximadas) y cada muestra se
+puntúa en tiempo constante. Los lotes de miles de dispositivos se procesan
+como operaciones vectorizadas sobre arreglos NumPy.
+
+El estado vive en memoria de cada proceso. Con varios workers de gunicorn
+cada uno aprende sólo de las muestras que recibe (el calentamiento y las
+referencias son por worker); para que un dispositivo tenga un único modelo
+hay que enviar su tráfico a un mismo proceso, p. ej. un despliegue dedicado
+con GUNICORN_WORKERS=1 para /api/detect/*.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from config.settings import Config
+
+logger = logging.getLogger(__name__)
+
+# Métricas soportadas (mismas que los umbrales de alertas)
+METRICS = tuple(Config.ALERT_CONFIG['thresholds'].keys())
+
+# Constantes de una distribución normal: MAD -> desviación estándar y
+# desvío absoluto medio -> MAD (usada al inicializar durante el calentamiento)
+MAD_TO_SIGMA = 1.4826
+MEAN_DEVIATION_TO_MAD = 0.8453
+
+# Escala mínima por métrica como fracción de su umbral de warning: en una
+# serie plana un salto debe acercarse a ese umbral para contar como anomalía
+# (p. ej. packet_loss 0 -> 0.1 no lo es, 0 -> 1.0 es crítica)
+SCALE_FLOOR_FRACTION = 0.05
+# Escala mínima relativa a la mediana del dispositivo
+RELATIVE_SCALE_FLOOR = 0.01
+# Escala mínima para métricas sin umbral configurado
+MIN_SCALE = 1e-3
+
+
+def scale_floors(metrics, fraction=SCALE_FLOOR_FRACTION):
+    """Escala mínima absoluta de cada métrica a partir de ALERT_CONFIG"""
+    thresholds = Config.ALERT_CONFIG['thresholds']
+    return np.array([
+        max(fraction * thresholds[metric]['warning'], MIN_SCALE) if metric in thresholds else MIN_SCALE
+        for metric in metrics
+    ])
+
+
+class StreamingAnomalyDetector:
+    """Estado por dispositivo en formato struct-of-arrays (filas x métricas).
+
+    Para cada muestra se calcula, antes de actualizar el estado:
+
+    - z EWMA: ``|x - media| / desviación``
+    - z robusto: ``|x - mediana| / (1.4826 * MAD)``
+
+    La tabla de dispositivos está acotada a ``max_devices``: al llegar al
+    límite se recicla la fila del dispositivo usado hace más tiempo (LRU),
+    que vuelve a empezar su calentamiento si reaparece.
+
+    El puntaje es el menor de ambos (las dos vistas deben coincidir en que
+    la muestra es extrema) y se considera anomalía cuando supera
+    ``z_threshold`` y el dispositivo ya acumuló ``warmup_samples`` muestras.
+    Ambas desviaciones tienen un piso por métrica (``scale_floors`` o el 1%
+    de la mediana, el mayor) para que las series planas no conviertan
+    variaciones mínimas en anomalías críticas.
+    Tras el calentamiento, la mediana y la MAD se aproximan con pasos
+    proporcionales a la escala (estimadores "frugales"), y las muestras se
+    recortan a la banda robusta antes de entrar a la EWMA para que un pico
+    no contamine la referencia.
+    """
+
+    def __init__(self, metrics=METRICS, alpha=0.05, z_threshold=3.5, warmup_samples=30,
+                 initial_devices=1024, scale_floor_fraction=SCALE_FLOOR_FRACTION,
+                 max_devices=200000):
+        self.metrics = tuple(metrics)
+        self.scale_floor = scale_floors(self.metrics, scale_floor_fraction)
+        self.alpha = float(alpha)
+        self.z_threshold = float(z_threshold)
+        self.warmup_samples = int(warmup_samples)
+        self.max_devices = max(1, int(max_devices))
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._rows = OrderedDict()
+        self._allocate(max(1, min(int(initial_devices), self.max_devices)))
+
+    def _allocate(self, n_rows):
+        shape = (n_rows, len(self.metrics))
+        self._mean = np.zeros(shape)
+        self._var = np.zeros(shape)
+        self._median = np.zeros(shape)
+        self._mad = np.zeros(shape)
+        self._count = np.zeros(shape, dtype=np.int64)
+
+    def _grow(self, min_rows):
+        old = (self._mean, self._var, self._median, self._mad, self._count)
+        old_rows = old[0].shape[0]
+        self._allocate(min(max(min_rows, old_rows * 2), self.max_devices))
+        for src, dst in zip(old, (self._mean, self._var, self._median, self._mad, self._count)):
+            dst[:old_rows] = src
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _reset(self, rows):
+        for array in (self._mean, self._var, self._median, self._mad, self._count):
+            array[rows] = 0
+
+    def _rows_for(self, device_ids):
+        """Traducir ids a filas registrando los dispositivos nuevos.
+
+        Los dispositivos del lote pasan al final del orden LRU; los nuevos
+        reciben una fila libre o la del dispositivo menos reciente.
+        """
+        unique = dict.fromkeys(device_ids)
+        if len(unique) > self.max_devices:
+            raise ValueError(f'El lote tiene más de {self.max_devices} dispositivos distintos')
+        rows = self._rows
+        new = [d for d in unique if d not in rows]
+        for device_id in unique:
+            if device_id in rows:
+                rows.move_to_end(device_id)
+
+        recycled = []
+        for device_id in new:
+            if len(rows) < self.max_devices:
+                rows[device_id] = len(rows)
+            else:
+                _, row = rows.popitem(last=False)
+                rows[device_id] = row
+                recycled.append(row)
+        if len(rows) > self._mean.shape[0]:
+            self._grow(len(rows))
+        if recycled:
+            self._reset(recycled)
+            self.evictions += len(recycled)
+
+        get = rows.__getitem__
+        return np.fromiter((get(d) for d in device_ids), dtype=np.int64, count=len(device_ids))
+
+    # ===== PUNTUACIÓN =====
+
+    def score_batch(self, device_ids, values):
+        """Puntuar y aprender un lote de muestras.
+
+        ``values`` es una matriz (muestras x métricas) con NaN donde falta
+        el dato. Retorna ``(scores, anomalies)`` con la misma forma; las
+        celdas sin dato o en calentamiento tienen puntaje 0. Si un
+        dispositivo aparece varias veces, sus muestras se procesan en orden.
+        """
+        values = np.asarray(values, dtype=np.float64).reshape(len(device_ids), len(self.metrics))
+        scores = np.zeros_like(values)
+        with self._lock:
+            rows = self._rows_for(device_ids)
+            if rows.size and np.bincount(rows).max() <= 1:
+                scores[:] = self._score_rows(rows, values)
+            else:
+                # Rondas de filas únicas para conservar el orden por dispositivo
+                pending = np.arange(rows.size)
+                while pending.size:
+                    _, first = np.unique(rows[pending], return_index=True)
+                    batch = pending[np.sort(first)]
+                    pending = np.setdiff1d(pending, batch, assume_unique=True)
+                    scores[batch] = self._score_rows(rows[batch], values[batch])
+        return scores, scores > self.z_threshold
+
+    def _score_rows(self, rows, x):
+        present = ~np.isnan(x)
+        x = np.where(present, x, 0.0)
+        mean, var = self._mean[rows], self._var[rows]
+        median, mad = self._median[rows], self._mad[rows]
+        count = self._count[rows]
+        warm = count >= self.warmup_samples
+
+        floor = np.maximum(self.scale_floor, RELATIVE_SCALE_FLOOR * np.abs(median))
+        sigma = np.sqrt(np.maximum(var, floor ** 2))
+        robust_sigma = np.maximum(mad * MAD_TO_SIGMA, floor)
+        z_ewma = np.abs(x - mean) / sigma
+        z_robust = np.abs(x - median) / robust_sigma
+        scores = np.where(present & warm, np.minimum(z_ewma, z_robust), 0.0)
+
+        # Durante el calentamiento los pasos son 1/n (promedios exactos)
+        rate = np.maximum(self.alpha, 1.0 / (count + 1))
+        deviation_rate = np.where(count > 0, np.maximum(self.alpha, 1.0 / np.maximum(count, 1)), 0.0)
+
+        # EWMA sobre la muestra recortada a la banda robusta
+        bound = self.z_threshold * robust_sigma
+        sample = np.where(warm, np.clip(x, median - bound, median + bound), x)
+        delta = sample - mean
+        new_mean = mean + rate * delta
+        new_var = (1 - rate) * (var + rate * delta * delta)
+
+        # Mediana y MAD frugales: la mediana avanza un paso proporcional a la
+        # escala hacia la muestra y la MAD crece o decrece en forma relativa
+        deviation = np.abs(x - median)
+        new_median = np.where(warm, median + self.alpha * robust_sigma * np.sign(x - median),
+                              median + rate * (x - median))
+        new_mad = np.where(warm,
+                           np.maximum(mad, floor / MAD_TO_SIGMA) * (1 + self.alpha * np.sign(deviation - mad)),
+                           mad + deviation_rate * (deviation * MEAN_DEVIATION_TO_MAD - mad))
+
+        self._mean[rows] = np.where(present, new_mean, mean)
+        self._var[rows] = np.where(present, new_var, var)
+        self._median[rows] = np.where(present, new_median, median)
+        self._mad[rows] = np.where(present, new_mad, mad)
+        self._count[rows] = count + present
+        return scores
+
+    def expected(self, device_ids):
+        """Mediana actual (valor esperado) de cada dispositivo indicado"""
+        with self._lock:
+            rows = [self._rows.get(d) for d in device_ids]
+            result = np.full((len(device_ids), len(self.metrics)), np.nan)
+            known = [i for i, row in enumerate(rows) if row is not None]
+            if known:
+                result[known] = self._median[[rows[i] for i in known]]
+            return result
+
+
+class AnomalyDetectionService:
+    """Detección de anomalías sobre métricas de dispositivos de red"""
+
+    def __init__(self, config=None):
+        settings = (config or Config.ML_CONFIG)['anomaly_detection']
+        self.max_batch_size = settings.get('max_batch_size', 100000)
+        self.detector = StreamingAnomalyDetector(
+            alpha=settings.get('ewma_alpha', 0.05),
+            z_threshold=settings.get('z_threshold', 3.5),
+            warmup_samples=settings.get('warmup_samples', 30),
+            scale_floor_fraction=settings.get('scale_floor_fraction', SCALE_FLOOR_FRACTION),
+            max_devices=settings.get('max_devices', 200000),
+        )
+
+    @property
+    def metrics(self):
+        return self.detector.metrics
+
+    def _matrix(self, samples):
+        """Convertir una lista de diccionarios {métrica: valor} en matriz"""
+        matrix = np.full((len(samples), len(self.metrics)), np.nan)
+        for i, sample in enumerate(samples):
+            for j, metric in enumerate(self.metrics):
+                value = sample.get(metric)
+                if value is not None:
+                    matrix[i, j] = float(value)
+        return matrix
+
+    def _collect(self, device_ids, values, scores, flags):
+        """Materializar sólo las celdas anómalas"""
+        rows, cols = np.nonzero(flags)
+        if not rows.size:
+            return []
+        expected = self.detector.expected([device_ids[i] for i in rows.tolist()])
+        anomalies = []
+        for k, (i, j) in enumerate(zip(rows.tolist(), cols.tolist())):
+            score = float(scores[i, j])
+            anomalies.append({
+                'device_id': device_ids[i],
+                'sample_index': i,
+                'metric': self.metrics[j],
+                'value': float(values[i, j]),
+                'expected': round(float(expected[k, j]), 3),
+                'score': round(score, 2),
+                'severity': 'critical' if score > 2 * self.detector.z_threshold else 'warning'
+            })
+        return anomalies
+
+    def detect_anomalies(self, metrics, device_id=None):
+        """Puntuar las métricas de un dispositivo.
+
+        ``metrics`` puede ser un diccionario {métrica: valor} o una lista de
+        ellos en orden cronológico.
+        """
+        samples = [metrics] if isinstance(metrics, dict) else list(metrics)
+        values = self._matrix(samples)
+        device_ids = [device_id] * len(samples)
+        scores, flags = self.detector.score_batch(device_ids, values)
+        return self._collect(device_ids, values, scores, flags)
+
+    def detect_batch(self, device_ids, columns):
+        """Puntuar muestras de muchos dispositivos en una sola pasada.
+
+        ``columns`` es un diccionario {métrica: [valores]} alineado con
+        ``device_ids`` (None para datos faltantes). Retorna las anomalías.
+        """
+        n = len(device_ids)
+        if n > self.max_batch_size:
+            raise ValueError(f'El lote excede el máximo de {self.max_batch_size} muestras')
+        unknown = set(columns) - set(self.metrics)
+        if unknown:
+            raise ValueError(f"Métricas no soportadas: {', '.join(sorted(unknown))}")
+
+        values = np.full((n, len(self.metrics)), np.nan)
+        for j, metric in enumerate(self.metrics):
+            column = columns.get(metric)
+            if column is None:
+                continue
+            if len(column) != n:
+                raise ValueError(f'La métrica {metric} no tiene {n} valores')
+            values[:, j] = np.array(column, dtype=np.float64)
+        scores, flags = self.detector.score_batch(device_ids, values)
+        return self._collect(device_ids, values, scores, flags)
+
+    def calculate_risk_score(self, anomalies):
+        """Riesgo entre 0 y 1 a partir del puntaje más alto observado"""
+        if not anomalies:
+            return 0.0
+        peak = max(anomaly['score'] for anomaly in anomalies)
+        return round(min(1.0, peak / (3 * self.detector.z_threshold)), 3)
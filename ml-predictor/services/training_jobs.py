@@ -0,0 +1,302 @@
+"""
+Cola de trabajos de entrenamiento
+WIN NOC - Centro de Operaciones de Red
+
+Los entrenamientos corren en un ProcessPoolExecutor (fuera del GIL de los
+workers que atienden inferencia), con concurrencia, afinidad de CPU y
+prioridad configurables. El estado de cada trabajo se guarda en SQLite para
+que cualquier worker de gunicorn (y el proceso hijo) lo lea y actualice.
+"""
+
+import json
+import logging
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUSES = ('queued', 'running', 'completed', 'failed', 'cancelled')
+ACTIVE_STATUSES = ('queued', 'running')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS training_jobs (
+    id TEXT PRIMARY KEY,
+    model_type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    parameters TEXT,
+    result TEXT,
+    error TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    owner_pid INTEGER,
+    submitted_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT,
+    duration_seconds REAL
+);
+CREATE INDEX IF NOT EXISTS idx_training_jobs_status ON training_jobs (status);
+"""
+
+
+class QueueFull(Exception):
+    """La cola de entrenamiento alcanzó su máximo de trabajos activos"""
+
+
+class JobCancelled(Exception):
+    """El trabajo fue cancelado mientras se ejecutaba"""
+
+
+def _now():
+    return datetime.utcnow().isoformat()
+
+
+def parse_cpus(value):
+    """'2,3' o '2-5' -> {2, 3} / {2, 3, 4, 5}; vacío o None -> None"""
+    if not value:
+        return None
+    cpus = set()
+    for part in str(value).split(','):
+        if '-' in part:
+            lo, hi = part.split('-')
+            cpus.update(range(int(lo), int(hi) + 1))
+        elif part.strip():
+            cpus.add(int(part))
+    return cpus or None
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobStore:
+    """Estado persistente de los trabajos (una conexión corta por operación)"""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def _execute(self, sql, params=()):
+        conn = self._connect()
+        try:
+            with conn:
+                return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def create(self, model_type, parameters):
+        job_id = uuid.uuid4().hex
+        self._execute(
+            'INSERT INTO training_jobs (id, model_type, status, parameters, owner_pid, submitted_at) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (job_id, model_type, 'queued', json.dumps(parameters), os.getpid(), _now()))
+        return job_id
+
+    def update(self, job_id, **fields):
+        for key in ('result', 'parameters'):
+            if key in fields and fields[key] is not None:
+                fields[key] = json.dumps(fields[key])
+        assignments = ', '.join(f'{key} = ?' for key in fields)
+        self._execute(f'UPDATE training_jobs SET {assignments} WHERE id = ?',
+                      (*fields.values(), job_id))
+
+    def finish(self, job_id, status, **fields):
+        """Marcar un estado final sólo si el trabajo sigue activo"""
+        fields = dict(fields, status=status, finished_at=_now())
+        for key in ('result',):
+            if key in fields and fields[key] is not None:
+                fields[key] = json.dumps(fields[key])
+        assignments = ', '.join(f'{key} = ?' for key in fields)
+        self._execute(f'UPDATE training_jobs SET {assignments} WHERE id = ? AND status IN (?, ?)',
+                      (*fields.values(), job_id, *ACTIVE_STATUSES))
+
+    def get(self, job_id):
+        rows = self._execute('SELECT * FROM training_jobs WHERE id = ?', (job_id,))
+        if not rows:
+            return None
+        job = dict(rows[0])
+        for key in ('parameters', 'result'):
+            job[key] = json.loads(job[key]) if job[key] else None
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        return job
+
+    def cancel_requested(self, job_id):
+        rows = self._execute('SELECT cancel_requested FROM training_jobs WHERE id = ?', (job_id,))
+        return bool(rows and rows[0][0])
+
+    def count_active(self):
+        return self._execute('SELECT COUNT(*) FROM training_jobs WHERE status IN (?, ?)',
+                             ACTIVE_STATUSES)[0][0]
+
+    def average_duration(self, model_type, last=20):
+        rows = self._execute(
+            'SELECT AVG(duration_seconds) FROM (SELECT duration_seconds FROM training_jobs '
+            "WHERE model_type = ? AND status = 'completed' ORDER BY finished_at DESC LIMIT ?)",
+            (model_type, last))
+        return rows[0][0]
+
+    def fail_orphans(self):
+        """Trabajos activos cuyo proceso dueño ya no existe (reinicio/caída)"""
+        rows = self._execute('SELECT id, owner_pid FROM training_jobs WHERE status IN (?, ?)',
+                             ACTIVE_STATUSES)
+        orphans = [row['id'] for row in rows if not _pid_alive(row['owner_pid'] or 0)]
+        for job_id in orphans:
+            self.finish(job_id, 'failed', error='Trabajo interrumpido por reinicio del servicio')
+        return len(orphans)
+
+
+# ===== PROCESO HIJO =====
+
+def _init_worker(cpus, nice):
+    """Fijar afinidad y prioridad del proceso de entrenamiento"""
+    if cpus and hasattr(os, 'sched_setaffinity'):
+        try:
+            os.sched_setaffinity(0, cpus)
+        except OSError as e:
+            logger.warning(f"No se pudo fijar la afinidad de CPU {sorted(cpus)}: {e}")
+    if nice:
+        try:
+            os.nice(nice)
+        except OSError:
+            pass
+
+
+def run_job(store_path, config, job_id, model_type, training_data, parameters):
+    """Ejecutar un trabajo dentro del pool de procesos"""
+    from utils.model_manager import ModelManager
+
+    store = JobStore(store_path)
+    if store.cancel_requested(job_id):
+        store.finish(job_id, 'cancelled')
+        return None
+    started = time.perf_counter()
+    store.update(job_id, status='running', started_at=_now(), progress=0.0)
+
+    def progress(fraction):
+        if store.cancel_requested(job_id):
+            raise JobCancelled()
+        store.update(job_id, progress=round(fraction, 3))
+
+    try:
+        manager = ModelManager(config, scan=False)
+        metadata = manager.fit(model_type, training_data, parameters, progress=progress)
+    except JobCancelled:
+        store.finish(job_id, 'cancelled')
+        return None
+    except Exception as e:
+        store.finish(job_id, 'failed', error=str(e))
+        return None
+    store.finish(job_id, 'completed', progress=1.0, result=metadata,
+                 duration_seconds=round(time.perf_counter() - started, 4))
+    return metadata
+
+
+# ===== COLA =====
+
+class TrainingJobQueue:
+    """Cola acotada de entrenamientos sobre un ProcessPoolExecutor.
+
+    - ``max_concurrent_jobs`` procesos de entrenamiento por proceso web
+    - ``max_queued_jobs`` trabajos activos como máximo (``QueueFull``)
+    - ``cpu_affinity`` / ``nice`` aíslan el entrenamiento de la inferencia
+
+    Los procesos se crean con 'spawn' para no heredar locks ni hilos del
+    servidor web.
+    """
+
+    def __init__(self, config, on_complete=None):
+        training = config['training']
+        self.config = config
+        self.store = JobStore(training.get('jobs_db', os.path.join(config['data_path'], 'training_jobs.db')))
+        self.max_workers = max(1, int(training.get('max_concurrent_jobs', 1)))
+        self.max_queued = max(1, int(training.get('max_queued_jobs', 32)))
+        self.cpus = parse_cpus(training.get('cpu_affinity'))
+        self.nice = int(training.get('nice', 10))
+        self.on_complete = on_complete
+        self._executor = None
+        self._futures = {}
+        self._lock = threading.Lock()
+        orphans = self.store.fail_orphans()
+        if orphans:
+            logger.warning(f"{orphans} trabajos de entrenamiento interrumpidos marcados como fallidos")
+
+    def _pool(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(self.cpus, self.nice),
+            )
+        return self._executor
+
+    def submit(self, model_type, training_data, parameters):
+        with self._lock:
+            if self.store.count_active() >= self.max_queued:
+                raise QueueFull(f'Hay {self.max_queued} entrenamientos activos; reintente más tarde')
+            job_id = self.store.create(model_type, parameters)
+            future = self._pool().submit(run_job, self.store.path, self.config, job_id,
+                                         model_type, training_data, parameters)
+            self._futures[job_id] = future
+        future.add_done_callback(lambda f, job_id=job_id: self._done(job_id, f))
+        average = self.store.average_duration(model_type)
+        return {
+            'id': job_id,
+            'status': 'queued',
+            'estimated_time': round(average, 3) if average is not None else None,
+        }
+
+    def _done(self, job_id, future):
+        with self._lock:
+            self._futures.pop(job_id, None)
+        if future.cancelled():
+            self.store.finish(job_id, 'cancelled')
+        elif future.exception() is not None:
+            # El proceso murió (p. ej. sin memoria) antes de registrar el fallo
+            self.store.finish(job_id, 'failed', error=repr(future.exception()))
+        job = self.store.get(job_id)
+        if self.on_complete and job:
+            try:
+                self.on_complete(job)
+            except Exception as e:
+                logger.error(f"Error procesando fin del trabajo {job_id}: {e}")
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def cancel(self, job_id):
+        """Cancelar un trabajo en cola o en ejecución; retorna el trabajo o None"""
+        job = self.store.get(job_id)
+        if job is None or job['status'] not in ACTIVE_STATUSES:
+            return job
+        self.store.update(job_id, cancel_requested=1)
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future is not None and future.cancel():
+            self.store.finish(job_id, 'cancelled')
+        return self.store.get(job_id)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
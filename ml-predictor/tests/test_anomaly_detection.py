@@ -0,0 +1,41 @@
+"""
+Detector de anomalías en streaming
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from services.anomaly_detection import AnomalyDetectionService  # noqa: E402
+
+
+def _flat_then_step(step):
+    service = AnomalyDetectionService()
+    for _ in range(100):
+        assert service.detect_anomalies({'packet_loss': 0.0}, device_id='router-1') == []
+    return service.detect_anomalies({'packet_loss': step}, device_id='router-1')
+
+
+def test_small_step_on_flat_series_is_not_anomaly():
+    assert _flat_then_step(0.1) == []
+
+
+def test_step_to_warning_threshold_on_flat_series_is_critical():
+    anomalies = _flat_then_step(1.0)
+    assert [a['metric'] for a in anomalies] == ['packet_loss']
+    assert anomalies[0]['severity'] == 'critical'
+
+
+def test_device_table_is_bounded_lru():
+    detector = AnomalyDetectionService().detector
+    detector.max_devices = 3
+    for device_id in ('a', 'b', 'c'):
+        detector.score_batch([device_id], [[50.0] * len(detector.metrics)])
+    detector.score_batch(['a'], [[50.0] * len(detector.metrics)])
+    detector.score_batch(['d'], [[50.0] * len(detector.metrics)])
+
+    assert len(detector) == 3
+    assert list(detector._rows) == ['c', 'a', 'd']
+    assert detector.evictions == 1
+    assert detector._count[detector._rows['d']].max() == 1
@@ -0,0 +1,23 @@
+"""
+Presupuesto de tiempo de importación del módulo de ML
+Corre la misma medición que ``scripts/check_import_time.py`` (un proceso
+nuevo por intento) y falla si ``import app`` supera ML_IMPORT_BUDGET_MS.
+"""
+
+import os
+import sys
+
+ML_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ML_ROOT, 'scripts'))
+
+import check_import_time  # noqa: E402
+
+BUDGET_MS = float(os.getenv('ML_IMPORT_BUDGET_MS', 1500))
+
+
+def test_import_app_within_budget():
+    elapsed, report = check_import_time.measure('app', runs=3)
+    slowest = '\n'.join(f'{cumulative / 1000:8.1f} ms  {name}'
+                        for cumulative, name in check_import_time.slowest_imports(report, 10))
+    assert elapsed <= BUDGET_MS, (
+        f'import app: {elapsed:.0f} ms (presupuesto {BUDGET_MS:.0f} ms)\n{slowest}')
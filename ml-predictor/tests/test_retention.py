@@ -0,0 +1,45 @@
+"""
+Retención por particiones sobre la tabla anomaly_events (SQLite)
+"""
+
+import os
+import sys
+
+from sqlalchemy import create_engine
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from config.settings import Config  # noqa: E402
+from utils.retention import (ANOMALY_EVENT_COLUMNS, PartitionedTable, PartitionWriter,  # noqa: E402
+                             RetentionManager)
+
+DAY = 86400
+NOW = 1_700_000_000
+
+
+def _event(ts, device_id='router-1'):
+    return {'ts': ts, 'device_id': device_id, 'metric': 'packet_loss', 'value': 4.0,
+            'expected': 0.0, 'score': 12.5, 'severity': 'critical'}
+
+
+def test_written_events_expire_by_partition_and_chunks(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'ml.db'}")
+    writer = PartitionWriter(lambda: PartitionedTable(engine, 'anomaly_events', ANOMALY_EVENT_COLUMNS))
+    writer.record([_event(NOW - 400 * DAY), _event(NOW - 400 * DAY + 60)])
+    # Partición que cruza el corte: una fila vencida y una vigente
+    cutoff = NOW - 365 * DAY
+    writer.record([_event(cutoff - 60), _event(cutoff + 60)])
+    writer.flush()
+    assert writer.written == 4
+
+    retention = RetentionManager.from_config(engine, Config.DATA_CONFIG)
+    assert [table.name for table in retention.tables] == ['anomaly_events']
+    report = retention.run(now=NOW)
+
+    assert report['partitions_dropped'] == 1
+    assert report['rows_dropped'] == 2
+    assert report['rows_deleted'] == 1
+    with engine.connect() as conn:
+        remaining = [name for name, _, _ in retention.tables[0].partitions()]
+        assert len(remaining) == 1
+        assert conn.exec_driver_sql(f'SELECT COUNT(*) FROM {remaining[0]}').scalar() == 1
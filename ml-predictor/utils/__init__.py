@@ -0,0 +1,4 @@
+"""
+Utilidades del módulo de Machine Learning
+WIN NOC - Centro de Operaciones de Red
+"""
@@ -0,0 +1,102 @@
+"""
+Construcción e importación diferidas
+WIN NOC - Centro de Operaciones de Red
+
+Los servicios y las librerías pesadas (tensorflow, prophet, statsmodels...)
+se cargan recién cuando un endpoint los usa, para que importar la app sea
+rápido; ``warm_up`` permite cargarlos por adelantado (p. ej. en el master de
+gunicorn antes del fork, para que los workers compartan esas páginas).
+"""
+
+import importlib
+import importlib.util
+import logging
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def lazy_import(name):
+    """Módulo que se ejecuta recién en el primer acceso a un atributo.
+
+    Si el módulo no está instalado el error aparece en ese primer uso, no
+    al importar la app.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+class LazyService:
+    """Proxy que construye ``module.class_name(*args, **kwargs)`` en el primer uso"""
+
+    def __init__(self, module, class_name, *args, **kwargs):
+        self._module = module
+        self._class_name = class_name
+        self._args = args
+        self._kwargs = kwargs
+        self._instance = None
+        self._lock = threading.Lock()
+        self.build_seconds = None
+        # wrapper(clase, método, fn) -> fn envuelta (métricas, profiler)
+        self.wrappers = []
+
+    @property
+    def loaded(self):
+        return self._instance is not None
+
+    def get(self):
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                if self._instance is None:
+                    start = time.perf_counter()
+                    cls = getattr(importlib.import_module(self._module), self._class_name)
+                    self._instance = cls(*self._args, **self._kwargs)
+                    self.build_seconds = time.perf_counter() - start
+                    logger.info(f"{self._class_name} inicializado en {self.build_seconds * 1000:.0f} ms")
+                instance = self._instance
+        return instance
+
+    def __getattr__(self, attr):
+        value = getattr(self.get(), attr)
+        if self.wrappers and callable(value):
+            for wrapper in self.wrappers:
+                value = wrapper(self._class_name, attr, value)
+        return value
+
+    def __repr__(self):
+        state = 'cargado' if self.loaded else 'pendiente'
+        return f'<LazyService {self._module}.{self._class_name} ({state})>'
+
+
+def warm_up(services, modules=()):
+    """Construir los servicios e importar los módulos indicados.
+
+    Los errores se registran y no interrumpen el resto del calentamiento;
+    retorna el tiempo total en segundos.
+    """
+    start = time.perf_counter()
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logger.warning(f"Warm-up: no se pudo importar {name}: {e}")
+    for service in services:
+        try:
+            service.get()
+        except Exception as e:
+            logger.error(f"Warm-up: error inicializando {service!r}: {e}")
+    elapsed = time.perf_counter() - start
+    logger.info(f"Warm-up completado en {elapsed * 1000:.0f} ms")
+    return elapsed
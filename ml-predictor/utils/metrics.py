@@ -0,0 +1,147 @@
+"""
+Métricas Prometheus del módulo de Machine Learning
+WIN NOC - Centro de Operaciones de Red
+
+- ``ml_http_request_duration_seconds{endpoint, method, status}`` y
+  ``ml_http_requests_in_flight{endpoint}`` por regla de ruta
+- ``ml_inference_duration_seconds{service, method}``: cada llamada a un
+  método de servicio (``LazyService.wrappers``)
+- ``ml_scheduler_job_duration_seconds{job}``
+- ``ml_prediction_cache_lookups_total{endpoint, result}`` (la tasa de
+  aciertos es ``1 - miss / total``)
+
+Se exportan en ``MONITORING_CONFIG['metrics_port']``. Con gunicorn y varios
+workers, ``gunicorn.conf.py`` define ``PROMETHEUS_MULTIPROC_DIR`` antes de
+importar la app: cada worker escribe sus valores en ese directorio y el
+master los agrega y los sirve.
+"""
+
+import functools
+import logging
+import os
+import time
+
+from flask import g, request
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:  # Dependencia opcional en desarrollo
+    prometheus_client = None
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+JOB_BUCKETS = (0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 1800.0, 3600.0)
+UNMATCHED = 'unmatched'
+
+
+def multiprocess_mode():
+    return bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+
+def serve(port, addr='0.0.0.0'):
+    """Servir ``/metrics`` (agregando los workers en modo multiproceso)"""
+    if prometheus_client is None:
+        logger.warning("prometheus_client no está instalado; métricas desactivadas")
+        return False
+    registry = prometheus_client.REGISTRY
+    if multiprocess_mode():
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    prometheus_client.start_http_server(port, addr, registry)
+    logger.info(f"Métricas Prometheus en el puerto {port}")
+    return True
+
+
+def mark_process_dead(pid):
+    """Descartar los gauges ``live*`` de un worker terminado"""
+    if prometheus_client is not None and multiprocess_mode():
+        multiprocess.mark_process_dead(pid)
+
+
+class MLMetrics:
+    """Instrumentación de la API, los servicios, el scheduler y la caché"""
+
+    def __init__(self, monitoring_config):
+        self.enabled = monitoring_config.get('enable_metrics', True) and prometheus_client is not None
+        self.track_inference = self.enabled and monitoring_config.get('performance_tracking', True)
+        if not self.enabled:
+            return
+        self.request_latency = prometheus_client.Histogram(
+            'ml_http_request_duration_seconds', 'Latencia de las requests HTTP',
+            ('endpoint', 'method', 'status'), buckets=LATENCY_BUCKETS)
+        self.in_flight = prometheus_client.Gauge(
+            'ml_http_requests_in_flight', 'Requests HTTP en curso', ('endpoint',),
+            multiprocess_mode='livesum')
+        self.inference = prometheus_client.Histogram(
+            'ml_inference_duration_seconds', 'Duración de las llamadas a los servicios',
+            ('service', 'method'), buckets=LATENCY_BUCKETS)
+        self.job_duration = prometheus_client.Histogram(
+            'ml_scheduler_job_duration_seconds', 'Duración de las tareas programadas',
+            ('job',), buckets=JOB_BUCKETS)
+        self.cache_lookups = prometheus_client.Counter(
+            'ml_prediction_cache_lookups', 'Consultas a la caché de predicciones',
+            ('endpoint', 'result'))
+
+    # ===== FLASK =====
+
+    def init_app(self, app):
+        if not self.enabled:
+            return
+
+        @app.before_request
+        def _start_timer():
+            endpoint = request.url_rule.rule if request.url_rule is not None else UNMATCHED
+            g._metrics = (time.perf_counter(), endpoint)
+            self.in_flight.labels(endpoint).inc()
+
+        @app.after_request
+        def _observe(response):
+            started = g.get('_metrics')
+            if started is not None:
+                self.request_latency.labels(started[1], request.method, str(response.status_code)) \
+                    .observe(time.perf_counter() - started[0])
+            return response
+
+        @app.teardown_request
+        def _finish(exc):
+            started = g.pop('_metrics', None)
+            if started is not None:
+                self.in_flight.labels(started[1]).dec()
+
+    # ===== SERVICIOS Y TAREAS =====
+
+    def timer(self, service, method, fn):
+        """Envolver un método de servicio (ver ``LazyService.wrappers``)"""
+        histogram = self.inference.labels(service, method)
+
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+        return timed
+
+    def instrument(self, services):
+        if self.track_inference:
+            for service in services:
+                service.wrappers.append(self.timer)
+
+    def timed_job(self, name, fn):
+        """Tarea del scheduler que registra su duración"""
+        if not self.enabled:
+            return fn
+        histogram = self.job_duration.labels(name)
+
+        @functools.wraps(fn)
+        def job(*args, **kwargs):
+            with histogram.time():
+                return fn(*args, **kwargs)
+        return job
+
+    def cache_lookup(self, endpoint, result):
+        if self.enabled:
+            self.cache_lookups.labels(endpoint, result).inc()
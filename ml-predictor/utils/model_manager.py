@@ -0,0 +1,647 @@
+"""
+Gestión de modelos de Machine Learning
+WIN NOC - Centro de Operaciones de Red
+
+Registro perezoso de modelos: los metadatos se leen una vez al iniciar y se
+mantienen en memoria; los artefactos se cargan recién en el primer uso, con
+arreglos NumPy mapeados en memoria (mmap) para que los workers de gunicorn
+compartan páginas, y se desalojan por LRU al superar el presupuesto.
+"""
+
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: sólo se serializa dentro del proceso
+    fcntl = None
+
+import joblib
+import numpy as np
+
+from config.settings import Config
+
+logger = logging.getLogger(__name__)
+
+MODEL_FILE = 'model.joblib'
+METADATA_FILE = 'metadata.json'
+TRAINING_FILE = 'training.npz'
+PENDING_FILE = 'pending.npz'
+PENDING_LOCK_FILE = 'pending.lock'
+
+
+# ===== ENTRENADORES =====
+
+def _hours(timestamps):
+    return (timestamps // 3600) % 24
+
+
+def _forecast_model(sums, counts, series, hours):
+    level = float(series[-min(len(series), 6):].mean())
+    with np.errstate(invalid='ignore', divide='ignore'):
+        profile = np.where(counts > 0, sums / counts, level)
+    fitted = profile[hours]
+    model = {'level': level, 'profile': profile, 'sums': sums, 'counts': counts}
+    return model, {'mae': round(float(np.abs(series - fitted).mean()), 4)}
+
+
+def train_forecast(series, timestamps, parameters):
+    """Nivel actual más perfil horario (24 valores) de la serie"""
+    hours = _hours(timestamps)
+    sums = np.bincount(hours, weights=series, minlength=24)
+    counts = np.bincount(hours, minlength=24).astype(np.float64)
+    return _forecast_model(sums, counts, series, hours)
+
+
+def update_forecast(model, series, timestamps, parameters, window):
+    """Sumar las muestras nuevas a los acumulados del perfil horario"""
+    hours = _hours(timestamps)
+    sums = model['sums'] + np.bincount(hours, weights=series, minlength=24)
+    counts = model['counts'] + np.bincount(hours, minlength=24)
+    return _forecast_model(sums, counts, series, hours)
+
+
+def _anomaly_model(median, mad, count, mean, m2):
+    std = float(np.sqrt(m2 / count)) if count else 0.0
+    return {'median': median, 'mad': mad, 'mean': mean, 'std': std, 'count': count, 'm2': m2}
+
+
+def train_anomaly(series, timestamps, parameters):
+    """Referencia robusta (mediana/MAD) y clásica (media/desviación)"""
+    median = float(np.median(series))
+    mad = float(np.median(np.abs(series - median)))
+    mean = float(series.mean())
+    m2 = float(((series - mean) ** 2).sum())
+    return _anomaly_model(median, mad, int(series.size), mean, m2), {'samples': int(series.size)}
+
+
+def update_anomaly(model, series, timestamps, parameters, window):
+    """Media y varianza combinadas en forma exacta con las muestras nuevas;
+    mediana y MAD recalculadas sobre la ventana retenida"""
+    count, mean, m2 = int(model['count']), float(model['mean']), float(model['m2'])
+    n = int(series.size)
+    new_mean = float(series.mean())
+    delta = new_mean - mean
+    total = count + n
+    mean = mean + delta * n / total
+    m2 = m2 + float(((series - new_mean) ** 2).sum()) + delta * delta * count * n / total
+    median = float(np.median(window))
+    mad = float(np.median(np.abs(window - median)))
+    return _anomaly_model(median, mad, total, mean, m2), {'samples': total}
+
+
+TRAINERS = {
+    'forecast': train_forecast,
+    'anomaly': train_anomaly,
+}
+
+# Actualización incremental (warm start) desde el modelo anterior
+UPDATERS = {
+    'forecast': update_forecast,
+    'anomaly': update_anomaly,
+}
+
+# Escala mínima al comparar distribuciones (series constantes)
+MIN_SCALE = 1e-3
+
+
+def drift_score(reference, recent):
+    """Deriva entre la serie de entrenamiento y las muestras nuevas.
+
+    Máximo entre el corrimiento de la media (en desviaciones de la
+    referencia) y el cambio de escala ``|log(std_nueva / std_ref)|``; 0
+    significa misma distribución y ~1 un corrimiento de una desviación.
+    """
+    ref_std = max(float(reference.std()), MIN_SCALE)
+    shift = abs(float(recent.mean()) - float(reference.mean())) / ref_std
+    scale = abs(float(np.log(max(float(recent.std()), MIN_SCALE) / ref_std)))
+    return round(max(shift, scale), 4)
+
+
+def model_name(model_type, device_id=None):
+    return model_type if device_id is None else f'{model_type}-{device_id}'
+
+
+# ===== REGISTRO =====
+
+class ModelRegistry:
+    """Artefactos en ``<models_path>/<nombre>/`` con caché LRU acotada.
+
+    Cada modelo tiene ``metadata.json`` (leído al iniciar y actualizado al
+    guardar) y ``model.joblib`` sin comprimir, que se carga con
+    ``mmap_mode='r'``. ``get`` y ``watermark`` comparan el mtime de los
+    metadatos con el leído: si otro proceso guardó una versión nueva (p. ej.
+    un job de entrenamiento) se releen y se descarta el modelo cargado. El costo de cada modelo cargado es el tamaño de su
+    artefacto; al superar ``memory_budget`` se desalojan los menos usados.
+    """
+
+    def __init__(self, models_path, memory_budget, mmap=True, scan=True):
+        self.models_path = models_path
+        self.memory_budget = int(memory_budget)
+        self.mmap_mode = 'r' if mmap else None
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._loaded = OrderedDict()
+        self._resident_bytes = 0
+        self.metadata = {}
+        # mtime (ns) de metadata.json al leerlo por última vez
+        self._metadata_stamps = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_seconds = 0.0
+        if scan:
+            self.scan()
+
+    def _path(self, name, filename):
+        return os.path.join(self.models_path, name, filename)
+
+    def _metadata_stamp(self, name):
+        try:
+            return os.stat(self._path(name, METADATA_FILE)).st_mtime_ns
+        except OSError:
+            return 0
+
+    def _refresh(self, name, stamp=None):
+        """Releer los metadatos si cambiaron en disco desde la última lectura"""
+        if stamp is None:
+            stamp = self._metadata_stamp(name)
+        if stamp and stamp != self._metadata_stamps.get(name):
+            self.reload(name, stamp)
+
+    def _read_metadata(self, name):
+        path = self._path(name, METADATA_FILE)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Metadatos ilegibles en {path}: {e}")
+            return None
+
+    def scan(self):
+        """Leer los metadatos de todos los modelos (no abre los artefactos)"""
+        metadata = {}
+        if os.path.isdir(self.models_path):
+            for entry in os.scandir(self.models_path):
+                if entry.is_dir():
+                    stamp = self._metadata_stamp(entry.name)
+                    found = self._read_metadata(entry.name)
+                    if found is not None:
+                        metadata[entry.name] = found
+                        self._metadata_stamps[entry.name] = stamp
+        with self._lock:
+            self.metadata = metadata
+        return len(metadata)
+
+    def reload(self, name, stamp=None):
+        """Releer los metadatos de un modelo guardado por otro proceso"""
+        # El mtime se toma antes de leer: un guardado posterior se detecta
+        stamp = self._metadata_stamp(name) if stamp is None else stamp
+        found = self._read_metadata(name)
+        if found is None:
+            return None
+        self._metadata_stamps[name] = stamp
+        with self._lock:
+            self.metadata = dict(self.metadata, **{name: found})
+            if self._loaded.get(name, (None, None, None))[2] != found.get('version'):
+                self._evict(name)
+        return found
+
+    # ===== ESCRITURA =====
+
+    def save(self, name, model, metadata, training=None):
+        """Guardar el artefacto y sus metadatos; reemplaza la versión cargada"""
+        directory = os.path.join(self.models_path, name)
+        os.makedirs(directory, exist_ok=True)
+        model_path = self._path(name, MODEL_FILE)
+        joblib.dump(model, model_path + '.tmp')
+        os.replace(model_path + '.tmp', model_path)
+        if training is not None:
+            with open(self._path(name, TRAINING_FILE) + '.tmp', 'wb') as f:
+                np.savez(f, **training)
+            os.replace(self._path(name, TRAINING_FILE) + '.tmp', self._path(name, TRAINING_FILE))
+
+        previous = self.metadata.get(name) or self._read_metadata(name) or {}
+        metadata = dict(metadata, name=name, version=previous.get('version', 0) + 1,
+                        size_bytes=os.path.getsize(model_path))
+        metadata_path = self._path(name, METADATA_FILE)
+        with open(metadata_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, ensure_ascii=False, indent=2)
+        os.replace(metadata_path + '.tmp', metadata_path)
+        self._metadata_stamps[name] = self._metadata_stamp(name)
+
+        with self._lock:
+            # Copia al escribir: las consultas de estado iteran sin lock
+            self.metadata = dict(self.metadata, **{name: metadata})
+            self._evict(name)
+        return metadata
+
+    def training_data(self, name):
+        """Datos con los que se entrenó el modelo, o None si no se guardaron"""
+        path = self._path(name, TRAINING_FILE)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            return {key: data[key] for key in data.files}
+
+    # ===== MUESTRAS PENDIENTES =====
+
+    @contextmanager
+    def _pending_lock(self, name):
+        """Serializar lecturas y escrituras de ``pending.npz`` entre procesos"""
+        with self._lock:
+            lock = self._load_locks.setdefault(('pending', name), threading.Lock())
+        with lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self._path(name, PENDING_LOCK_FILE), 'a') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read_pending(self, name):
+        path = self._path(name, PENDING_FILE)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            return data['series'], data['timestamps']
+
+    def _write_pending(self, name, series, timestamps):
+        path = self._path(name, PENDING_FILE)
+        if not series.size:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        with open(path + '.tmp', 'wb') as f:
+            np.savez(f, series=series, timestamps=timestamps)
+        os.replace(path + '.tmp', path)
+
+    def append_pending(self, name, series, timestamps, limit):
+        """Agregar observaciones nuevas (se conservan las ``limit`` más recientes)"""
+        with self._pending_lock(name):
+            current = self._read_pending(name)
+            if current is not None:
+                series = np.concatenate([current[0], series])
+                timestamps = np.concatenate([current[1], timestamps])
+            self._write_pending(name, series[-limit:], timestamps[-limit:])
+        return min(series.size, limit)
+
+    def has_pending(self, name):
+        return os.path.exists(self._path(name, PENDING_FILE))
+
+    def pending(self, name):
+        """Observaciones acumuladas desde el último entrenamiento, o None"""
+        if not self.has_pending(name):
+            return None
+        with self._pending_lock(name):
+            return self._read_pending(name)
+
+    def consume_pending(self, name, through_timestamp):
+        """Descartar las observaciones ya usadas; conserva las llegadas después"""
+        with self._pending_lock(name):
+            current = self._read_pending(name)
+            if current is not None:
+                keep = current[1] > through_timestamp
+                self._write_pending(name, current[0][keep], current[1][keep])
+
+    def watermark(self, name):
+        """Versión del modelo y marca de sus datos para claves de caché.
+
+        Sólo consulta ``stat`` de los metadatos y de ``pending.npz``, así que
+        detecta guardados y observaciones nuevas hechos por otros procesos.
+        """
+        stamps = []
+        for filename in (METADATA_FILE, PENDING_FILE):
+            try:
+                stamps.append(os.stat(self._path(name, filename)).st_mtime_ns)
+            except OSError:
+                stamps.append(0)
+        self._refresh(name, stamps[0])
+        version = (self.metadata.get(name) or {}).get('version', 0)
+        return f'{version}.{stamps[0]:x}.{stamps[1]:x}'
+
+    # ===== LECTURA =====
+
+    def get(self, name):
+        """Modelo cargado (desde caché o disco); KeyError si no existe"""
+        # Un modelo entrenado o reentrenado por otro proceso (un stat por consulta)
+        self._refresh(name)
+        with self._lock:
+            if name in self._loaded:
+                self._loaded.move_to_end(name)
+                self.hits += 1
+                return self._loaded[name][0]
+            if name not in self.metadata:
+                raise KeyError(name)
+            lock = self._load_locks.setdefault(name, threading.Lock())
+
+        # Una sola carga por modelo aunque lleguen varias requests a la vez
+        with lock:
+            with self._lock:
+                if name in self._loaded:
+                    self._loaded.move_to_end(name)
+                    self.hits += 1
+                    return self._loaded[name][0]
+                self.misses += 1
+                version = self.metadata[name].get('version')
+            start = time.perf_counter()
+            model = joblib.load(self._path(name, MODEL_FILE), mmap_mode=self.mmap_mode)
+            elapsed = time.perf_counter() - start
+            size = os.path.getsize(self._path(name, MODEL_FILE))
+            with self._lock:
+                self.load_seconds += elapsed
+                self._loaded[name] = (model, size, version)
+                self._resident_bytes += size
+                while self._resident_bytes > self.memory_budget and len(self._loaded) > 1:
+                    self._evict(next(iter(self._loaded)))
+                    self.evictions += 1
+            return model
+
+    def _evict(self, name):
+        entry = self._loaded.pop(name, None)
+        if entry is not None:
+            self._resident_bytes -= entry[1]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'registered': len(self.metadata),
+                'loaded': len(self._loaded),
+                'resident_bytes': self._resident_bytes,
+                'memory_budget_bytes': self.memory_budget,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'avg_load_ms': round(self.load_seconds / self.misses * 1000, 3) if self.misses else 0.0,
+            }
+
+
+class ModelManager:
+    """Entrenamiento, registro y consulta de estado de los modelos"""
+
+    def __init__(self, config=None, scan=True):
+        self.config = config or Config.ML_CONFIG
+        registry_config = self.config.get('registry', {})
+        self.registry = ModelRegistry(
+            self.config['models_path'],
+            memory_budget=registry_config.get('memory_budget_mb', 512) * 1024 * 1024,
+            mmap=registry_config.get('mmap', True),
+            scan=scan,
+        )
+        self._jobs = None
+        self._jobs_lock = threading.Lock()
+        self.last_retrain = None
+
+    @property
+    def jobs(self):
+        """Cola de entrenamiento (el pool de procesos se crea en el primer uso)"""
+        if self._jobs is None:
+            with self._jobs_lock:
+                if self._jobs is None:
+                    from services.training_jobs import TrainingJobQueue
+                    self._jobs = TrainingJobQueue(self.config, on_complete=self._job_completed)
+        return self._jobs
+
+    def _job_completed(self, job):
+        if job.get('status') == 'completed' and job.get('result'):
+            self.registry.reload(job['result']['name'])
+
+    def get_model(self, model_type, device_id=None):
+        return self.registry.get(model_name(model_type, device_id))
+
+    def watermark(self, model_type, device_id=None):
+        return self.registry.watermark(model_name(model_type, device_id))
+
+    # ===== ENTRENAMIENTO =====
+
+    @staticmethod
+    def validate_model_type(model_type):
+        if model_type not in TRAINERS:
+            raise ValueError(f"model_type debe ser uno de: {', '.join(TRAINERS)}")
+
+    def fit(self, model_type, training_data, parameters, progress=None):
+        """Entrenar y guardar un modelo en el proceso actual.
+
+        ``progress(fracción)`` se invoca entre etapas y puede lanzar una
+        excepción para abortar (cancelación).
+        """
+        progress = progress or (lambda fraction: None)
+        self.validate_model_type(model_type)
+        series = np.asarray((training_data or {}).get('series', ()), dtype=np.float64)
+        if not series.size:
+            raise ValueError('training_data.series es requerido')
+        timestamps = np.asarray(training_data.get('timestamps', np.arange(series.size) * 3600),
+                                dtype=np.int64)
+        if timestamps.size != series.size:
+            raise ValueError('series y timestamps deben tener la misma longitud')
+
+        progress(0.1)
+        start = time.perf_counter()
+        model, metrics = TRAINERS[model_type](series, timestamps, parameters)
+        progress(0.8)
+        return self._save(model_type, parameters.get('device_id'), model, metrics,
+                          series, timestamps, time.perf_counter() - start, mode='full')
+
+    def _save(self, model_type, device_id, model, metrics, series, timestamps, seconds, mode):
+        metadata = {
+            'model_type': model_type,
+            'device_id': device_id,
+            'trained_at': datetime.utcnow().isoformat(),
+            'training_seconds': round(seconds, 4),
+            'training_mode': mode,
+            'samples': int(series.size),
+            'metrics': metrics,
+        }
+        return self.registry.save(model_name(model_type, device_id), model, metadata,
+                                  training={'series': series, 'timestamps': timestamps})
+
+    def train_model(self, model_type, training_data, parameters=None):
+        """Encolar un entrenamiento; retorna el trabajo (id, estado, tiempo estimado)"""
+        self.validate_model_type(model_type)
+        return self.jobs.submit(model_type, training_data, parameters or {})
+
+    def get_training_job(self, job_id):
+        return self.jobs.get(job_id)
+
+    def cancel_training_job(self, job_id):
+        return self.jobs.cancel(job_id)
+
+    # ===== REENTRENAMIENTO =====
+
+    def add_observations(self, model_type, device_id, series, timestamps=None):
+        """Acumular observaciones nuevas de un modelo para el reentrenamiento.
+
+        Retorna la cantidad de observaciones pendientes; KeyError si el
+        modelo no existe.
+        """
+        name = model_name(model_type, device_id)
+        if name not in self.registry.metadata and self.registry.reload(name) is None:
+            raise KeyError(name)
+        series = np.asarray(series, dtype=np.float64)
+        if timestamps is None:
+            timestamps = np.full(series.size, int(time.time()), dtype=np.int64)
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        if not series.size or timestamps.size != series.size:
+            raise ValueError('series y timestamps deben tener la misma longitud (no vacía)')
+        limit = self.config.get('retraining', {}).get('max_training_samples', 10000)
+        return self.registry.append_pending(name, series, timestamps, limit)
+
+    def retrain(self, name):
+        """Reentrenar un modelo si sus observaciones nuevas muestran deriva.
+
+        - deriva < ``drift_threshold``: se omite
+        - deriva < ``full_refit_threshold``: actualización incremental desde
+          el modelo anterior (``UPDATERS``) sobre la ventana retenida
+        - deriva mayor (cambio de régimen): entrenamiento completo sólo con
+          las observaciones nuevas
+
+        Retorna el detalle con los tiempos (ms) de cada etapa.
+        """
+        settings = self.config.get('retraining', {})
+        report = {'name': name, 'action': 'skipped', 'drift': None, 'new_samples': 0}
+        timings = report['timings_ms'] = {}
+        started = time.perf_counter()
+
+        def lap(stage, since):
+            now = time.perf_counter()
+            timings[stage] = round((now - since) * 1000, 3)
+            return now
+
+        metadata = self.registry.reload(name)
+        pending = self.registry.pending(name)
+        training = self.registry.training_data(name)
+        mark = lap('load', started)
+        if metadata is None or pending is None or training is None:
+            report['reason'] = 'sin observaciones nuevas' if metadata else 'modelo sin datos de entrenamiento'
+            report['total_ms'] = round((time.perf_counter() - started) * 1000, 3)
+            return report
+
+        new_series, new_timestamps = pending
+        report['new_samples'] = int(new_series.size)
+        if new_series.size < settings.get('min_new_samples', 24):
+            report['reason'] = 'pocas observaciones nuevas'
+            report['total_ms'] = round((time.perf_counter() - started) * 1000, 3)
+            return report
+
+        drift = report['drift'] = drift_score(training['series'], new_series)
+        mark = lap('drift', mark)
+        if drift < settings.get('drift_threshold', 0.5):
+            report['reason'] = 'deriva bajo el umbral'
+            report['total_ms'] = round((time.perf_counter() - started) * 1000, 3)
+            return report
+
+        model_type = metadata['model_type']
+        parameters = {'device_id': metadata.get('device_id')}
+        limit = settings.get('max_training_samples', 10000)
+        model = None
+        if drift < settings.get('full_refit_threshold', 3.0) and model_type in UPDATERS:
+            series = np.concatenate([training['series'], new_series])[-limit:]
+            timestamps = np.concatenate([training['timestamps'], new_timestamps])[-limit:]
+            try:
+                model, metrics = UPDATERS[model_type](self.registry.get(name), new_series,
+                                                      new_timestamps, parameters, series)
+                report['action'] = 'incremental'
+            except KeyError:
+                # Artefacto de una versión anterior sin acumulados
+                model = None
+        if model is None:
+            series, timestamps = new_series[-limit:], new_timestamps[-limit:]
+            model, metrics = TRAINERS[model_type](series, timestamps, parameters)
+            report['action'] = 'full'
+        train_start = mark
+        mark = lap('train', mark)
+
+        self._save(model_type, parameters['device_id'], model, metrics, series, timestamps,
+                   mark - train_start, mode=report['action'])
+        self.registry.consume_pending(name, int(new_timestamps.max()))
+        lap('save', mark)
+        report['total_ms'] = round((time.perf_counter() - started) * 1000, 3)
+        return report
+
+    def retrain_all_models(self, max_workers=1):
+        """Reentrenar en paralelo los modelos con observaciones pendientes.
+
+        Sólo los modelos con ``pending.npz`` se envían al pool de procesos
+        (``max_workers``); el resto se informa como omitido sin abrir sus
+        archivos. Retorna un resumen con el detalle de tiempos por modelo.
+        """
+        started = time.perf_counter()
+        names = list(self.registry.metadata)
+        candidates = [name for name in names if self.registry.has_pending(name)]
+        reports = {name: {'name': name, 'action': 'skipped', 'reason': 'sin observaciones nuevas'}
+                   for name in names if name not in candidates}
+
+        workers = max(1, min(int(max_workers), len(candidates)))
+        if workers == 1:
+            for name in candidates:
+                reports[name] = self._safe_retrain(name)
+        else:
+            with ProcessPoolExecutor(max_workers=workers,
+                                     mp_context=multiprocessing.get_context('spawn')) as pool:
+                futures = {name: pool.submit(retrain_model, self.config, name) for name in candidates}
+                for name, future in futures.items():
+                    try:
+                        reports[name] = future.result()
+                    except Exception as e:
+                        reports[name] = {'name': name, 'action': 'failed', 'error': str(e)}
+            for name in candidates:
+                if reports[name]['action'] in ('incremental', 'full'):
+                    self.registry.reload(name)
+
+        models = [reports[name] for name in names]
+        summary = {'workers': workers, 'candidates': len(candidates)}
+        for action in ('incremental', 'full', 'skipped', 'failed'):
+            summary[action] = sum(1 for report in models if report['action'] == action)
+        summary['total_seconds'] = round(time.perf_counter() - started, 3)
+        summary['finished_at'] = datetime.utcnow().isoformat()
+        summary['models'] = models
+        self.last_retrain = summary
+        return summary
+
+    def _safe_retrain(self, name):
+        try:
+            return self.retrain(name)
+        except Exception as e:
+            logger.error(f"Error reentrenando {name}: {e}")
+            return {'name': name, 'action': 'failed', 'error': str(e)}
+
+    # ===== ESTADO =====
+
+    def get_models_status(self, include_models=True):
+        """Estado a partir de metadatos en memoria (nunca lee los artefactos)"""
+        metadata = self.registry.metadata
+        by_type = {}
+        for entry in metadata.values():
+            by_type[entry.get('model_type')] = by_type.get(entry.get('model_type'), 0) + 1
+        status = {'total': len(metadata), 'by_type': by_type, 'registry': self.registry.stats()}
+        if self.last_retrain is not None:
+            status['last_retrain'] = {key: value for key, value in self.last_retrain.items()
+                                      if key != 'models'}
+        if include_models:
+            status['models'] = {
+                name: {key: entry.get(key) for key in
+                       ('model_type', 'device_id', 'version', 'trained_at', 'training_mode',
+                        'size_bytes', 'metrics')}
+                for name, entry in metadata.items()
+            }
+        return status
+
+
+def retrain_model(config, name):
+    """Reentrenar un modelo en un proceso del pool (ver ``ModelManager.retrain``)"""
+    return ModelManager(config, scan=False)._safe_retrain(name)
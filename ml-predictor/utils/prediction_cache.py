@@ -0,0 +1,351 @@
+"""
+Caché de predicciones en dos niveles
+WIN NOC - Centro de Operaciones de Red
+
+1. LRU en memoria del proceso (sin serializar, microsegundos)
+2. Nivel compartido entre workers: Redis si está configurado, o diskcache
+   (SQLite en disco local) cuando no lo está o Redis no responde
+
+La clave incluye el endpoint, los parámetros, y la versión y marca de
+datos del modelo (``ModelRegistry.watermark``): un modelo reentrenado o
+con observaciones nuevas produce claves nuevas y las entradas viejas
+simplemente expiran por TTL. Las consultas concurrentes de una clave
+ausente se resuelven con un solo cálculo (single-flight).
+
+Una invalidación explícita incrementa contadores de generación (global y
+por endpoint) guardados en el nivel compartido, que también forman parte de
+la clave: los demás workers dejan de usar sus entradas locales en cuanto
+releen la generación (a lo sumo cada ``generation_check_seconds``).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(prefix, endpoint, watermark, params):
+    """``prefix:endpoint:watermark:hash(params)`` (parámetros en orden canónico)"""
+    digest = hashlib.blake2b(json.dumps(params, sort_keys=True, default=str).encode(),
+                             digest_size=12).hexdigest()
+    return f'{prefix}:{endpoint}:{watermark}:{digest}'
+
+
+class LocalTier:
+    """LRU acotada con expiración por entrada"""
+
+    name = 'local'
+
+    def __init__(self, max_entries):
+        self.max_entries = max(1, int(max_entries))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, now):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, expires_at, value):
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, prefix, endpoint=None):
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisTier:
+    """Nivel compartido en Redis (timeouts cortos: una caída no frena la API)"""
+
+    name = 'redis'
+
+    def __init__(self, host, port, password, db, timeout):
+        import redis
+
+        self.client = redis.Redis(host=host, port=port, password=password or None, db=db,
+                                  socket_timeout=timeout, socket_connect_timeout=timeout)
+        self.client.ping()
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def generations(self, names):
+        return [int(value or 0) for value in self.client.mget(names)]
+
+    def bump(self, name):
+        self.client.incr(name)
+
+    def set(self, key, payload, ttl, tag):
+        self.client.set(key, payload, px=max(1, int(ttl * 1000)))
+
+    def invalidate(self, prefix, endpoint=None):
+        batch = []
+        for key in self.client.scan_iter(match=f'{prefix}*', count=500):
+            batch.append(key)
+            if len(batch) >= 500:
+                self.client.delete(*batch)
+                batch = []
+        if batch:
+            self.client.delete(*batch)
+
+
+class DiskTier:
+    """Nivel compartido en diskcache: sirve sin red y entre workers del mismo host"""
+
+    name = 'disk'
+
+    def __init__(self, path, size_limit):
+        import diskcache
+
+        self.cache = diskcache.Cache(path, size_limit=size_limit, eviction_policy='least-recently-stored')
+        # Aparte, para que ni la expulsión por tamaño ni clear() los reinicien
+        self.counters = diskcache.Cache(os.path.join(path, 'generations'), eviction_policy='none')
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def generations(self, names):
+        return [self.counters.get(name, 0) for name in names]
+
+    def bump(self, name):
+        self.counters.incr(name, default=0)
+
+    def set(self, key, payload, ttl, tag):
+        self.cache.set(key, payload, expire=ttl, tag=tag)
+
+    def invalidate(self, prefix, endpoint=None):
+        # Las entradas llevan el endpoint como tag; sin endpoint se vacía todo
+        if endpoint:
+            self.cache.evict(endpoint)
+        else:
+            self.cache.clear()
+
+
+class _Flight:
+    """Cálculo en curso de una clave; los demás solicitantes lo esperan"""
+
+    __slots__ = ('event', 'value', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class PredictionCache:
+    """Caché de resultados de predicción por endpoint.
+
+    ``get_or_compute(endpoint, params, watermark, compute)`` retorna
+    ``(valor, origen)`` con origen ``'local'``, ``'shared'``, ``'coalesced'``
+    (esperó el cálculo de otra request) o ``'miss'``.
+    Los valores deben ser serializables a JSON (son respuestas de la API) y
+    no deben modificarse: el nivel local entrega el mismo objeto.
+    """
+
+    def __init__(self, cache_config, redis_config=None):
+        self.config = cache_config
+        self.redis_config = redis_config or {}
+        self.enabled = cache_config.get('enabled', True)
+        self.prefix = cache_config.get('key_prefix', 'win-ml')
+        self.ttls = dict(cache_config.get('ttl', {}))
+        self.default_ttl = float(cache_config.get('default_ttl', 60))
+        self.local = LocalTier(cache_config.get('local_max_entries', 1024))
+        self.generation_ttl = float(cache_config.get('generation_check_seconds', 1.0))
+        # endpoint -> (momento de lectura, generación)
+        self._generations = {}
+        self._shared = None
+        self._shared_pid = None
+        self._shared_lock = threading.Lock()
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+
+    # ===== NIVEL COMPARTIDO =====
+
+    def _open_shared(self):
+        backend = self.config.get('backend', 'disk')
+        if backend == 'redis':
+            try:
+                return RedisTier(self.redis_config.get('host', 'localhost'),
+                                 self.redis_config.get('port', 6379),
+                                 self.redis_config.get('password'),
+                                 self.redis_config.get('db', 0),
+                                 self.config.get('redis_timeout', 0.25))
+            except Exception as e:
+                logger.warning(f"Redis no disponible para la caché ({e}); se usa diskcache")
+        if backend in ('redis', 'disk'):
+            try:
+                return DiskTier(self.config.get('disk_path', 'temp/prediction_cache'),
+                                self.config.get('disk_size_limit_mb', 256) * 1024 * 1024)
+            except Exception as e:
+                logger.warning(f"diskcache no disponible ({e}); caché sólo en memoria")
+        return None
+
+    def shared(self):
+        """Nivel compartido del proceso actual (se reabre tras un fork)"""
+        pid = os.getpid()
+        if self._shared_pid != pid:
+            with self._shared_lock:
+                if self._shared_pid != pid:
+                    self._shared = self._open_shared()
+                    self._shared_pid = pid
+                    if self._shared is not None:
+                        logger.info(f"Caché de predicciones: memoria + {self._shared.name}")
+        return self._shared
+
+    def _shared_call(self, endpoint, method, *args):
+        tier = self.shared()
+        if tier is None:
+            return None
+        try:
+            return getattr(tier, method)(*args)
+        except Exception as e:
+            self._count(endpoint, 'shared_errors')
+            logger.debug(f"Error en la caché compartida ({tier.name}.{method}): {e}")
+            return None
+
+    def _generation_names(self, endpoint):
+        # Fuera del espacio de claves de las entradas (no las alcanza invalidate)
+        return [f'{self.prefix}-generation:all', f'{self.prefix}-generation:{endpoint}']
+
+    def generation(self, endpoint):
+        """Generación vigente del endpoint (global y propia), releída del
+        nivel compartido cada ``generation_ttl`` segundos"""
+        now = time.monotonic()
+        cached = self._generations.get(endpoint)
+        if cached is not None and now - cached[0] < self.generation_ttl:
+            return cached[1]
+        values = self._shared_call(endpoint, 'generations', self._generation_names(endpoint))
+        if values is not None:
+            generation = '.'.join(map(str, values))
+        else:
+            generation = cached[1] if cached is not None else '0.0'
+        self._generations[endpoint] = (now, generation)
+        return generation
+
+    # ===== MÉTRICAS =====
+
+    def _count(self, endpoint, counter, amount=1):
+        with self._stats_lock:
+            stats = self._stats.setdefault(endpoint, {
+                'local_hits': 0, 'shared_hits': 0, 'misses': 0, 'coalesced': 0,
+                'shared_errors': 0, 'compute_seconds': 0.0,
+            })
+            stats[counter] += amount
+
+    def stats(self):
+        with self._stats_lock:
+            endpoints = {endpoint: dict(stats) for endpoint, stats in self._stats.items()}
+        totals = {'local_hits': 0, 'shared_hits': 0, 'misses': 0, 'coalesced': 0, 'shared_errors': 0}
+        for stats in endpoints.values():
+            for counter in totals:
+                totals[counter] += stats[counter]
+            lookups = stats['local_hits'] + stats['shared_hits'] + stats['misses'] + stats['coalesced']
+            stats['hit_ratio'] = round((lookups - stats['misses']) / lookups, 4) if lookups else 0.0
+            stats['avg_compute_ms'] = (round(stats['compute_seconds'] / stats['misses'] * 1000, 3)
+                                       if stats['misses'] else 0.0)
+            del stats['compute_seconds']
+        lookups = sum(totals.values()) - totals['shared_errors']
+        shared = self._shared if self._shared_pid == os.getpid() else None
+        return dict(totals,
+                    enabled=self.enabled,
+                    hit_ratio=round((lookups - totals['misses']) / lookups, 4) if lookups else 0.0,
+                    local_entries=len(self.local),
+                    shared_backend=shared.name if shared is not None else None,
+                    endpoints=endpoints)
+
+    # ===== CONSULTA =====
+
+    def get_or_compute(self, endpoint, params, watermark, compute):
+        if not self.enabled:
+            return compute(), 'miss'
+        key = cache_key(self.prefix, endpoint, f'{watermark}:{self.generation(endpoint)}', params)
+        now = time.time()
+        entry = self.local.get(key, now)
+        if entry is not None:
+            self._count(endpoint, 'local_hits')
+            return entry[1], 'local'
+
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            flight.event.wait()
+            self._count(endpoint, 'coalesced')
+            if flight.error is not None:
+                raise flight.error
+            return flight.value, 'coalesced'
+
+        try:
+            value, origin = self._load_or_compute(endpoint, key, compute)
+            flight.value = value
+            return value, origin
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._flights_lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+
+    def _load_or_compute(self, endpoint, key, compute):
+        payload = self._shared_call(endpoint, 'get', key)
+        if payload is not None:
+            try:
+                expires_at, value = json.loads(payload)
+            except (TypeError, ValueError):
+                expires_at = None
+            if expires_at is not None and expires_at > time.time():
+                self.local.set(key, expires_at, value)
+                self._count(endpoint, 'shared_hits')
+                return value, 'shared'
+
+        start = time.perf_counter()
+        value = compute()
+        self._count(endpoint, 'compute_seconds', time.perf_counter() - start)
+        self._count(endpoint, 'misses')
+
+        ttl = float(self.ttls.get(endpoint, self.default_ttl))
+        if ttl > 0:
+            expires_at = time.time() + ttl
+            # Ida y vuelta por JSON: el nivel local guarda lo mismo que el compartido
+            payload = json.dumps([expires_at, value], default=str)
+            value = json.loads(payload)[1]
+            self.local.set(key, expires_at, value)
+            self._shared_call(endpoint, 'set', key, payload, ttl, endpoint)
+        return value, 'miss'
+
+    def invalidate(self, endpoint=None):
+        """Descartar las entradas de un endpoint (o todas) en ambos niveles.
+
+        La generación se incrementa antes de borrar: los demás workers
+        descartan sus entradas locales al releerla.
+        """
+        prefix = f'{self.prefix}:{endpoint}:' if endpoint else f'{self.prefix}:'
+        names = self._generation_names(endpoint or 'all')
+        self._shared_call(endpoint or 'all', 'bump', names[1] if endpoint else names[0])
+        self._generations.clear()
+        self.local.invalidate(prefix)
+        self._shared_call(endpoint or 'all', 'invalidate', prefix, endpoint)
@@ -0,0 +1,287 @@
+"""
+Profiler por muestreo a nivel de request y spans de tiempo con nombre
+WIN NOC - Centro de Operaciones de Red
+
+Un request se perfila si trae ``X-Profile: <token>`` (con
+``ML_PROFILE_TOKEN`` configurado; ``NOC_PROFILE_TOKEN`` en el servidor NOC) o, con el profiler activado desde
+``/api/admin/profiler``, con probabilidad ``sample_rate``. Mientras haya
+requests perfilados, un hilo toma el stack de sus hilos cada ``interval``
+segundos (``sys._current_frames``) y acumula stacks colapsados por
+endpoint, en el formato de ``flamegraph.pl`` / speedscope::
+
+    POST:/api/predict/network;span:PredictionService.predict_network_performance;... 42
+
+``span(nombre)`` mide una sección caliente y agrega su nombre al stack de
+las muestras tomadas dentro de ella; ``instrument`` crea un span por cada
+llamada a un método de los servicios (``LazyService.wrappers``). Con el
+profiler apagado y sin requests perfilados, los hooks y los spans cuestan
+una comparación; el hilo de muestreo queda bloqueado en un ``Event``.
+
+Es la única implementación: ``noc/profiler.py`` carga este archivo (la
+imagen del ML sólo copia ``ml-predictor/``, el servidor NOC se despliega
+con el repositorio completo), así que sólo debe depender de Flask y de la
+biblioteca estándar.
+"""
+
+import functools
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from flask import g, request
+
+PROFILE_HEADER = 'X-Profile'
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NO_SPAN = _NoSpan()
+
+
+class _Span:
+    __slots__ = ('profiler', 'name', 'spans', 'start')
+
+    def __init__(self, profiler, name, spans):
+        self.profiler = profiler
+        self.name = name
+        self.spans = spans
+
+    def __enter__(self):
+        self.spans.append(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler._record_span(self.name, time.perf_counter() - self.start)
+        self.spans.pop()
+        return False
+
+
+def _frame_label(code):
+    return f'{os.path.basename(code.co_filename)}:{code.co_name}'
+
+
+class SamplingProfiler:
+    """Muestreo de stacks por endpoint y tiempos de spans"""
+
+    thread_name = 'ml-profiler'
+
+    def __init__(self, output_dir='profiles', interval=0.005, sample_rate=0.0, token=None,
+                 flush_interval=5.0, max_depth=64):
+        self.output_dir = output_dir
+        self.interval = float(interval)
+        self.sample_rate = float(sample_rate)
+        self.token = token or None
+        self.flush_interval = float(flush_interval)
+        self.max_depth = int(max_depth)
+        self.enabled = False
+        # Hilo -> (endpoint, spans abiertos); se reemplaza entero al cambiar
+        self._targets = {}
+        self._stacks = {}
+        self._samples = Counter()
+        self._span_stats = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._dirty = False
+        self._last_flush = time.monotonic()
+
+    # ===== CONTROL =====
+
+    def configure(self, enabled=None, sample_rate=None):
+        with self._lock:
+            if sample_rate is not None:
+                if not 0.0 <= float(sample_rate) <= 1.0:
+                    raise ValueError('sample_rate debe estar entre 0 y 1')
+                self.sample_rate = float(sample_rate)
+            if enabled is not None:
+                self.enabled = bool(enabled)
+        return self.status()
+
+    def reset(self):
+        with self._lock:
+            self._stacks = {}
+            self._samples = Counter()
+            self._span_stats = {}
+
+    def wants(self, header_value):
+        """¿Perfilar este request? (token en el encabezado o muestreo aleatorio)"""
+        if header_value is not None and self.token is not None and header_value == self.token:
+            return True
+        return self.enabled and self.sample_rate > 0 and random.random() < self.sample_rate
+
+    # ===== REQUESTS =====
+
+    def begin(self, label):
+        spans = self._spans()
+        ident = threading.get_ident()
+        with self._lock:
+            targets = dict(self._targets)
+            targets[ident] = (label, spans)
+            self._targets = targets
+        self._ensure_thread()
+        self._wake.set()
+
+    def end(self):
+        ident = threading.get_ident()
+        with self._lock:
+            if ident not in self._targets:
+                return
+            targets = dict(self._targets)
+            del targets[ident]
+            self._targets = targets
+            if not targets:
+                self._wake.clear()
+        if self._dirty and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def _spans(self):
+        spans = getattr(self._local, 'spans', None)
+        if spans is None:
+            spans = self._local.spans = []
+        return spans
+
+    def span(self, name):
+        """Contexto que mide ``name`` (no-op si no hay nada que perfilar)"""
+        if not self.enabled and not self._targets:
+            return NO_SPAN
+        return _Span(self, name, self._spans())
+
+    def wrap(self, name, fn):
+        """``fn`` ejecutada dentro de ``span(name)``"""
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with self.span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    def timed(self, name):
+        """Decorador equivalente a ``wrap(name, fn)``"""
+        return lambda fn: self.wrap(name, fn)
+
+    def instrument(self, services):
+        for service in services:
+            service.wrappers.append(lambda cls, method, fn: self.wrap(f'{cls}.{method}', fn))
+
+    def _record_span(self, name, seconds):
+        with self._lock:
+            stats = self._span_stats.get(name)
+            if stats is None:
+                stats = self._span_stats[name] = [0, 0.0, 0.0]
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+
+    # ===== MUESTREO =====
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name=self.thread_name,
+                                                    daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            time.sleep(self.interval)
+            targets = self._targets
+            if not targets:
+                continue
+            frames = sys._current_frames()
+            collected = []
+            for ident, (label, spans) in targets.items():
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                names = []
+                while frame is not None and len(names) < self.max_depth:
+                    names.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                names.reverse()
+                prefix = [label] + [f'span:{name}' for name in list(spans)]
+                collected.append((label, ';'.join(prefix + names)))
+            del frames
+            with self._lock:
+                for label, stack in collected:
+                    self._stacks.setdefault(label, Counter())[stack] += 1
+                    self._samples[label] += 1
+                self._dirty = self._dirty or bool(collected)
+
+    # ===== RESULTADOS =====
+
+    def collapsed(self, label=None):
+        """Stacks colapsados (``stack cuenta`` por línea) de un endpoint o de todos"""
+        with self._lock:
+            stacks = [self._stacks.get(label, Counter())] if label else list(self._stacks.values())
+            lines = [f'{stack} {count}' for counter in stacks for stack, count in counter.items()]
+        return '\n'.join(sorted(lines)) + ('\n' if lines else '')
+
+    def flush(self):
+        """Escribir ``<output_dir>/<endpoint>.folded`` con los stacks acumulados"""
+        with self._lock:
+            labels = list(self._stacks)
+            self._dirty = False
+            self._last_flush = time.monotonic()
+        if not labels:
+            return []
+        os.makedirs(self.output_dir, exist_ok=True)
+        written = []
+        for label in labels:
+            slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', label).strip('_') or 'root'
+            path = os.path.join(self.output_dir, f'{slug}.folded')
+            with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                f.write(self.collapsed(label))
+            os.replace(path + '.tmp', path)
+            written.append(path)
+        return written
+
+    def status(self):
+        with self._lock:
+            spans = {
+                name: {'count': count, 'total_ms': round(total * 1000, 3),
+                       'avg_ms': round(total / count * 1000, 3), 'max_ms': round(peak * 1000, 3)}
+                for name, (count, total, peak) in self._span_stats.items()
+            }
+            return {
+                'enabled': self.enabled,
+                'sample_rate': self.sample_rate,
+                'interval_ms': self.interval * 1000,
+                'header_enabled': self.token is not None,
+                'active_requests': len(self._targets),
+                'samples': dict(self._samples),
+                'spans': spans,
+                'output_dir': self.output_dir,
+            }
+
+    # ===== FLASK =====
+
+    def init_app(self, app):
+        @app.before_request
+        def _profile_begin():
+            header = request.headers.get(PROFILE_HEADER)
+            if header is None and not self.enabled:
+                return
+            if self.wants(header):
+                rule = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+                g._profiled = True
+                self.begin(f'{request.method}:{rule}')
+
+        @app.teardown_request
+        def _profile_end(exc):
+            if g.pop('_profiled', False):
+                self.end()
@@ -0,0 +1,336 @@
+"""
+Admisión de requests: API key y límite de tasa
+WIN NOC - Centro de Operaciones de Red
+
+Middleware WSGI que corre antes de Flask: valida la API key y descuenta
+tokens de dos cubetas por cliente (por minuto y por hora, según
+``SECURITY_CONFIG['rate_limit']``). Una request rechazada responde 401/429
+sin construir el objeto request ni parsear el JSON del cuerpo.
+
+El estado de cada cliente son tres números (tokens por minuto, por hora y
+la hora de actualización) y se comparte entre los workers de gunicorn:
+
+- ``redis``: un script Lua atómico por request
+- ``shm``: tabla de slots de tamaño fijo en un archivo mapeado en memoria
+  (``/dev/shm``) protegida con ``flock``
+- ``local``: diccionario LRU del proceso; también es el respaldo cuando el
+  backend compartido no está disponible
+"""
+
+import hashlib
+import hmac
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin backend en memoria compartida
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Slot: hash del cliente, tokens por minuto, tokens por hora, actualización
+SLOT = struct.Struct('<Qddd')
+PROBES = 8
+
+
+class Limits:
+    """Capacidad y tasa de recarga de las dos cubetas"""
+
+    __slots__ = ('minute', 'hour', 'minute_rate', 'hour_rate')
+
+    def __init__(self, per_minute, per_hour):
+        self.minute = float(max(1, per_minute))
+        self.hour = float(max(1, per_hour))
+        self.minute_rate = self.minute / 60.0
+        self.hour_rate = self.hour / 3600.0
+
+    def take(self, minute, hour, elapsed, cost):
+        """Recargar y descontar ``cost``; retorna (minuto, hora, admitida, reintentar en)"""
+        minute = min(self.minute, minute + elapsed * self.minute_rate)
+        hour = min(self.hour, hour + elapsed * self.hour_rate)
+        if minute >= cost and hour >= cost:
+            return minute - cost, hour - cost, True, 0.0
+        retry = max((cost - minute) / self.minute_rate, (cost - hour) / self.hour_rate, 0.0)
+        return minute, hour, False, retry
+
+
+# ===== BACKENDS =====
+
+class LocalBackend:
+    """Cubetas en memoria del proceso (LRU acotada a ``max_clients``)"""
+
+    name = 'local'
+
+    def __init__(self, limits, max_clients=65536):
+        self.limits = limits
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, client, cost):
+        now = time.time()
+        with self._lock:
+            minute, hour, updated = self._buckets.pop(client, (self.limits.minute, self.limits.hour, now))
+            minute, hour, allowed, retry = self.limits.take(minute, hour, now - updated, cost)
+            self._buckets[client] = (minute, hour, now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return allowed, retry
+
+
+class SharedMemoryBackend:
+    """Tabla de ``slots`` cubetas en un archivo mapeado, compartida por los
+    procesos del host. Direccionamiento abierto con ``PROBES`` intentos; con
+    la tabla llena se reutiliza el slot menos reciente de la secuencia.
+    """
+
+    name = 'shm'
+
+    def __init__(self, limits, path, slots=65536):
+        if fcntl is None:
+            raise RuntimeError('flock no disponible en esta plataforma')
+        self.limits = limits
+        self.path = path
+        self.slots = int(slots)
+        self.size = self.slots * SLOT.size
+        self._pid = None
+        self._lock = threading.Lock()
+        self._open()
+
+    def _open(self):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(fd).st_size < self.size:
+            os.ftruncate(fd, self.size)
+        self._fd = fd
+        self._map = mmap.mmap(fd, self.size)
+        self._pid = os.getpid()
+
+    def acquire(self, client, cost):
+        # Tras un fork el descriptor (y su flock) sería compartido con el padre
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._open()
+        key = int.from_bytes(hashlib.blake2b(client.encode(), digest_size=8).digest(), 'little') or 1
+        start = key % self.slots
+        now = time.time()
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                slot, oldest, oldest_updated = None, None, None
+                for probe in range(PROBES):
+                    offset = ((start + probe) % self.slots) * SLOT.size
+                    found, minute, hour, updated = SLOT.unpack_from(self._map, offset)
+                    if found == key:
+                        slot = offset
+                        break
+                    if found == 0:
+                        slot, minute, hour, updated = offset, self.limits.minute, self.limits.hour, now
+                        break
+                    if oldest is None or updated < oldest_updated:
+                        oldest, oldest_updated = offset, updated
+                else:
+                    slot, minute, hour, updated = oldest, self.limits.minute, self.limits.hour, now
+                minute, hour, allowed, retry = self.limits.take(minute, hour, max(0.0, now - updated), cost)
+                SLOT.pack_into(self._map, slot, key, minute, hour, now)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        return allowed, retry
+
+
+# Recarga y descuento atómicos en Redis (hora del servidor Redis)
+_REDIS_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+local cost = tonumber(ARGV[1])
+local cap_m, rate_m = tonumber(ARGV[2]), tonumber(ARGV[3])
+local cap_h, rate_h = tonumber(ARGV[4]), tonumber(ARGV[5])
+local state = redis.call('HMGET', KEYS[1], 'm', 'h', 't')
+local m = tonumber(state[1]) or cap_m
+local h = tonumber(state[2]) or cap_h
+local elapsed = math.max(0, now - (tonumber(state[3]) or now))
+m = math.min(cap_m, m + elapsed * rate_m)
+h = math.min(cap_h, h + elapsed * rate_h)
+local allowed, retry = 0, 0
+if m >= cost and h >= cost then
+    m, h, allowed = m - cost, h - cost, 1
+else
+    retry = math.max((cost - m) / rate_m, (cost - h) / rate_h)
+end
+redis.call('HSET', KEYS[1], 'm', tostring(m), 'h', tostring(h), 't', tostring(now))
+redis.call('EXPIRE', KEYS[1], 3600)
+return {allowed, tostring(retry)}
+"""
+
+
+class RedisBackend:
+    """Cubetas en Redis, compartidas entre hosts"""
+
+    name = 'redis'
+
+    def __init__(self, limits, host, port, password, db, timeout, prefix):
+        import redis
+
+        self.limits = limits
+        self.prefix = prefix
+        self.client = redis.Redis(host=host, port=port, password=password or None, db=db,
+                                  socket_timeout=timeout, socket_connect_timeout=timeout)
+        self.client.ping()
+        self._script = self.client.register_script(_REDIS_SCRIPT)
+
+    def acquire(self, client, cost):
+        limits = self.limits
+        allowed, retry = self._script(keys=[f'{self.prefix}:{client}'],
+                                      args=[cost, limits.minute, limits.minute_rate,
+                                            limits.hour, limits.hour_rate])
+        return bool(allowed), float(retry)
+
+
+# ===== LIMITADOR =====
+
+def _default_shm_path():
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(directory, 'win-ml-ratelimit')
+
+
+class RateLimiter:
+    """API key + cubetas por cliente con costo por endpoint.
+
+    El cliente es la dirección remota, junto con la API key sólo cuando
+    ésta coincide con la configurada (una key arbitraria por request no
+    abre cubetas nuevas). En ``endpoint_costs`` una regla ``'METODO /ruta'``
+    aplica sólo a ese método y a esa ruta exacta; una regla ``'/ruta'``
+    aplica a todo path que empiece con ella (gana la más larga). El costo
+    por defecto es 1 y se acota a la capacidad por minuto para que siempre
+    pueda admitirse.
+    """
+
+    def __init__(self, security_config, redis_config=None):
+        settings = security_config.get('rate_limit', {})
+        self.enabled = settings.get('enabled', True)
+        self.api_key_required = security_config.get('api_key_required', False)
+        self.api_key = (security_config.get('api_key') or '').encode()
+        self.limits = Limits(settings.get('requests_per_minute', 60),
+                             settings.get('requests_per_hour', 1000))
+        self.exact_costs, prefix_costs = {}, []
+        for rule, cost in settings.get('endpoint_costs', {}).items():
+            cost = min(float(cost), self.limits.minute)
+            method, _, path = rule.rpartition(' ')
+            if method:
+                self.exact_costs[(method.upper(), path)] = cost
+            else:
+                prefix_costs.append((path, cost))
+        self.costs = sorted(prefix_costs, key=lambda item: len(item[0]), reverse=True)
+        self.exempt = tuple(settings.get('exempt_paths', ('/api/health',)))
+        self.local = LocalBackend(self.limits, settings.get('slots', 65536))
+        self.backend = self._open_backend(settings, redis_config or {})
+        self._stats = {'admitted': 0, 'rejected': 0, 'unauthorized': 0, 'backend_errors': 0}
+        self._stats_lock = threading.Lock()
+
+    def _open_backend(self, settings, redis_config):
+        backend = settings.get('backend', 'shm')
+        if backend == 'redis':
+            try:
+                return RedisBackend(self.limits, redis_config.get('host', 'localhost'),
+                                    redis_config.get('port', 6379), redis_config.get('password'),
+                                    redis_config.get('db', 0), settings.get('redis_timeout', 0.1),
+                                    settings.get('key_prefix', 'win-ml:ratelimit'))
+            except Exception as e:
+                logger.warning(f"Redis no disponible para el límite de tasa ({e}); se usa memoria compartida")
+                backend = 'shm'
+        if backend == 'shm':
+            try:
+                return SharedMemoryBackend(self.limits, settings.get('shm_path') or _default_shm_path(),
+                                           settings.get('slots', 65536))
+            except Exception as e:
+                logger.warning(f"Memoria compartida no disponible para el límite de tasa ({e}); "
+                               f"límite por proceso")
+        return self.local
+
+    def cost(self, path, method='GET'):
+        cost = self.exact_costs.get((method, path))
+        if cost is not None:
+            return cost
+        for prefix, cost in self.costs:
+            if path.startswith(prefix):
+                return cost
+        return 1.0
+
+    def _count(self, counter):
+        with self._stats_lock:
+            self._stats[counter] += 1
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        return dict(stats, enabled=self.enabled, backend=self.backend.name,
+                    requests_per_minute=self.limits.minute, requests_per_hour=self.limits.hour)
+
+    def valid_key(self, api_key):
+        """La key enviada coincide con la configurada"""
+        return bool(api_key) and bool(self.api_key) and hmac.compare_digest(api_key.encode(), self.api_key)
+
+    def authorized(self, api_key):
+        return not self.api_key_required or self.valid_key(api_key)
+
+    def acquire(self, client, cost):
+        """Retorna (admitida, segundos hasta poder reintentar)"""
+        try:
+            return self.backend.acquire(client, cost)
+        except Exception as e:
+            self._count('backend_errors')
+            logger.debug(f"Error en el backend de límite de tasa ({self.backend.name}): {e}")
+            return self.local.acquire(client, cost)
+
+    def check(self, environ):
+        """Decidir la admisión a partir del entorno WSGI.
+
+        Retorna None si se admite, o (status, mensaje, encabezados).
+        """
+        path = environ.get('PATH_INFO', '')
+        method = environ.get('REQUEST_METHOD', 'GET')
+        if method == 'OPTIONS' or path.startswith(self.exempt):
+            return None
+        api_key = environ.get('HTTP_X_API_KEY', '')
+        valid_key = self.valid_key(api_key)
+        if self.api_key_required and not valid_key:
+            self._count('unauthorized')
+            return '401 UNAUTHORIZED', 'API key inválida o ausente', []
+        if not self.enabled:
+            return None
+        # Sólo una key validada distingue cubetas; cualquier otra se ignora
+        key_id = hashlib.blake2b(api_key.encode(), digest_size=8).hexdigest() if valid_key else '-'
+        client = f"{key_id}:{environ.get('REMOTE_ADDR', '')}"
+        allowed, retry = self.acquire(client, self.cost(path, method))
+        if allowed:
+            self._count('admitted')
+            return None
+        self._count('rejected')
+        return ('429 TOO MANY REQUESTS', 'Límite de requests excedido',
+                [('Retry-After', str(max(1, int(retry + 0.999))))])
+
+
+class AdmissionMiddleware:
+    """Envuelve ``app.wsgi_app`` y rechaza antes de que Flask procese la request"""
+
+    def __init__(self, wsgi_app, limiter):
+        self.wsgi_app = wsgi_app
+        self.limiter = limiter
+
+    def __call__(self, environ, start_response):
+        rejection = self.limiter.check(environ)
+        if rejection is None:
+            return self.wsgi_app(environ, start_response)
+        status, message, headers = rejection
+        body = json.dumps({'error': message}, ensure_ascii=False).encode('utf-8')
+        start_response(status, [('Content-Type', 'application/json'),
+                                ('Content-Length', str(len(body))), *headers])
+        return [body]
@@ -0,0 +1,389 @@
+"""
+Retención de datos por particiones de tiempo
+WIN NOC - Centro de Operaciones de Red
+
+Las series temporales se guardan en particiones por día o semana
+(``<tabla>_pAAAAMMDD``): en PostgreSQL como particiones declarativas
+(``PARTITION BY RANGE``) y en SQLite como tablas independientes. Expirar
+datos es entonces un ``DROP TABLE`` por partición en lugar de borrar fila
+por fila; las filas vencidas que quedan (la partición que cruza el corte y
+las tablas no particionadas) se borran en lotes chicos, cada uno en su
+propia transacción, para no retener locks.
+
+La tabla particionada por defecto es ``anomaly_events``: los endpoints de
+detección registran cada anomalía con un ``PartitionWriter`` (cola acotada
+y un hilo por proceso, fuera del camino de la request). Las muestras del
+NOC (``metric_samples`` de su SQLite) se depuran en el propio escritor del
+NOC (``noc.persistence``).
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from sqlalchemy import (BigInteger, Column, Date, DateTime, Float, Index, Integer, MetaData,
+                        String, Table, inspect, text)
+
+logger = logging.getLogger(__name__)
+
+PARTITION_SPANS = {'day': 86400, 'week': 7 * 86400}
+
+# Columnas de la tabla de muestras de métricas (ts en segundos epoch UTC)
+METRIC_COLUMNS = (
+    ('ts', BigInteger(), False),
+    ('device_id', Integer(), False),
+    ('metric', String(32), False),
+    ('value', Float(), True),
+)
+
+# Anomalías detectadas por el módulo de ML
+ANOMALY_EVENT_COLUMNS = (
+    ('ts', BigInteger(), False),
+    ('device_id', String(64), True),
+    ('metric', String(32), False),
+    ('value', Float(), True),
+    ('expected', Float(), True),
+    ('score', Float(), False),
+    ('severity', String(16), False),
+)
+
+# Esquema de cada tabla particionada conocida (el resto usa METRIC_COLUMNS)
+TABLE_COLUMNS = {
+    'metric_samples': METRIC_COLUMNS,
+    'anomaly_events': ANOMALY_EVENT_COLUMNS,
+}
+
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+# Borrado de un lote de filas vencidas por dialecto (identificador físico de fila)
+_CHUNK_DELETE = {
+    'sqlite': 'DELETE FROM {table} WHERE rowid IN '
+              '(SELECT rowid FROM {table} WHERE {column} < :cutoff LIMIT :limit)',
+    'postgresql': 'DELETE FROM {table} WHERE ctid IN '
+                  '(SELECT ctid FROM {table} WHERE {column} < :cutoff LIMIT :limit)',
+}
+
+
+def _check_identifier(name):
+    if not _IDENTIFIER.match(name):
+        raise ValueError(f'Nombre de tabla o columna inválido: {name}')
+    return name
+
+
+def _dialect(engine):
+    name = engine.dialect.name
+    if name not in _CHUNK_DELETE:
+        raise NotImplementedError(f'Retención no soportada para el dialecto {name}')
+    return name
+
+
+class PartitionedTable:
+    """Tabla de series temporales particionada por rangos de ``ts``"""
+
+    def __init__(self, engine, name, columns=METRIC_COLUMNS, partition='day'):
+        if partition not in PARTITION_SPANS:
+            raise ValueError(f"partition debe ser uno de: {', '.join(PARTITION_SPANS)}")
+        self.engine = engine
+        self.dialect = _dialect(engine)
+        self.name = _check_identifier(name)
+        self.columns = columns
+        self.partition = partition
+        self.span = PARTITION_SPANS[partition]
+        self._pattern = re.compile(rf'^{re.escape(name)}_p(\d{{8}})$')
+        self._known = set()
+        if self.dialect == 'postgresql':
+            self._create_parent()
+
+    def _table(self, name, **kwargs):
+        columns = [Column(column, kind, nullable=nullable) for column, kind, nullable in self.columns]
+        return Table(name, MetaData(), *columns, **kwargs)
+
+    def _create_parent(self):
+        table = self._table(self.name, postgresql_partition_by='RANGE (ts)')
+        Index(f'idx_{self.name}_device_ts', table.c.device_id, table.c.ts)
+        with self.engine.begin() as conn:
+            table.create(conn, checkfirst=True)
+
+    # ===== PARTICIONES =====
+
+    def bounds(self, ts):
+        """[inicio, fin) de la partición que contiene ``ts``"""
+        ts = int(ts)
+        # Las semanas van de lunes a domingo (el epoch cae en jueves)
+        offset = 3 * 86400 if self.partition == 'week' else 0
+        lo = ts - (ts + offset) % self.span
+        return lo, lo + self.span
+
+    def partition_name(self, lo):
+        return f"{self.name}_p{datetime.fromtimestamp(lo, timezone.utc):%Y%m%d}"
+
+    def ensure_partition(self, ts):
+        lo, hi = self.bounds(ts)
+        name = self.partition_name(lo)
+        if name in self._known:
+            return name
+        with self.engine.begin() as conn:
+            if self.dialect == 'postgresql':
+                conn.exec_driver_sql(
+                    f'CREATE TABLE IF NOT EXISTS {name} PARTITION OF {self.name} '
+                    f'FOR VALUES FROM ({lo}) TO ({hi})')
+            else:
+                table = self._table(name)
+                Index(f'idx_{name}_device_ts', table.c.device_id, table.c.ts)
+                table.create(conn, checkfirst=True)
+        self._known.add(name)
+        return name
+
+    def partitions(self):
+        """Particiones existentes como ``[(nombre, inicio, fin)]`` ordenadas"""
+        with self.engine.connect() as conn:
+            if self.dialect == 'postgresql':
+                names = conn.execute(text(
+                    'SELECT c.relname FROM pg_inherits i '
+                    'JOIN pg_class c ON c.oid = i.inhrelid '
+                    'JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = :name'),
+                    {'name': self.name}).scalars().all()
+            else:
+                names = inspect(conn).get_table_names()
+        found = []
+        for name in names:
+            match = self._pattern.match(name)
+            if match:
+                lo = int(datetime.strptime(match.group(1), '%Y%m%d')
+                         .replace(tzinfo=timezone.utc).timestamp())
+                found.append((name, lo, lo + self.span))
+        return sorted(found, key=lambda item: item[1])
+
+    # ===== DATOS =====
+
+    def insert(self, rows):
+        """Insertar filas (diccionarios con las columnas) en su partición"""
+        grouped = {}
+        for row in rows:
+            grouped.setdefault(self.ensure_partition(row['ts']), []).append(row)
+        with self.engine.begin() as conn:
+            for name, batch in grouped.items():
+                conn.execute(self._table(name).insert(), batch)
+        return sum(len(batch) for batch in grouped.values())
+
+
+class PartitionWriter:
+    """Escritura en segundo plano sobre una tabla particionada.
+
+    ``record`` sólo encola (cola acotada a ``queue_size`` filas; lo que no
+    entra se descarta y se cuenta en ``dropped``) y un hilo por proceso
+    inserta en lotes de ``batch_size``. La tabla se crea con
+    ``table_factory`` en el primer lote, así una base caída al iniciar no
+    bloquea requests: el lote se descarta, se registra y se reintenta luego
+    de ``retry_delay`` segundos.
+    """
+
+    def __init__(self, table_factory, queue_size=10000, batch_size=500, retry_delay=30.0):
+        self._factory = table_factory
+        self._table = None
+        self.queue_size = max(1, int(queue_size))
+        self.batch_size = max(1, int(batch_size))
+        self.retry_delay = float(retry_delay)
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._pid = None
+        self._retry_at = 0.0
+        self._pending = 0
+        self.written = 0
+        self.dropped = 0
+
+    def record(self, rows):
+        if not rows:
+            return
+        with self._cond:
+            # El hilo no sobrevive al fork: cada worker arranca el suyo
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._pending -= len(self._queue)
+                self._queue.clear()
+                threading.Thread(target=self._run, name='partition-writer', daemon=True).start()
+            room = self.queue_size - len(self._queue)
+            if len(rows) > room:
+                self.dropped += len(rows) - room
+                rows = rows[:room]
+            self._queue.extend(rows)
+            self._pending += len(rows)
+            self._cond.notify_all()
+
+    def _take(self):
+        return [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+
+    def _write(self, batch):
+        with self._write_lock:
+            try:
+                if time.monotonic() < self._retry_at:
+                    self.dropped += len(batch)
+                    return
+                if self._table is None:
+                    self._table = self._factory()
+                self.written += self._table.insert(batch)
+            except Exception as e:
+                self.dropped += len(batch)
+                self._retry_at = time.monotonic() + self.retry_delay
+                logger.warning(f"No se pudieron guardar {len(batch)} filas "
+                               f"({e.__class__.__name__}); reintento en {self.retry_delay:.0f} s")
+            finally:
+                with self._cond:
+                    self._pending -= len(batch)
+                    self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                batch = self._take()
+            self._write(batch)
+
+    def flush(self):
+        """Escribir ya lo encolado y esperar los lotes en curso (al salir y en tests)"""
+        while True:
+            with self._cond:
+                batch = self._take()
+                if not batch:
+                    while self._pending:
+                        self._cond.wait()
+                    return
+            self._write(batch)
+
+
+class RetentionManager:
+    """Expira los datos anteriores a ``retention_days``.
+
+    - Particiones completamente vencidas: ``DROP TABLE``
+    - Partición que cruza el corte y tablas no particionadas (``plain_tables``,
+      pares ``(tabla, columna de tiempo)``): borrado en lotes de
+      ``chunk_size`` filas con commit por lote y ``pause`` segundos entre lotes
+
+    Los bytes recuperados son, en SQLite, las páginas que pasan a la lista
+    libre; en PostgreSQL, el tamaño de las particiones eliminadas (el
+    espacio de las filas borradas lo reutiliza autovacuum y no se cuenta).
+    """
+
+    def __init__(self, engine, tables=(), plain_tables=(), retention_days=365, chunk_size=5000,
+                 pause=0.0):
+        self.engine = engine
+        self.dialect = _dialect(engine)
+        self.tables = list(tables)
+        self.plain_tables = [(_check_identifier(table), _check_identifier(column))
+                             for table, column in plain_tables]
+        self.retention_days = int(retention_days)
+        self.chunk_size = max(1, int(chunk_size))
+        self.pause = float(pause)
+
+    @classmethod
+    def from_config(cls, engine, data_config):
+        """Construir desde ``Config.DATA_CONFIG``"""
+        settings = data_config.get('partitioning', {})
+        tables = [PartitionedTable(engine, name, TABLE_COLUMNS.get(name, METRIC_COLUMNS),
+                                   partition=settings.get('interval', 'day'))
+                  for name in settings.get('tables', ())]
+        plain = [entry.split(':', 1) for entry in settings.get('cleanup_tables', ())]
+        return cls(engine, tables, plain,
+                   retention_days=data_config.get('retention_days', 365),
+                   chunk_size=settings.get('cleanup_chunk_size', 5000),
+                   pause=settings.get('cleanup_pause_ms', 0) / 1000)
+
+    # ===== MEDICIÓN =====
+
+    def _free_bytes(self, conn):
+        if self.dialect != 'sqlite':
+            return 0
+        pages = conn.exec_driver_sql('PRAGMA freelist_count').scalar()
+        return pages * conn.exec_driver_sql('PRAGMA page_size').scalar()
+
+    def _relation_bytes(self, conn, name):
+        if self.dialect != 'postgresql':
+            return 0
+        return conn.execute(text('SELECT pg_total_relation_size(CAST(:name AS regclass))'),
+                            {'name': name}).scalar() or 0
+
+    # ===== LIMPIEZA =====
+
+    def _drop(self, name):
+        with self.engine.begin() as conn:
+            rows = conn.exec_driver_sql(f'SELECT COUNT(*) FROM {name}').scalar()
+            before = self._free_bytes(conn)
+            size = self._relation_bytes(conn, name)
+            conn.exec_driver_sql(f'DROP TABLE IF EXISTS {name}')
+            freed = size + self._free_bytes(conn) - before
+        logger.info(f"Partición {name} eliminada ({rows} filas)")
+        return rows, freed
+
+    def _delete_chunks(self, table, column, cutoff):
+        """Borrar filas con ``column < cutoff`` en lotes; retorna (filas, lotes, bytes)"""
+        statement = text(_CHUNK_DELETE[self.dialect].format(table=table, column=column))
+        deleted = chunks = freed = 0
+        while True:
+            with self.engine.begin() as conn:
+                before = self._free_bytes(conn)
+                count = conn.execute(statement, {'cutoff': cutoff, 'limit': self.chunk_size}).rowcount
+                freed += self._free_bytes(conn) - before
+            deleted += count
+            chunks += 1
+            if count < self.chunk_size:
+                return deleted, chunks, freed
+            if self.pause:
+                time.sleep(self.pause)
+
+    def _cutoff_for(self, table, column, cutoff):
+        """El corte como epoch o datetime según el tipo de la columna"""
+        with self.engine.connect() as conn:
+            columns = {c['name']: c['type'] for c in inspect(conn).get_columns(table)}
+        if column not in columns:
+            raise ValueError(f'La tabla {table} no tiene la columna {column}')
+        if isinstance(columns[column], (DateTime, Date)):
+            return datetime.fromtimestamp(cutoff, timezone.utc).replace(tzinfo=None)
+        return cutoff
+
+    def run(self, now=None):
+        """Aplicar la retención; retorna el reporte de filas y bytes recuperados"""
+        started = time.perf_counter()
+        now = time.time() if now is None else now
+        cutoff = int(now - self.retention_days * 86400)
+        report = {
+            'cutoff': datetime.fromtimestamp(cutoff, timezone.utc).isoformat(),
+            'retention_days': self.retention_days,
+            'partitions_dropped': 0,
+            'rows_dropped': 0,
+            'rows_deleted': 0,
+            'chunks': 0,
+            'bytes_reclaimed': 0,
+            'tables': {},
+        }
+
+        def account(name, rows_key, rows, freed, chunks=0, dropped=0):
+            entry = report['tables'].setdefault(name, {'partitions_dropped': 0, 'rows_dropped': 0,
+                                                       'rows_deleted': 0, 'bytes_reclaimed': 0})
+            for target in (entry, report):
+                target[rows_key] += rows
+                target['bytes_reclaimed'] += freed
+                target['partitions_dropped'] += dropped
+            report['chunks'] += chunks
+
+        for table in self.tables:
+            for name, lo, hi in table.partitions():
+                if hi <= cutoff:
+                    rows, freed = self._drop(name)
+                    table._known.discard(name)
+                    account(table.name, 'rows_dropped', rows, freed, dropped=1)
+                elif lo < cutoff:
+                    rows, chunks, freed = self._delete_chunks(name, 'ts', cutoff)
+                    account(table.name, 'rows_deleted', rows, freed, chunks=chunks)
+
+        for name, column in self.plain_tables:
+            rows, chunks, freed = self._delete_chunks(name, column, self._cutoff_for(name, column, cutoff))
+            account(name, 'rows_deleted', rows, freed, chunks=chunks)
+
+        report['seconds'] = round(time.perf_counter() - started, 3)
+        return report
@@ -0,0 +1,4 @@
+"""
+WIN NOC - Núcleo del servidor de monitoreo
+Estructuras de datos y servicios internos usados por win_noc_server.py
+"""
@@ -0,0 +1,115 @@
+"""
+Agregados incrementales del dashboard
+Contadores mantenidos en cada transición para responder el overview en O(1)
+"""
+
+import threading
+
+import numpy as np
+
+from noc.codes import DEVICE_STATUSES, STATUS_CODES, STATUS_ONLINE
+
+INCIDENT_STATUSES = ('open', 'in_progress', 'resolved', 'closed')
+INCIDENT_PRIORITIES = ('low', 'medium', 'high', 'critical')
+
+
+class DashboardAggregates:
+    """Contadores del overview actualizados por eventos.
+
+    - Histograma de estados de dispositivos (por código de estado)
+    - Histogramas de incidencias por estado y por prioridad
+    - Suma y cantidad de calificaciones de satisfacción de clientes
+
+    La suma de satisfacción se lleva en décimas enteras para que el
+    promedio sea exacto sin importar el orden de las operaciones.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self.device_status = np.zeros(len(DEVICE_STATUSES), dtype=np.int64)
+        self.incident_status = dict.fromkeys(INCIDENT_STATUSES, 0)
+        self.incident_priority = dict.fromkeys(INCIDENT_PRIORITIES, 0)
+        self.satisfaction_tenths = 0
+        self.customer_count = 0
+
+    def rebuild(self, status_codes, incidents, customers):
+        """Recalcular todos los contadores desde cero (p. ej. tras un reset)"""
+        with self._lock:
+            self._clear()
+            self.device_status += np.bincount(np.asarray(status_codes, dtype=np.int64),
+                                              minlength=len(DEVICE_STATUSES))
+            for incident in incidents:
+                self._count_incident(incident, 1)
+            for customer in customers:
+                self._count_customer(customer)
+
+    # ===== DISPOSITIVOS =====
+
+    def device_added(self, status):
+        with self._lock:
+            self.device_status[STATUS_CODES[status]] += 1
+
+    def device_transitions(self, old_codes, new_codes):
+        """Aplicar un lote de cambios de estado (códigos antes y después)"""
+        if not len(old_codes):
+            return
+        minlength = len(DEVICE_STATUSES)
+        delta = (np.bincount(new_codes, minlength=minlength)
+                 - np.bincount(old_codes, minlength=minlength))
+        with self._lock:
+            self.device_status += delta
+
+    # ===== INCIDENCIAS =====
+
+    def _count_incident(self, incident, sign):
+        self.incident_status[incident['status']] = self.incident_status.get(incident['status'], 0) + sign
+        self.incident_priority[incident['priority']] = self.incident_priority.get(incident['priority'], 0) + sign
+
+    def incident_added(self, incident):
+        with self._lock:
+            self._count_incident(incident, 1)
+
+    def incident_updated(self, before, after):
+        with self._lock:
+            self._count_incident(before, -1)
+            self._count_incident(after, 1)
+
+    # ===== CLIENTES =====
+
+    def _count_customer(self, customer):
+        self.satisfaction_tenths += int(round(customer['satisfaction'] * 10))
+        self.customer_count += 1
+
+    def customer_added(self, customer):
+        with self._lock:
+            self._count_customer(customer)
+
+    # ===== LECTURA =====
+
+    def overview(self):
+        """Respuesta de /api/dashboard/overview a partir de los contadores"""
+        with self._lock:
+            online_devices = int(self.device_status[STATUS_ONLINE])
+            total_devices = int(self.device_status.sum())
+            open_incidents = self.incident_status.get('open', 0)
+            satisfaction_tenths = self.satisfaction_tenths
+            customer_count = self.customer_count
+            device_status = dict(zip(DEVICE_STATUSES, self.device_status.tolist()))
+            incident_status = dict(self.incident_status)
+            incident_priority = dict(self.incident_priority)
+
+        avg_satisfaction = satisfaction_tenths / 10 / customer_count if customer_count else 0
+        return {
+            'devices_online': online_devices,
+            'devices_total': total_devices,
+            'availability': round((online_devices / total_devices) * 100, 1) if total_devices else 0,
+            'open_incidents': open_incidents,
+            'avg_satisfaction': round(avg_satisfaction, 1),
+            'network_health': 'Good' if online_devices > total_devices * 0.8 else 'Warning',
+            'devices_by_status': device_status,
+            'incidents_by_status': incident_status,
+            'incidents_by_priority': incident_priority,
+        }
@@ -0,0 +1,59 @@
+"""
+Códigos numéricos compartidos por los almacenes columnares del NOC
+"""
+
+import threading
+
+import numpy as np
+
+# Estados de dispositivo ordenados de mejor a peor, de modo que el máximo
+# de un intervalo corresponde al peor estado observado
+DEVICE_STATUSES = ('online', 'warning', 'critical', 'offline')
+STATUS_CODES = {name: code for code, name in enumerate(DEVICE_STATUSES)}
+
+STATUS_ONLINE = STATUS_CODES['online']
+STATUS_WARNING = STATUS_CODES['warning']
+STATUS_CRITICAL = STATUS_CODES['critical']
+STATUS_OFFLINE = STATUS_CODES['offline']
+
+
+class Vocabulary:
+    """Tabla append-only de valores categóricos (ubicación, técnico, ...).
+
+    ``code`` asigna a cada valor distinto un entero estable que se guarda en
+    una columna NumPy; ``intern`` retorna la instancia canónica del valor,
+    de modo que los registros comparten una sola copia de cada cadena. Los
+    códigos nunca se reasignan, así que los lectores pueden consultar
+    ``names`` sin lock.
+    """
+
+    def __init__(self, values=()):
+        self._lock = threading.Lock()
+        self._codes = {}
+        self.names = []
+        for value in values:
+            self.code(value)
+
+    def __len__(self):
+        return len(self.names)
+
+    def code(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            with self._lock:
+                code = self._codes.get(value)
+                if code is None:
+                    code = self._codes[value] = len(self.names)
+                    self.names.append(value)
+        return code
+
+    def codes(self, values):
+        """Códigos de una secuencia de valores como arreglo"""
+        codes = list(map(self._codes.get, values))
+        if None in codes:
+            codes = [self.code(value) if code is None else code for value, code in zip(values, codes)]
+        return np.array(codes, dtype=np.int64)
+
+    def intern(self, value):
+        code = self._codes.get(value)
+        return self.names[self.code(value) if code is None else code]
@@ -0,0 +1,450 @@
+"""
+Colector asíncrono de telemetría de la flota.
+
+Sondea la IP de cada dispositivo en su propio intervalo con una sonda
+intercambiable:
+
+- ``AgentProbe``: consulta estilo SNMP GET por UDP (``cpu`` y ``memory``)
+  a un agente en el dispositivo (``noc.fakeagent`` lo simula)
+- ``TcpProbe``: alcanzabilidad por conexión TCP
+- ``IcmpProbe``: alcanzabilidad por eco ICMP (socket ICMP sin privilegios)
+
+Todo corre en un solo event loop (en un hilo propio) con un semáforo
+global que acota los sondeos simultáneos. Cada dispositivo tiene un timeout
+por sondeo, un desfase aleatorio inicial y jitter en cada intervalo para
+que los sondeos no coincidan, y backoff exponencial mientras no responde.
+Las lecturas se acumulan y se entregan en lotes a ``sink(ids, cpu, memory,
+reachable)`` (``FleetState.apply`` en el servidor) desde un hilo del
+executor, sin bloquear los sondeos.
+
+Objetivo: 20k dispositivos cada 10 s desde un proceso (ver
+benchmarks/bench_collector.py).
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import socket
+import struct
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Métrica no medida por la sonda (sólo alcanzabilidad)
+NO_VALUE = -1
+
+DEFAULT_AGENT_PORT = 1161
+DEFAULT_TCP_PORT = 22
+
+# Latencias de planificación recientes guardadas para los percentiles
+LAG_WINDOW = 4096
+
+
+class ProbeError(Exception):
+    """El dispositivo respondió con un error o con una respuesta inválida"""
+
+
+# ===== SONDAS =====
+
+class Probe:
+    """Interfaz de sondeo.
+
+    ``poll(ip)`` retorna ``(cpu, memory)`` en porcentaje, o ``NO_VALUE`` en
+    ambos si sólo verifica alcanzabilidad, y lanza ``ProbeError`` u
+    ``OSError`` si el dispositivo no responde. El colector aplica el
+    timeout cancelando la corrutina.
+    """
+
+    name = 'probe'
+
+    async def start(self):
+        """Preparar recursos compartidos dentro del event loop"""
+
+    async def poll(self, ip):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class _AgentProtocol(asyncio.DatagramProtocol):
+    def __init__(self, pending):
+        self.pending = pending
+
+    def datagram_received(self, data, addr):
+        try:
+            request_id, body = data.decode('ascii').split(' ', 1)
+            future = self.pending.get(int(request_id))
+        except (UnicodeDecodeError, ValueError):
+            return
+        if future is None or future.done():
+            return
+        try:
+            values = dict(field.split('=', 1) for field in body.split())
+            future.set_result((int(values['cpu']), int(values['memory'])))
+        except (KeyError, ValueError):
+            future.set_exception(ProbeError(f'Respuesta inválida: {body[:80]!r}'))
+
+    def error_received(self, exc):
+        # ICMP port unreachable de algún destino; el sondeo vence por timeout
+        logger.debug(f"Error UDP del colector: {exc}")
+
+
+class AgentProbe(Probe):
+    """Consulta estilo SNMP GET por UDP, multiplexada en un solo socket.
+
+    Pedido ``<id> <ip> GET cpu memory``; respuesta ``<id> cpu=<n>
+    memory=<n>``. La IP viaja en el pedido (como la comunidad SNMP) para
+    que ``agent=(host, puerto)`` pueda redirigir todos los pedidos a un
+    único agente simulado.
+    """
+
+    name = 'agent'
+
+    def __init__(self, port=DEFAULT_AGENT_PORT, agent=None):
+        self.port = int(port)
+        self.agent = agent
+        self._pending = {}
+        self._ids = itertools.count(1)
+        self._transport = None
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self._transport, _ = await loop.create_datagram_endpoint(
+            lambda: _AgentProtocol(self._pending), local_addr=('0.0.0.0', 0))
+
+    async def poll(self, ip):
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            self._transport.sendto(f'{request_id} {ip} GET cpu memory'.encode('ascii'),
+                                   self.agent or (ip, self.port))
+            return await future
+        finally:
+            del self._pending[request_id]
+
+    def close(self):
+        if self._transport is not None:
+            self._transport.close()
+
+
+class TcpProbe(Probe):
+    """Alcanzabilidad por conexión TCP; un rechazo (RST) también prueba que
+    el equipo está en línea"""
+
+    name = 'tcp'
+
+    def __init__(self, port=DEFAULT_TCP_PORT):
+        self.port = int(port)
+
+    async def poll(self, ip):
+        try:
+            _, writer = await asyncio.open_connection(ip, self.port)
+        except ConnectionRefusedError:
+            return NO_VALUE, NO_VALUE
+        writer.close()
+        return NO_VALUE, NO_VALUE
+
+
+def _checksum(data):
+    total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+class IcmpProbe(Probe):
+    """Eco ICMP con sockets ``SOCK_DGRAM``/``IPPROTO_ICMP`` (no requieren
+    root si ``net.ipv4.ping_group_range`` incluye al grupo del proceso);
+    el kernel asigna el identificador y entrega a cada socket sus propias
+    respuestas"""
+
+    name = 'icmp'
+
+    def __init__(self):
+        self._seq = itertools.count(1)
+
+    async def start(self):
+        # Fallar al arrancar y no marcar toda la flota offline
+        socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP).close()
+
+    async def poll(self, ip):
+        loop = asyncio.get_running_loop()
+        seq = next(self._seq) & 0xFFFF
+        header = struct.pack('!BBHHH', 8, 0, 0, 0, seq)
+        payload = b'win-noc'
+        packet = struct.pack('!BBHHH', 8, 0, _checksum(header + payload + b'\0'), 0, seq) + payload
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+        sock.setblocking(False)
+        try:
+            await loop.sock_connect(sock, (ip, 0))
+            await loop.sock_sendall(sock, packet)
+            while True:
+                reply = await loop.sock_recv(sock, 1024)
+                if len(reply) >= 8 and reply[0] == 0 and struct.unpack('!H', reply[6:8])[0] == seq:
+                    return NO_VALUE, NO_VALUE
+        finally:
+            sock.close()
+
+
+PROBES = {'agent': AgentProbe, 'tcp': TcpProbe, 'icmp': IcmpProbe}
+
+
+def make_probe(kind, port=None, agent=None):
+    """Sonda por nombre (``agent``, ``tcp`` o ``icmp``); ``agent`` es
+    ``'host:puerto'`` para redirigir los pedidos a un agente simulado"""
+    if kind not in PROBES:
+        raise ValueError(f"Sonda desconocida: {kind} (opciones: {', '.join(PROBES)})")
+    if kind == 'icmp':
+        return IcmpProbe()
+    if kind == 'tcp':
+        return TcpProbe(port or DEFAULT_TCP_PORT)
+    if agent:
+        host, _, agent_port = agent.rpartition(':')
+        agent = (host or '127.0.0.1', int(agent_port))
+    return AgentProbe(port or DEFAULT_AGENT_PORT, agent)
+
+
+# ===== COLECTOR =====
+
+class _Target:
+    __slots__ = ('device_id', 'ip', 'failures')
+
+    def __init__(self, device_id, ip):
+        self.device_id = device_id
+        self.ip = ip
+        self.failures = 0
+
+
+class DeviceCollector:
+    """Planificador de sondeos por dispositivo con concurrencia acotada.
+
+    ``source()`` retorna ``(ids, ips)`` de la flota y se relee cada
+    ``resync_interval`` segundos (altas, bajas y cambios de IP). Tras
+    ``offline_after`` fallas seguidas el dispositivo se reporta offline y
+    el intervalo se duplica en cada falla hasta ``max_backoff``.
+    """
+
+    def __init__(self, probe, sink, source, interval=10.0, concurrency=1000, timeout=2.0,
+                 jitter=0.1, offline_after=2, max_backoff=300.0, flush_interval=1.0,
+                 resync_interval=30.0, seed=None):
+        if concurrency < 1:
+            raise ValueError('concurrency debe ser mayor a 0')
+        self.probe = probe
+        self.sink = sink
+        self.source = source
+        self.interval = float(interval)
+        self.concurrency = int(concurrency)
+        self.timeout = float(timeout)
+        self.jitter = float(jitter)
+        self.offline_after = max(1, int(offline_after))
+        self.max_backoff = float(max_backoff)
+        self.flush_interval = float(flush_interval)
+        self.resync_interval = float(resync_interval)
+        self.running = False
+        self._rng = random.Random(seed)
+        self._targets = {}
+        self._heap = []
+        self._order = itertools.count()
+        self._readings = {}
+        self._tasks = set()
+        self._lags = np.zeros(LAG_WINDOW)
+        self._lag_count = 0
+        self._counters = dict.fromkeys(('polls', 'failures', 'timeouts', 'batches', 'sink_errors',
+                                        'probe_errors'), 0)
+        self._in_flight = 0
+        self._offline = 0
+        self._loop = None
+        self._slots = None
+        self._thread = None
+        self._stopping = None
+        self._wake = None
+
+    # ===== CICLO DE VIDA =====
+
+    def start(self):
+        """Correr el colector en un hilo con su propio event loop"""
+        self._thread = threading.Thread(target=lambda: asyncio.run(self.run()),
+                                        name='noc-collector', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        loop = self._loop
+        if loop is not None and self._stopping is not None:
+            loop.call_soon_threadsafe(self._stopping.set)
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    async def run(self):
+        """Sondear hasta ``stop()``; entrega las lecturas pendientes al salir"""
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        self._wake = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.concurrency)
+        try:
+            await self.probe.start()
+        except OSError as e:
+            logger.error(f"No se pudo iniciar la sonda {self.probe.name}: {e}")
+            return
+        self.running = True
+        logger.info(f"Colector iniciado (sonda {self.probe.name}, cada {self.interval:g} s, "
+                    f"hasta {self.concurrency} sondeos simultáneos)")
+        workers = [asyncio.create_task(coro) for coro in (self._schedule(), self._flush_loop(),
+                                                           self._resync_loop())]
+        try:
+            await self._stopping.wait()
+        finally:
+            self.running = False
+            for task in workers + list(self._tasks):
+                task.cancel()
+            await asyncio.gather(*workers, *self._tasks, return_exceptions=True)
+            await self._flush()
+            self.probe.close()
+
+    # ===== PLANIFICACIÓN =====
+
+    def sync(self, ids, ips):
+        """Alinear los dispositivos sondeados con la flota (llamar en el loop)"""
+        now = self._loop.time()
+        current = dict(zip(np.asarray(ids).tolist(), ips))
+        for device_id in self._targets.keys() - current.keys():
+            target = self._targets.pop(device_id)
+            self._offline -= target.failures >= self.offline_after
+        for device_id, ip in current.items():
+            target = self._targets.get(device_id)
+            if target is None:
+                target = self._targets[device_id] = _Target(device_id, ip)
+                # Desfase inicial uniforme para repartir la primera ronda
+                self._push(target, now + self._rng.uniform(0, self.interval))
+            else:
+                target.ip = ip
+        self._wake.set()
+
+    def _push(self, target, due):
+        heapq.heappush(self._heap, (due, next(self._order), target))
+
+    def _next_delay(self, target):
+        if target.failures < self.offline_after:
+            delay = self.interval
+        else:
+            delay = min(self.interval * 2 ** (target.failures - self.offline_after + 1), self.max_backoff)
+        return delay * (1 + self._rng.uniform(-self.jitter, self.jitter))
+
+    async def _schedule(self):
+        loop = self._loop
+        while True:
+            now = loop.time()
+            while self._heap and self._heap[0][0] <= now:
+                due, _, target = heapq.heappop(self._heap)
+                if self._targets.get(target.device_id) is not target:
+                    continue  # Dado de baja o reemplazado
+                # Con todos los cupos ocupados la planificación espera aquí
+                await self._slots.acquire()
+                now = loop.time()
+                self._record_lag(now - due)
+                task = loop.create_task(self._poll(target, due))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            delay = self._heap[0][0] - loop.time() if self._heap else self.resync_interval
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), max(0.0, delay))
+            except asyncio.TimeoutError:
+                pass
+
+    def _record_lag(self, seconds):
+        self._lags[self._lag_count % LAG_WINDOW] = seconds
+        self._lag_count += 1
+
+    async def _poll(self, target, due):
+        self._in_flight += 1
+        try:
+            cpu, memory = await asyncio.wait_for(self.probe.poll(target.ip), self.timeout)
+            ok = True
+        except asyncio.TimeoutError:
+            self._counters['timeouts'] += 1
+            ok = False
+        except (ProbeError, OSError) as e:
+            logger.debug(f"Sondeo fallido de {target.ip}: {e}")
+            ok = False
+        except Exception as e:
+            # Error inesperado de la sonda: cuenta como falla y el dispositivo
+            # se vuelve a planificar igual que en cualquier otro fallo
+            self._counters['probe_errors'] += 1
+            count = self._counters['probe_errors']
+            if count == 1 or count % 1000 == 0:
+                logger.error(f"Error inesperado sondeando {target.ip} ({count} en total): {e!r}",
+                             exc_info=count == 1)
+            ok = False
+        finally:
+            self._in_flight -= 1
+            self._slots.release()
+        self._counters['polls'] += 1
+
+        current = self._targets.get(target.device_id) is target
+        if ok:
+            self._offline -= current and target.failures >= self.offline_after
+            target.failures = 0
+            self._readings[target.device_id] = (cpu, memory, True)
+        else:
+            self._counters['failures'] += 1
+            target.failures += 1
+            self._offline += current and target.failures == self.offline_after
+            if target.failures >= self.offline_after:
+                self._readings[target.device_id] = (NO_VALUE, NO_VALUE, False)
+        if current:
+            # Con éxito se mantiene la fase (sin deriva); con fallas, backoff
+            now = self._loop.time()
+            base = due if ok else now
+            self._push(target, max(now, base + self._next_delay(target)))
+
+    # ===== ENTREGA Y SINCRONIZACIÓN =====
+
+    async def _flush(self):
+        if not self._readings:
+            return
+        readings, self._readings = self._readings, {}
+        ids = np.fromiter(readings.keys(), dtype=np.int64, count=len(readings))
+        values = np.array(list(readings.values()), dtype=np.int16).reshape(-1, 3)
+        try:
+            await self._loop.run_in_executor(None, self.sink, ids, values[:, 0], values[:, 1],
+                                             values[:, 2].astype(bool))
+            self._counters['batches'] += 1
+        except Exception as e:
+            self._counters['sink_errors'] += 1
+            logger.error(f"Error aplicando lecturas del colector: {e}")
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self._flush()
+
+    async def _resync_loop(self):
+        while True:
+            try:
+                self.sync(*self.source())
+            except Exception as e:
+                logger.error(f"Error leyendo la flota para el colector: {e}")
+            await asyncio.sleep(self.resync_interval)
+
+    # ===== ESTADO =====
+
+    def stats(self):
+        lags = self._lags[:min(self._lag_count, LAG_WINDOW)]
+        p50, p99 = np.percentile(lags, (50, 99)) if lags.size else (0.0, 0.0)
+        return dict(
+            self._counters,
+            running=int(self.running),
+            devices=len(self._targets),
+            offline=self._offline,
+            in_flight=self._in_flight,
+            concurrency=self.concurrency,
+            lag_p50_ms=round(float(p50) * 1000, 3),
+            lag_p99_ms=round(float(p99) * 1000, 3),
+        )
@@ -0,0 +1,105 @@
+"""
+Agente simulado para el colector (desarrollo, pruebas y benchmarks).
+
+Responde el protocolo UDP de ``noc.collector.AgentProbe`` para cualquier
+IP: cada dispositivo que consulta recibe una caminata aleatoria de CPU y
+memoria con los mismos pasos y límites que el simulador de la flota. Puede
+descartar pedidos (``loss``), dejar sin respuesta IPs concretas
+(``offline``) y demorar las respuestas (``latency``).
+
+Uso:
+    python -m noc.fakeagent --port 1161 --loss 0.01
+    NOC_COLLECTOR=1 NOC_COLLECTOR_AGENT=127.0.0.1:1161 python win_noc_server.py
+"""
+
+import argparse
+import asyncio
+import random
+
+from noc.fleet import (CPU_MAX, CPU_MIN, CPU_STEP, MEMORY_MAX, MEMORY_MIN,
+                       MEMORY_STEP)
+
+
+class FakeAgent(asyncio.DatagramProtocol):
+    """Agente UDP que simula las métricas de todos los dispositivos"""
+
+    def __init__(self, loss=0.0, offline=(), latency=0.0, seed=None):
+        self.loss = float(loss)
+        self.offline = set(offline)
+        self.latency = float(latency)
+        self.devices = {}
+        self.requests = 0
+        self.dropped = 0
+        self._rng = random.Random(seed)
+        self._transport = None
+
+    async def start(self, host='127.0.0.1', port=0):
+        """Escuchar en ``host:port`` (0 = puerto libre); retorna la dirección"""
+        loop = asyncio.get_running_loop()
+        self._transport, _ = await loop.create_datagram_endpoint(lambda: self, local_addr=(host, port))
+        return self._transport.get_extra_info('sockname')[:2]
+
+    def close(self):
+        if self._transport is not None:
+            self._transport.close()
+
+    def _metrics(self, ip):
+        metrics = self.devices.get(ip)
+        rng = self._rng
+        if metrics is None:
+            metrics = self.devices[ip] = [rng.randint(CPU_MIN, 60), rng.randint(MEMORY_MIN, 70)]
+        else:
+            metrics[0] = min(CPU_MAX, max(CPU_MIN, metrics[0] + rng.randint(-CPU_STEP, CPU_STEP)))
+            metrics[1] = min(MEMORY_MAX, max(MEMORY_MIN, metrics[1] + rng.randint(-MEMORY_STEP, MEMORY_STEP)))
+        return metrics
+
+    def datagram_received(self, data, addr):
+        self.requests += 1
+        try:
+            request_id, ip, _ = data.decode('ascii').split(' ', 2)
+        except (UnicodeDecodeError, ValueError):
+            return
+        if ip in self.offline or (self.loss and self._rng.random() < self.loss):
+            self.dropped += 1
+            return
+        cpu, memory = self._metrics(ip)
+        reply = f'{request_id} cpu={cpu} memory={memory}'.encode('ascii')
+        if self.latency:
+            asyncio.get_running_loop().call_later(self._rng.uniform(0, self.latency),
+                                                  self._send, reply, addr)
+        else:
+            self._send(reply, addr)
+
+    def _send(self, reply, addr):
+        if self._transport is not None and not self._transport.is_closing():
+            self._transport.sendto(reply, addr)
+
+
+async def serve(host, port, **options):
+    agent = FakeAgent(**options)
+    host, port = await agent.start(host, port)
+    print(f"Agente simulado escuchando en {host}:{port} (UDP)", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        agent.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Agente simulado para el colector del NOC')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1161)
+    parser.add_argument('--loss', type=float, default=0.0, help='fracción de pedidos descartados')
+    parser.add_argument('--offline', nargs='*', default=[], help='IPs que nunca responden')
+    parser.add_argument('--latency', type=float, default=0.0, help='demora máxima de respuesta (s)')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, loss=args.loss, offline=args.offline,
+                          latency=args.latency, seed=args.seed))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
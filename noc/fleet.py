@@ -0,0 +1,393 @@
+"""
+Estado vectorizado de la flota de dispositivos
+Columnas NumPy contiguas para las métricas, snapshots inmutables para los
+lectores y vista de diccionarios bajo demanda
+"""
+
+import threading
+from socket import inet_aton, inet_ntoa
+
+import numpy as np
+
+from noc.codes import (DEVICE_STATUSES, STATUS_CODES, STATUS_CRITICAL,
+                       STATUS_OFFLINE, STATUS_ONLINE, STATUS_WARNING, Vocabulary)
+
+# Rango de variación por tick (inclusive) y límites de cada métrica
+CPU_STEP, CPU_MIN, CPU_MAX = 5, 10, 95
+MEMORY_STEP, MEMORY_MIN, MEMORY_MAX = 3, 20, 95
+
+# Umbrales de clasificación del estado
+WARNING_THRESHOLD = 80
+CRITICAL_THRESHOLD = 90
+
+
+def classify(cpu, memory):
+    """Código de estado según el mayor uso entre CPU y memoria"""
+    peak = np.maximum(cpu, memory)
+    status = np.full(peak.shape, STATUS_ONLINE, dtype=np.uint8)
+    status[peak > WARNING_THRESHOLD] = STATUS_WARNING
+    status[peak > CRITICAL_THRESHOLD] = STATUS_CRITICAL
+    return status
+
+
+# Octetos ya formateados para armar las IPs por columnas
+_OCTETS = np.array([str(octet) for octet in range(256)], dtype=object)
+_SHIFTS = np.array([24, 16, 8, 0], dtype=np.uint32)
+
+
+def pack_ips(ips):
+    """IPv4 en notación canónica a uint32; el resto (hostnames, IPv6, ceros a
+    la izquierda) queda en un diccionario {posición: valor original}"""
+    try:
+        values = np.frombuffer(b''.join(map(inet_aton, ips)), dtype='>u4').astype(np.uint32)
+        if format_ips(values, {}) == list(ips):
+            return values, {}
+    except (OSError, TypeError, ValueError):
+        pass
+    packed, other = [], {}
+    for position, ip in enumerate(ips):
+        try:
+            raw = inet_aton(ip)
+            if inet_ntoa(raw) != ip:
+                raise ValueError(ip)
+        except (OSError, TypeError, ValueError):
+            other[position] = ip
+            raw = bytes(4)
+        packed.append(raw)
+    return np.frombuffer(b''.join(packed), dtype='>u4').astype(np.uint32), other
+
+
+def format_ips(values, other):
+    """Inversa de ``pack_ips``: lista de cadenas con los valores originales"""
+    octets = (values[:, None] >> _SHIFTS) & 255
+    ips = list(map('.'.join, zip(*(_OCTETS[octets[:, k]] for k in range(4)))))
+    for position, ip in tuple(other.items()):
+        if position < len(ips):
+            ips[position] = ip
+    return ips
+
+
+def lookup_rows(row_of, device_ids, size):
+    """Filas de varios ids en la tabla id -> fila (-1 si no existen o si la
+    fila es posterior a ``size``)"""
+    ids = np.asarray(device_ids, dtype=np.int64)
+    known = (ids >= 0) & (ids < row_of.size)
+    rows = np.full(ids.shape, -1, dtype=np.int64)
+    rows[known] = row_of[ids[known]]
+    rows[rows >= size] = -1
+    return rows
+
+
+def columns_from_devices(devices):
+    """Argumentos de ``FleetState.add_many`` a partir de diccionarios"""
+    return {
+        'ids': [device['id'] for device in devices],
+        'cpu': [device['cpu'] for device in devices],
+        'memory': [device['memory'] for device in devices],
+        'status_codes': [STATUS_CODES[device['status']] for device in devices],
+        'names': [device['name'] for device in devices],
+        'ips': [device['ip'] for device in devices],
+        'locations': [device['location'] for device in devices],
+    }
+
+
+class FleetState:
+    """Flota de dispositivos en formato struct-of-arrays.
+
+    Las métricas (id, cpu, memoria, código de estado) viven en arreglos
+    NumPy con capacidad amortizada, igual que la IP (uint32) y la ubicación
+    (código de un ``Vocabulary``); sólo el nombre queda en una lista. Las
+    IPs que no son IPv4 canónicas se guardan aparte con su valor original,
+    de modo que ``to_dicts`` reconstruye los diccionarios tal cual se
+    cargaron. ``id -> fila`` es una tabla NumPy densa, como en el historial.
+
+    Las escrituras nunca modifican filas ya publicadas: el tick genera
+    arreglos nuevos y ``add`` sólo escribe más allá del tamaño actual, así
+    que un ``FleetSnapshot`` tomado antes sigue siendo válido sin locks.
+
+    Objetivo de rendimiento: un tick sobre 1M de dispositivos en menos de
+    100 ms (ver benchmarks/bench_fleet_tick.py).
+    """
+
+    def __init__(self, capacity=64, seed=None):
+        self._lock = threading.Lock()
+        self._rng = np.random.default_rng(seed)
+        self._size = 0
+        self._allocate(max(1, int(capacity)))
+        self._clear_catalog()
+
+    @classmethod
+    def from_devices(cls, devices, seed=None):
+        fleet = cls(capacity=max(64, len(devices)), seed=seed)
+        fleet.add_many(**columns_from_devices(devices))
+        return fleet
+
+    def _allocate(self, capacity):
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._cpu = np.zeros(capacity, dtype=np.int16)
+        self._memory = np.zeros(capacity, dtype=np.int16)
+        self._status = np.zeros(capacity, dtype=np.uint8)
+        self._ip = np.zeros(capacity, dtype=np.uint32)
+        self._location = np.zeros(capacity, dtype=np.uint32)
+
+    def _clear_catalog(self):
+        self.names = []
+        self._ip_other = {}
+        self._locations = Vocabulary()
+        self._row_of = np.full(64, -1, dtype=np.int32)
+
+    def _reserve(self, size):
+        capacity = self._ids.shape[0]
+        if size <= capacity:
+            return
+        columns = ('_ids', '_cpu', '_memory', '_status', '_ip', '_location')
+        old = [getattr(self, name) for name in columns]
+        self._allocate(max(size, capacity * 2))
+        for src, name in zip(old, columns):
+            getattr(self, name)[:self._size] = src[:self._size]
+
+    def _index(self, ids, first_row):
+        """Registrar ``ids`` en la tabla id -> fila a partir de ``first_row``"""
+        if ids.size and ids.min() < 0:
+            raise ValueError('Los ids de dispositivo deben ser no negativos')
+        if ids.size and ids.max() >= self._row_of.size:
+            # Tabla nueva: los snapshots conservan la anterior
+            row_of = np.full(max(int(ids.max()) + 1, self._row_of.size * 2), -1, dtype=np.int32)
+            row_of[:self._row_of.size] = self._row_of
+            self._row_of = row_of
+        self._row_of[ids] = np.arange(first_row, first_row + ids.size, dtype=np.int32)
+
+    # ===== VISTAS DE COLUMNAS =====
+
+    @property
+    def ids(self):
+        return self._ids[:self._size]
+
+    @property
+    def cpu(self):
+        return self._cpu[:self._size]
+
+    @property
+    def memory(self):
+        return self._memory[:self._size]
+
+    @property
+    def status(self):
+        return self._status[:self._size]
+
+    @property
+    def ips(self):
+        return format_ips(self._ip[:self._size], self._ip_other)
+
+    @property
+    def locations(self):
+        return list(map(self._locations.names.__getitem__, self._location[:self._size].tolist()))
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, device_id):
+        return 0 <= device_id < self._row_of.size and 0 <= self._row_of[device_id] < self._size
+
+    def next_id(self):
+        return int(self._ids[:self._size].max()) + 1 if self._size else 1
+
+    # ===== MUTACIONES =====
+
+    def add(self, device):
+        """Agregar un dispositivo a partir de su representación en diccionario"""
+        with self._lock:
+            row = self._size
+            self._reserve(row + 1)
+            self._ids[row] = device['id']
+            self._cpu[row] = device['cpu']
+            self._memory[row] = device['memory']
+            self._status[row] = STATUS_CODES[device['status']]
+            self._location[row] = self._locations.code(device['location'])
+            ip, other = pack_ips([device['ip']])
+            self._ip[row] = ip[0]
+            if other:
+                self._ip_other[row] = other[0]
+            self._index(np.array([device['id']], dtype=np.int64), row)
+            self.names.append(device['name'])
+            self._size = row + 1
+        return device
+
+    def add_many(self, ids, cpu, memory, status_codes, names, ips, locations):
+        """Agregar dispositivos en bloque a partir de columnas (carga masiva)"""
+        ids = np.asarray(ids, dtype=np.int64)
+        n = ids.size
+        with self._lock:
+            row = self._size
+            self._reserve(row + n)
+            self._ids[row:row + n] = ids
+            self._cpu[row:row + n] = cpu
+            self._memory[row:row + n] = memory
+            self._status[row:row + n] = status_codes
+            self._location[row:row + n] = self._locations.codes(locations)
+            self._ip[row:row + n], other = pack_ips(ips)
+            self._ip_other.update((row + position, ip) for position, ip in other.items())
+            self._index(ids, row)
+            self.names.extend(names)
+            self._size = row + n
+        return n
+
+    def reset(self, devices):
+        """Reemplazar toda la flota por la lista de dispositivos indicada"""
+        with self._lock:
+            self._size = 0
+            self._allocate(max(64, len(devices)))
+            self._clear_catalog()
+        self.add_many(**columns_from_devices(devices))
+
+    def tick(self):
+        """Avanzar la simulación un paso sobre toda la flota.
+
+        Un único sorteo aleatorio genera las variaciones de CPU y memoria de
+        todos los dispositivos no offline; luego se recortan a sus límites y
+        se reclasifica el estado de forma vectorial sobre arreglos nuevos
+        (los snapshots publicados conservan los anteriores). Retorna las filas
+        cuyo estado cambió junto con sus códigos de estado anterior y nuevo.
+        """
+        with self._lock:
+            n = self._size
+            status = self._status[:n]
+            active = status != STATUS_OFFLINE
+
+            deltas = self._rng.integers((-CPU_STEP, -MEMORY_STEP),
+                                        (CPU_STEP + 1, MEMORY_STEP + 1),
+                                        size=(n, 2), dtype=np.int16)
+            cpu = np.where(active, np.clip(self._cpu[:n] + deltas[:, 0], CPU_MIN, CPU_MAX),
+                           self._cpu[:n])
+            memory = np.where(active, np.clip(self._memory[:n] + deltas[:, 1], MEMORY_MIN, MEMORY_MAX),
+                              self._memory[:n])
+
+            new_status = classify(cpu, memory)
+            new_status[~active] = STATUS_OFFLINE
+            return self._publish_columns(n, cpu, memory, new_status)
+
+    def apply(self, ids, cpu, memory, reachable):
+        """Aplicar un lote de lecturas reales (colector de dispositivos).
+
+        ``cpu`` y ``memory`` valen -1 donde el sondeo sólo comprobó
+        alcanzabilidad (se conserva el valor actual); los dispositivos no
+        alcanzables pasan a offline con métricas en 0. Los ids que ya no
+        están en la flota se ignoran. Igual que ``tick``, escribe arreglos
+        nuevos y retorna las filas cuyo estado cambió con sus códigos
+        anterior y nuevo.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        cpu = np.asarray(cpu, dtype=np.int16)
+        memory = np.asarray(memory, dtype=np.int16)
+        reachable = np.asarray(reachable, dtype=bool)
+        with self._lock:
+            n = self._size
+            rows = lookup_rows(self._row_of, ids, n)
+            known = rows >= 0
+            rows, cpu, memory, reachable = rows[known], cpu[known], memory[known], reachable[known]
+
+            new_cpu = self._cpu[:n].copy()
+            new_memory = self._memory[:n].copy()
+            new_cpu[rows] = np.where(reachable, np.where(cpu >= 0, np.clip(cpu, 0, 100), new_cpu[rows]), 0)
+            new_memory[rows] = np.where(reachable, np.where(memory >= 0, np.clip(memory, 0, 100),
+                                                            new_memory[rows]), 0)
+            new_status = self._status[:n].copy()
+            new_status[rows] = np.where(reachable, classify(new_cpu[rows], new_memory[rows]), STATUS_OFFLINE)
+            return self._publish_columns(n, new_cpu, new_memory, new_status)
+
+    def _publish_columns(self, n, cpu, memory, new_status):
+        """Reemplazar las columnas de métricas por arreglos nuevos (con lock)"""
+        status = self._status[:n]
+        changed = np.flatnonzero(new_status != status)
+        previous = status[changed]
+        for name, values in (('_cpu', cpu), ('_memory', memory), ('_status', new_status)):
+            column = np.empty_like(getattr(self, name))
+            column[:n] = values
+            setattr(self, name, column)
+        return changed, previous, new_status[changed]
+
+    def snapshot(self):
+        """Vista inmutable del estado actual de la flota"""
+        with self._lock:
+            return FleetSnapshot(self, self._size)
+
+
+class FleetSnapshot:
+    """Versión inmutable de la flota que los handlers leen sin locks"""
+
+    __slots__ = ('ids', 'cpu', 'memory', 'status', 'names', '_ip', '_ip_other',
+                 '_location', '_location_names', '_row_of', '_size')
+
+    def __init__(self, fleet, size):
+        self._size = size
+        self.ids = fleet._ids[:size]
+        self.cpu = fleet._cpu[:size]
+        self.memory = fleet._memory[:size]
+        self.status = fleet._status[:size]
+        self._ip = fleet._ip[:size]
+        self._location = fleet._location[:size]
+        for column in (self.ids, self.cpu, self.memory, self.status, self._ip, self._location):
+            column.flags.writeable = False
+        # Nombres, IPs no canónicas, vocabulario de ubicaciones y tabla de
+        # filas sólo crecen más allá de _size (o se reemplazan)
+        self.names = fleet.names
+        self._ip_other = fleet._ip_other
+        self._location_names = fleet._locations.names
+        self._row_of = fleet._row_of
+
+    @property
+    def ips(self):
+        return format_ips(self._ip, self._ip_other)
+
+    @property
+    def locations(self):
+        return list(map(self._location_names.__getitem__, self._location.tolist()))
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, device_id):
+        return self.row(device_id) is not None
+
+    def row(self, device_id):
+        """Fila del dispositivo en el snapshot, o None si no existe"""
+        if not 0 <= device_id < self._row_of.size:
+            return None
+        row = int(self._row_of[device_id])
+        return row if 0 <= row < self._size else None
+
+    def rows(self, device_ids):
+        """Filas de varios dispositivos (-1 para los que no existen)"""
+        return lookup_rows(self._row_of, device_ids, self._size)
+
+    def ip(self, row):
+        if row in self._ip_other:
+            return self._ip_other[row]
+        return inet_ntoa(int(self._ip[row]).to_bytes(4, 'big'))
+
+    def device(self, device_id):
+        """Diccionario de un dispositivo, o None si no existe"""
+        row = self.row(device_id)
+        if row is None:
+            return None
+        return {
+            'id': int(self.ids[row]),
+            'name': self.names[row],
+            'ip': self.ip(row),
+            'status': DEVICE_STATUSES[self.status[row]],
+            'cpu': int(self.cpu[row]),
+            'memory': int(self.memory[row]),
+            'location': self._location_names[self._location[row]],
+        }
+
+    def to_dicts(self):
+        """Materializar la flota como lista de diccionarios (formato de la API)"""
+        n = self._size
+        columns = zip(self.ids.tolist(), self.names[:n], self.ips,
+                      self.status.tolist(), self.cpu.tolist(),
+                      self.memory.tolist(), self.locations)
+        return [
+            {'id': i, 'name': name, 'ip': ip, 'status': DEVICE_STATUSES[s],
+             'cpu': cpu, 'memory': memory, 'location': location}
+            for i, name, ip, s, cpu, memory, location in columns
+        ]
@@ -0,0 +1,114 @@
+"""
+Pronóstico de CPU de la flota
+Nivel actual más la estacionalidad diaria aprendida del historial, calculado
+para todos los dispositivos en una sola pasada vectorizada
+"""
+
+import threading
+import time
+
+import numpy as np
+
+from noc.timeseries import HOURS_PER_DAY
+
+# Horizonte por defecto y máximo (horas)
+DEFAULT_HORIZON = 24
+MAX_HORIZON = 7 * 24
+
+# Mismos límites que la simulación de métricas
+CPU_FLOOR, CPU_CEILING = 10, 95
+
+# Umbrales de riesgo sobre el máximo pronosticado
+HIGH_RISK = 85
+MEDIUM_RISK = 70
+
+# Horas del día con historial necesarias para usar el perfil aprendido
+MIN_PROFILE_HOURS = HOURS_PER_DAY // 2
+
+
+def risk_level(peak):
+    return 'high' if peak > HIGH_RISK else 'medium' if peak > MEDIUM_RISK else 'low'
+
+
+def baseline_shape(horizon):
+    """Patrón diario en U de la simulación original (sin ruido), usado
+    mientras un dispositivo no tiene historial suficiente"""
+    hours = np.arange(horizon) % HOURS_PER_DAY
+    return np.clip(50 + 20 * np.abs((hours - 12) / 12), CPU_FLOOR, CPU_CEILING).round(1)
+
+
+class FleetForecast:
+    """Pronósticos de todas las filas del historial para un horizonte dado"""
+
+    __slots__ = ('version', 'hour', 'horizon', 'predictions', '_row_of')
+
+    def __init__(self, version, hour, horizon, device_ids, predictions):
+        self.version = version
+        self.hour = hour
+        self.horizon = horizon
+        self.predictions = predictions
+        self._row_of = dict(zip(device_ids.tolist(), range(device_ids.size)))
+
+    def rows(self, device_ids):
+        """Fila de cada dispositivo (-1 si no tiene historial)"""
+        get = self._row_of.get
+        return np.fromiter((get(i, -1) for i in device_ids), dtype=np.int64, count=len(device_ids))
+
+
+class FleetForecaster:
+    """Pronóstico memoizado sobre un ``DeviceHistoryStore``.
+
+    Para cada dispositivo se parte de la última muestra de CPU y se le suma
+    la diferencia entre el promedio histórico de la hora objetivo y el de la
+    hora actual; las horas sin datos no aportan estacionalidad. Con menos de
+    ``MIN_PROFILE_HOURS`` horas del día observadas se usa ``baseline_shape``
+    en lugar de un pronóstico casi plano. El resultado
+    se guarda por horizonte y sólo se recalcula cuando el historial recibe
+    muestras nuevas (``version``) o cambia la hora del día.
+    """
+
+    def __init__(self, history):
+        self.history = history
+        self._lock = threading.Lock()
+        self._cache = {}
+        self._cache_key = None
+
+    def forecast(self, horizon=DEFAULT_HORIZON, now=None):
+        hour = int((time.time() if now is None else now) // 3600) % HOURS_PER_DAY
+        key = (self.history.version, hour)
+        cached = self._cache.get(horizon) if self._cache_key == key else None
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            if self._cache_key == key and horizon in self._cache:
+                return self._cache[horizon]
+            version, device_ids, profile, last_cpu = self.history.hourly_profile()
+            # Desvío de cada hora respecto de la media diaria del dispositivo
+            present = ~np.isnan(profile)
+            filled = np.where(present, profile, 0.0)
+            daily = filled.sum(axis=1, keepdims=True) / np.maximum(present.sum(axis=1, keepdims=True), 1)
+            deviation = np.where(present, filled - daily, 0.0)
+            targets = (hour + 1 + np.arange(horizon)) % HOURS_PER_DAY
+            predictions = last_cpu[:, None] + deviation[:, targets] - deviation[:, [hour]]
+            predictions = np.clip(predictions, CPU_FLOOR, CPU_CEILING).round(1)
+            learned = present.sum(axis=1) >= MIN_PROFILE_HOURS
+            predictions[~learned] = baseline_shape(horizon)
+
+            result = FleetForecast(version, hour, horizon, device_ids, predictions)
+            if self._cache_key != (version, hour):
+                self._cache, self._cache_key = {}, (version, hour)
+            self._cache[horizon] = result
+            return result
+
+    def predict(self, device_ids, horizon=DEFAULT_HORIZON, now=None):
+        """Matriz (dispositivos x horizonte) para los ids indicados.
+
+        Los dispositivos aún sin historial reciben ``baseline_shape``.
+        """
+        result = self.forecast(horizon, now)
+        rows = result.rows(device_ids)
+        predictions = np.tile(baseline_shape(horizon), (len(device_ids), 1))
+        known = rows >= 0
+        predictions[known] = result.predictions[rows[known]]
+        return predictions
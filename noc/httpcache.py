@@ -0,0 +1,132 @@
+"""
+Caché de respuestas JSON por versión de datos
+Serializa una vez por versión, guarda los cuerpos comprimidos (gzip y
+brotli si está instalado) y responde 304 a los If-None-Match vigentes
+"""
+
+import gzip
+import threading
+import time
+
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional; sin él sólo se ofrece gzip
+    brotli = None
+
+# Debajo de este tamaño la compresión no compensa su costo
+MIN_COMPRESS_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+class CachedBody:
+    """Cuerpo serializado de una versión, con sus codificaciones perezosas"""
+
+    __slots__ = ('etag', 'identity', '_encoded', '_lock')
+
+    def __init__(self, etag, identity):
+        self.etag = etag
+        self.identity = identity
+        self._encoded = {}
+        self._lock = threading.Lock()
+
+    def encoded(self, encoding):
+        """Cuerpo en la codificación pedida; se comprime una sola vez"""
+        body = self._encoded.get(encoding)
+        if body is None:
+            with self._lock:
+                body = self._encoded.get(encoding)
+                if body is None:
+                    if encoding == 'br':
+                        body = brotli.compress(self.identity, quality=BROTLI_QUALITY)
+                    else:
+                        body = gzip.compress(self.identity, compresslevel=GZIP_LEVEL, mtime=0)
+                    self._encoded[encoding] = body
+        return body
+
+
+class ResponseCache:
+    """Una entrada por recurso, reemplazada cuando avanza su versión.
+
+    ``serialize`` convierte los datos en los bytes del cuerpo (la app usa el
+    mismo proveedor JSON que jsonify para que el cuerpo sea idéntico). La
+    construcción de una versión nueva se hace una sola vez aunque lleguen
+    varios requests a la vez.
+
+    Las versiones reinician con el proceso, así que el ETag incluye además
+    un identificador de arranque para no validar cuerpos de otra instancia.
+    """
+
+    def __init__(self, serialize):
+        self._serialize = serialize
+        self._boot = format(time.time_ns(), 'x')
+        self._entries = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def body(self, name, version, build):
+        """CachedBody de ``name`` en ``version``; ``build`` produce los datos"""
+        entry = self._entries.get(name)
+        if entry is not None and entry[0] == version:
+            self.hits += 1
+            return entry[1]
+
+        with self._lock:
+            lock = self._locks.setdefault(name, threading.Lock())
+        with lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry[0] >= version:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            identity = self._serialize(build())
+            cached = CachedBody(self.etag(name, version), identity)
+            self._entries[name] = (version, cached)
+            return cached
+
+    def etag(self, name, version):
+        return f'{name}-{self._boot}-{version}'
+
+    def respond(self, name, version, build):
+        """Respuesta Flask para el request actual (200 o 304).
+
+        Un If-None-Match con la versión vigente se responde sin construir
+        ni serializar nada.
+        """
+        etag = self.etag(name, version)
+        if request.if_none_match.contains_weak(etag):
+            self.not_modified += 1
+            response = Response(status=304)
+        else:
+            cached = self.body(name, version, build)
+            etag = cached.etag
+            encoding = choose_encoding(len(cached.identity))
+            body = cached.encoded(encoding) if encoding else cached.identity
+            response = Response(body, mimetype='application/json')
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'no-cache'
+        response.vary.add('Accept-Encoding')
+        return response
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'not_modified': self.not_modified,
+                'entries': len(self._entries)}
+
+
+def choose_encoding(size):
+    """Mejor codificación aceptada por el cliente, o None para enviar sin comprimir"""
+    if size < MIN_COMPRESS_SIZE:
+        return None
+    accepted = request.accept_encodings
+    if brotli is not None and accepted.quality('br') > 0:
+        return 'br'
+    if accepted.quality('gzip') > 0:
+        return 'gzip'
+    return None
@@ -0,0 +1,593 @@
+"""
+Almacén indexado de incidencias
+Filas compactas, asignación monotónica de ids, índices secundarios
+ordenados y paginación por cursor (keyset)
+"""
+
+import base64
+import json
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections.abc import Mapping
+
+from noc.aggregates import INCIDENT_PRIORITIES
+from noc.codes import Vocabulary
+
+# Campos por los que se puede ordenar; la clave siempre termina en el id
+# para que el orden sea total y el cursor no pierda ni repita registros
+SORT_FIELDS = ('id', 'created', 'priority')
+
+# Campos con lista ordenada propia; el orden por prioridad encadena las
+# listas por id de cada prioridad, así todas salvo 'created' sólo crecen
+# por el final
+INDEXED_SORTS = ('id', 'created')
+PRIORITY_RANK = {name: rank for rank, name in enumerate(INCIDENT_PRIORITIES)}
+CURSOR_TYPES = {'id': [int], 'created': [str, int], 'priority': [int, int]}
+
+# Dimensiones con índice de igualdad
+FILTER_FIELDS = ('status', 'priority', 'assigned')
+
+MAX_PAGE_SIZE = 1000
+
+# Tamaño de los tramos en que se dividen filas e índices: una actualización
+# copia el tramo afectado y la lista de tramos, no la estructura completa
+_CHUNK_BITS = 10
+_CHUNK = 1 << _CHUNK_BITS
+
+# Columnas de la fila compacta de una incidencia (ver ``pack``)
+INCIDENT_FIELDS = ('id', 'title', 'status', 'priority', 'created', 'assigned', 'resolved')
+_POSITION = {field: position for position, field in enumerate(INCIDENT_FIELDS, 1)}
+_ID, _CREATED = _POSITION['id'], _POSITION['created']
+_EXTRA = len(INCIDENT_FIELDS) + 1
+# Campos categóricos: todas las filas comparten una instancia por valor
+INTERNED_FIELDS = frozenset(('status', 'priority', 'assigned'))
+
+_values = Vocabulary()
+# Orden de claves de cada fila (hay uno por origen: SQLite, API, seed)
+_layouts = Vocabulary()
+
+
+class InvalidQuery(ValueError):
+    """Parámetros de consulta de incidencias inválidos"""
+
+
+def pack(incident):
+    """Fila compacta de una incidencia: ``(claves, id, title, ..., extra)``.
+
+    Una tupla de tamaño fijo en lugar de un diccionario: estado, prioridad
+    y asignado apuntan a la instancia compartida de ``_values`` y el orden
+    original de las claves es una tupla de ``_layouts``. Como sólo contiene
+    valores atómicos, el recolector de ciclos deja de seguirla en la primera
+    pasada. Las claves fuera de ``INCIDENT_FIELDS`` van en un diccionario
+    al final.
+    """
+    if type(incident) is IncidentRecord:
+        return incident._row
+    row = [_layouts.intern(tuple(incident))] + [None] * _EXTRA
+    for key, value in incident.items():
+        position = _POSITION.get(key)
+        if position is None:
+            if row[_EXTRA] is None:
+                row[_EXTRA] = {}
+            row[_EXTRA][key] = value
+            continue
+        if key in INTERNED_FIELDS and type(value) is str:
+            value = _values.intern(value)
+        row[position] = value
+    return tuple(row)
+
+
+class IncidentRecord(Mapping):
+    """Vista de diccionario de sólo lectura sobre una fila compacta.
+
+    ``dict(record)`` y su JSON son idénticos al diccionario del que salió la
+    fila, incluido el orden de las claves. Las vistas se crean al leer y no
+    se guardan en el almacén.
+    """
+
+    __slots__ = ('_row',)
+
+    def __init__(self, row):
+        self._row = row
+
+    def __getitem__(self, key):
+        row = self._row
+        position = _POSITION.get(key)
+        if position is not None:
+            # Un valor no nulo implica que la clave existe
+            value = row[position]
+            if value is not None or key in row[0]:
+                return value
+        elif row[_EXTRA] is not None and key in row[_EXTRA]:
+            return row[_EXTRA][key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        row = self._row
+        position = _POSITION.get(key)
+        if position is not None:
+            value = row[position]
+            return value if value is not None or key in row[0] else default
+        if row[_EXTRA] is not None:
+            return row[_EXTRA].get(key, default)
+        return default
+
+    def __contains__(self, key):
+        return key in self._row[0]
+
+    def __iter__(self):
+        return iter(self._row[0])
+
+    def __len__(self):
+        return len(self._row[0])
+
+    def __repr__(self):
+        return f'IncidentRecord({self.to_dict()!r})'
+
+    def to_dict(self):
+        """Diccionario equivalente (mismo orden de claves)"""
+        return {key: self[key] for key in self._row[0]}
+
+
+def json_default(obj):
+    """``default`` de json.dumps para serializar registros compactos"""
+    if isinstance(obj, IncidentRecord):
+        return obj.to_dict()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def _sort_keys(row):
+    """Clave de cada orden indexado; la misma tupla se comparte entre las
+    listas de todos los filtros de la fila"""
+    incident_id = row[_ID]
+    return (('id', (incident_id,)), ('created', (row[_CREATED], incident_id)))
+
+
+def _index_names(row):
+    yield None
+    for field in FILTER_FIELDS:
+        yield (field, row[_POSITION[field]])
+
+
+def encode_cursor(key):
+    raw = json.dumps(list(key), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return tuple(json.loads(base64.urlsafe_b64decode(padded.encode('ascii'))))
+    except (ValueError, TypeError):
+        raise InvalidQuery('cursor inválido')
+
+
+class RowTable:
+    """Filas por id repartidas en tramos de ``_CHUNK`` ids consecutivos.
+
+    ``add`` escribe en el lugar (sólo ids nuevos, que las vistas anteriores
+    ignoran); ``replaced`` retorna una tabla nueva que comparte todos los
+    tramos salvo el de la fila cambiada.
+    """
+
+    __slots__ = ('_chunks',)
+
+    def __init__(self, chunks=None):
+        self._chunks = {} if chunks is None else chunks
+
+    def get(self, row_id):
+        chunk = self._chunks.get(row_id >> _CHUNK_BITS)
+        return chunk.get(row_id) if chunk is not None else None
+
+    def __getitem__(self, row_id):
+        return self._chunks[row_id >> _CHUNK_BITS][row_id]
+
+    def rows(self, row_ids):
+        """Generar las filas de ``row_ids`` (todos existentes)"""
+        chunks = self._chunks
+        for row_id in row_ids:
+            yield chunks[row_id >> _CHUNK_BITS][row_id]
+
+    def add(self, row_id, row):
+        chunk = self._chunks.get(row_id >> _CHUNK_BITS)
+        if chunk is None:
+            chunk = self._chunks[row_id >> _CHUNK_BITS] = {}
+        chunk[row_id] = row
+
+    def replaced(self, row_id, row):
+        chunks = dict(self._chunks)
+        chunk = chunks[row_id >> _CHUNK_BITS] = dict(chunks[row_id >> _CHUNK_BITS])
+        chunk[row_id] = row
+        return RowTable(chunks)
+
+
+class SortedKeys:
+    """Lista ordenada de claves de índice en tramos de hasta ``2 * _CHUNK``.
+
+    Admite las operaciones que usan las vistas: longitud, búsqueda binaria
+    (posiciones globales) y recorrido de un rango. ``extend`` agrega al final
+    en el lugar, como una lista; ``inserted`` y ``removed`` retornan una
+    lista nueva que comparte los tramos no tocados, e ``insert`` modifica en
+    el lugar una copia privada (``copy``) durante una carga por lotes.
+
+    Al agregar en el lugar se actualizan primero los tramos y al final
+    ``_maxes`` y la longitud, de modo que un lector concurrente nunca ve
+    posiciones sin clave.
+    """
+
+    __slots__ = ('_chunks', '_maxes', '_starts', '_len')
+
+    def __init__(self, keys=()):
+        keys = list(keys)
+        self._chunks = [keys[i:i + _CHUNK] for i in range(0, len(keys), _CHUNK)]
+        self._maxes = [chunk[-1] for chunk in self._chunks]
+        self._reindex()
+
+    def _reindex(self):
+        starts, total = [], 0
+        for chunk in self._chunks:
+            starts.append(total)
+            total += len(chunk)
+        self._starts, self._len = starts, total
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        return self.range(0, self._len)
+
+    @property
+    def last(self):
+        return self._maxes[-1] if self._maxes else None
+
+    def bisect_left(self, key):
+        c = bisect_left(self._maxes, key)
+        if c == len(self._maxes):
+            return self._len
+        return self._starts[c] + bisect_left(self._chunks[c], key)
+
+    def bisect_right(self, key):
+        c = bisect_right(self._maxes, key)
+        if c == len(self._maxes):
+            return self._len
+        return self._starts[c] + bisect_right(self._chunks[c], key)
+
+    def range(self, lo, hi, reverse=False):
+        """Generar las claves de las posiciones [lo, hi)"""
+        if lo >= hi:
+            return
+        chunks, starts = self._chunks, self._starts
+        first, last = bisect_right(starts, lo) - 1, bisect_right(starts, hi - 1) - 1
+        indexes = range(last, first - 1, -1) if reverse else range(first, last + 1)
+        for c in indexes:
+            start = starts[c]
+            chunk = chunks[c][max(lo - start, 0):hi - start]
+            yield from (reversed(chunk) if reverse else chunk)
+
+    def extend(self, keys):
+        """Agregar al final, en el lugar, claves ordenadas mayores a las actuales"""
+        start = 0
+        if self._chunks and len(self._chunks[-1]) < _CHUNK:
+            start = _CHUNK - len(self._chunks[-1])
+            head = keys[:start]
+            if not head:
+                return
+            self._chunks[-1].extend(head)
+            self._maxes[-1] = head[-1]
+            self._len += len(head)
+        for i in range(start, len(keys), _CHUNK):
+            chunk = keys[i:i + _CHUNK]
+            self._starts.append(self._len)
+            self._chunks.append(chunk)
+            self._maxes.append(chunk[-1])
+            self._len += len(chunk)
+
+    def copy(self):
+        keys = SortedKeys.__new__(SortedKeys)
+        keys._chunks = [list(chunk) for chunk in self._chunks]
+        keys._maxes = list(self._maxes)
+        keys._starts, keys._len = list(self._starts), self._len
+        return keys
+
+    def _chunk_for(self, key):
+        return min(bisect_left(self._maxes, key), len(self._maxes) - 1)
+
+    def _store(self, c, chunk, reindex=True):
+        """Guardar el tramo ``c`` modificado, dividiéndolo o quitándolo"""
+        if not chunk:
+            del self._chunks[c], self._maxes[c]
+        elif len(chunk) > 2 * _CHUNK:
+            self._chunks[c:c + 1] = [chunk[:_CHUNK], chunk[_CHUNK:]]
+            self._maxes[c:c + 1] = [chunk[_CHUNK - 1], chunk[-1]]
+        else:
+            self._chunks[c] = chunk
+            self._maxes[c] = chunk[-1]
+        if reindex:
+            self._reindex()
+
+    def insert(self, key):
+        """Insertar en el lugar; las posiciones quedan desactualizadas hasta
+        llamar a ``reindex`` (una vez por lote)"""
+        if not self._chunks:
+            self.extend([key])
+            return
+        c = self._chunk_for(key)
+        chunk = self._chunks[c]
+        insort(chunk, key)
+        self._store(c, chunk, reindex=False)
+        self._len += 1
+
+    reindex = _reindex
+
+    def _shallow(self):
+        keys = SortedKeys.__new__(SortedKeys)
+        keys._chunks, keys._maxes = list(self._chunks), list(self._maxes)
+        return keys
+
+    def inserted(self, key):
+        keys = self._shallow()
+        if not keys._chunks:
+            keys._chunks, keys._maxes = [[key]], [key]
+            keys._reindex()
+            return keys
+        c = keys._chunk_for(key)
+        chunk = list(keys._chunks[c])
+        insort(chunk, key)
+        keys._store(c, chunk)
+        return keys
+
+    def removed(self, key):
+        keys = self._shallow()
+        c = bisect_left(keys._maxes, key)
+        chunk = list(keys._chunks[c])
+        del chunk[bisect_left(chunk, key)]
+        keys._store(c, chunk)
+        return keys
+
+
+class IncidentView:
+    """Versión inmutable del almacén de incidencias.
+
+    Para cada combinación (filtro, id/fecha) hay una lista ordenada de
+    claves; una consulta recorre la lista más selectiva desde la posición
+    del cursor, de modo que el costo de una página depende del tamaño de la
+    página y no del total de incidencias.
+
+    Las filas (``RowTable``) y listas (``SortedKeys``) compartidas con
+    vistas posteriores sólo reciben ids mayores a ``max_id``, que esta vista
+    ignora; cualquier otra modificación copia únicamente el tramo afectado.
+    """
+
+    __slots__ = ('records', 'indexes', 'max_id', 'count')
+
+    def __init__(self, records, indexes, max_id, count):
+        self.records = records
+        self.indexes = indexes
+        self.max_id = max_id
+        self.count = count
+
+    def get(self, incident_id):
+        if incident_id > self.max_id:
+            return None
+        row = self.records.get(incident_id)
+        return IncidentRecord(row) if row is not None else None
+
+    def __len__(self):
+        return self.count
+
+    def _keys(self, name, sort):
+        return self.indexes.get((name, sort), _NO_KEYS)
+
+    def values(self):
+        """Generar todas las incidencias ordenadas por id.
+
+        Las vistas se crean de a una: acumular un millón de objetos nuevos
+        dispararía recolecciones completas del GC durante el recorrido.
+        """
+        keys = self._keys(None, 'id')
+        for row in self.records.rows(key[0] for key in keys.range(0, keys.bisect_right((self.max_id,)))):
+            yield IncidentRecord(row)
+
+    def query(self, status=None, priority=None, assigned=None, created_from=None,
+              created_to=None, sort='id', limit=None, cursor=None):
+        """Retornar (incidencias, cursor_siguiente).
+
+        ``sort`` acepta 'id', 'created' o 'priority', con prefijo '-' para
+        orden descendente. ``cursor`` es el valor opaco devuelto por la
+        página anterior; el cursor siguiente es None al llegar al final.
+        """
+        descending = sort.startswith('-')
+        field = sort.lstrip('-')
+        if field not in SORT_FIELDS:
+            raise InvalidQuery(f"sort debe ser uno de: {', '.join(SORT_FIELDS)}")
+        if limit is not None and not 1 <= limit <= MAX_PAGE_SIZE:
+            raise InvalidQuery(f'limit debe estar entre 1 y {MAX_PAGE_SIZE}')
+
+        filters = {name: value for name, value in
+                   (('status', status), ('priority', priority), ('assigned', assigned))
+                   if value is not None}
+        after = decode_cursor(cursor) if cursor else None
+        if after is not None and [type(v) for v in after] != CURSOR_TYPES[field]:
+            raise InvalidQuery('cursor no corresponde al orden solicitado')
+
+        page, last_key = [], None
+        for key, incident in self._scan(field, descending, filters, created_from, created_to, after):
+            if limit is not None and len(page) == limit:
+                return page, encode_cursor(last_key)
+            page.append(incident)
+            last_key = key
+        return page, None
+
+    def _segments(self, field, descending, filters, created_from, created_to, after):
+        """Listas de claves a recorrer, en orden, con sus límites [lo, hi)"""
+        if field == 'priority':
+            ranks = range(len(INCIDENT_PRIORITIES))
+            if 'priority' in filters:
+                ranks = [PRIORITY_RANK[filters['priority']]] if filters['priority'] in PRIORITY_RANK else []
+            for rank in (reversed(ranks) if descending else ranks):
+                if after is not None and (rank > after[0] if descending else rank < after[0]):
+                    continue
+                keys = self._keys(('priority', INCIDENT_PRIORITIES[rank]), 'id')
+                lo, hi = 0, len(keys)
+                if after is not None and rank == after[0]:
+                    if descending:
+                        hi = keys.bisect_left((after[1],))
+                    else:
+                        lo = keys.bisect_right((after[1],))
+                yield rank, keys, lo, hi
+            return
+
+        # La lista más corta entre los filtros de igualdad guía el recorrido
+        candidates = [self._keys((name, value), field) for name, value in filters.items()]
+        keys = min(candidates, key=len) if candidates else self._keys(None, field)
+        lo, hi = 0, len(keys)
+        if field == 'created':
+            if created_from is not None:
+                lo = keys.bisect_left((created_from,))
+            if created_to is not None:
+                hi = keys.bisect_left((created_to + '\uffff',))
+        if after is not None:
+            if descending:
+                hi = min(hi, keys.bisect_left(after))
+            else:
+                lo = max(lo, keys.bisect_right(after))
+        yield None, keys, lo, hi
+
+    def _scan(self, field, descending, filters, created_from, created_to, after):
+        """Generar (clave de cursor, incidencia) en el orden pedido"""
+        checks = [(_POSITION[name], value) for name, value in filters.items()]
+        for rank, keys, lo, hi in self._segments(field, descending, filters,
+                                                 created_from, created_to, after):
+            for key in keys.range(lo, hi, reverse=descending):
+                if key[-1] > self.max_id:
+                    continue
+                row = self.records[key[-1]]
+                if any(row[column] != value for column, value in checks):
+                    continue
+                created = row[_CREATED]
+                if created_from is not None and created < created_from:
+                    continue
+                if created_to is not None and created[:len(created_to)] > created_to:
+                    continue
+                yield (key if rank is None else (rank, key[-1])), IncidentRecord(row)
+
+
+_NO_KEYS = SortedKeys()
+
+
+class IncidentStore:
+    """Incidencias indexadas por estado, prioridad, asignado y fecha.
+
+    Las escrituras se serializan con un lock interno y publican una nueva
+    ``IncidentView`` con una sola asignación; los lectores toman ``view`` y
+    consultan una versión consistente sin bloquearse. Las incidencias se
+    guardan como filas compactas inmutables (``pack``) y se leen como
+    ``IncidentRecord``; una actualización crea una fila nueva y copia sólo
+    los tramos de filas e índices que cambian, así su costo no depende del
+    total de incidencias.
+    """
+
+    def __init__(self, incidents=()):
+        self._lock = threading.Lock()
+        self.reset(incidents)
+
+    def reset(self, incidents):
+        with self._lock:
+            records, indexes, max_id, count = RowTable(), {}, 0, 0
+            for incident in incidents:
+                row = pack(incident)
+                if records.get(row[_ID]) is None:
+                    count += 1
+                records.add(row[_ID], row)
+                max_id = max(max_id, row[_ID])
+                sort_keys = _sort_keys(row)
+                for name in _index_names(row):
+                    for sort, key in sort_keys:
+                        indexes.setdefault((name, sort), []).append(key)
+            indexes = {index: SortedKeys(sorted(keys)) for index, keys in indexes.items()}
+            self._next_id = max_id + 1
+            self.view = IncidentView(records, indexes, max_id, count)
+
+    # ===== ESCRITURA =====
+
+    def add(self, incident):
+        """Agregar una incidencia asignándole el siguiente id disponible"""
+        return self.add_many([incident])[0]
+
+    def add_many(self, incidents):
+        """Agregar varias incidencias publicando una sola versión nueva.
+
+        Cada diccionario recibe su ``id`` y se retorna tal cual; el almacén
+        guarda una copia compacta.
+        """
+        with self._lock:
+            view = self.view
+            records, indexes, added = view.records, dict(view.indexes), {}
+            for incident in incidents:
+                incident['id'] = self._next_id
+                self._next_id += 1
+                row = pack(incident)
+                records.add(incident['id'], row)
+                sort_keys = _sort_keys(row)
+                for name in _index_names(row):
+                    for sort, key in sort_keys:
+                        keys = added.get((name, sort))
+                        if keys is None:
+                            keys = added[(name, sort)] = []
+                        keys.append(key)
+            for index, new_keys in added.items():
+                new_keys.sort()
+                keys = indexes.get(index)
+                if keys is None:
+                    keys = indexes[index] = SortedKeys()
+                if not len(keys) or new_keys[0] > keys.last:
+                    keys.extend(new_keys)
+                else:
+                    # Inserción intermedia: copiar la lista una vez por lote
+                    keys = indexes[index] = keys.copy()
+                    for key in new_keys:
+                        keys.insert(key)
+                    keys.reindex()
+            self.view = IncidentView(records, indexes, self._next_id - 1,
+                                     view.count + len(incidents))
+            return incidents
+
+    def update(self, incident_id, changes):
+        """Aplicar cambios; retorna (antes, después) o None si no existe"""
+        with self._lock:
+            view = self.view
+            before = view.records.get(incident_id)
+            if before is None:
+                return None
+            after = pack(dict(IncidentRecord(before), **changes))
+            # Sólo se tocan las listas cuya clave cambia (p. ej. las de los
+            # estados anterior y nuevo); el resto se comparte con la vista previa
+            unlinked = {(name, sort): key for name in _index_names(before)
+                        for sort, key in _sort_keys(before)}
+            linked = {(name, sort): key for name in _index_names(after)
+                      for sort, key in _sort_keys(after)}
+            indexes = dict(view.indexes)
+            for index, key in unlinked.items():
+                if linked.get(index) != key:
+                    indexes[index] = indexes[index].removed(key)
+            for index, key in linked.items():
+                if unlinked.get(index) != key:
+                    keys = indexes.get(index)
+                    indexes[index] = keys.inserted(key) if keys is not None else SortedKeys([key])
+            self.view = IncidentView(view.records.replaced(incident_id, after), indexes,
+                                     view.max_id, view.count)
+            return IncidentRecord(before), IncidentRecord(after)
+
+    # ===== LECTURA (sobre la versión actual) =====
+
+    def get(self, incident_id):
+        return self.view.get(incident_id)
+
+    def __len__(self):
+        return len(self.view)
+
+    def values(self):
+        return self.view.values()
+
+    def query(self, **kwargs):
+        return self.view.query(**kwargs)
@@ -0,0 +1,230 @@
+"""
+Ingesta de métricas en lote (POST /api/metrics/batch).
+
+El cuerpo se lee del stream en bloques y se decodifica de forma
+incremental, sin cargarlo entero en memoria:
+
+- NDJSON (``application/x-ndjson``): un objeto JSON por línea
+- MessagePack (``application/msgpack``): una secuencia de mapas
+  concatenados, decodificada con ``msgpack.Unpacker.feed``
+
+Cada muestra es ``{"device_id": 1, "cpu": 45, "memory": 67}`` con
+``timestamp`` opcional (segundos epoch; por defecto la hora de llegada) y
+``reachable`` opcional (``false`` reporta el dispositivo caído y no
+requiere métricas). ``SampleBatcher`` valida cada muestra y las agrupa en
+columnas NumPy que el servidor aplica de a miles.
+"""
+
+import json
+import time
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:  # Dependencia opcional; sin ella sólo se acepta NDJSON
+    msgpack = None
+
+NDJSON_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+MSGPACK_TYPES = ('application/msgpack', 'application/x-msgpack')
+
+CHUNK_SIZE = 64 * 1024
+# Línea NDJSON más larga aceptada (una muestra ocupa menos de 200 bytes)
+MAX_LINE = 64 * 1024
+# Errores detallados en la respuesta; el resto sólo se cuenta
+MAX_ERRORS = 20
+
+# Las columnas se arman en float64, exacto para enteros de hasta 53 bits
+MAX_DEVICE_ID = 2 ** 53
+
+_json_decoder = json.JSONDecoder()
+_NUMBER = (int, float)
+
+
+class IngestError(ValueError):
+    """El cuerpo no se puede seguir decodificando (se corta la ingesta)"""
+
+
+# ===== DECODIFICADORES =====
+
+def iter_ndjson(stream, chunk_size=CHUNK_SIZE, max_line=MAX_LINE):
+    """Pares ``(línea, objeto)``; las líneas inválidas producen ``(línea, ValueError)``"""
+    raw_decode = _json_decoder.raw_decode
+    pending = b''
+    line_no = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        if chunk:
+            complete, newline, pending = (pending + chunk).rpartition(b'\n')
+        else:
+            complete, newline, pending = pending, pending, b''
+        # Un salto de línea nunca cae dentro de un carácter UTF-8 multibyte,
+        # así que el bloque de líneas completas se decodifica de una vez
+        if newline:
+            try:
+                lines = complete.decode('utf-8').split('\n')
+            except UnicodeDecodeError:
+                lines = [line.decode('utf-8', 'replace') for line in complete.split(b'\n')]
+            for line in lines:
+                line_no += 1
+                if not line or line.isspace():
+                    continue
+                # raw_decode evita las dos pasadas de regex de loads por línea;
+                # espacios alrededor o basura al final caen a loads
+                try:
+                    obj, end = raw_decode(line)
+                    if end != len(line):
+                        obj = json.loads(line)
+                except ValueError:
+                    try:
+                        obj = json.loads(line)
+                    except ValueError as e:
+                        obj = ValueError(f'JSON inválido: {e}')
+                yield line_no, obj
+        if len(pending) > max_line:
+            raise IngestError(f'Línea {line_no + 1} de más de {max_line} bytes')
+        if not chunk:
+            break
+
+
+def iter_msgpack(stream, chunk_size=CHUNK_SIZE):
+    """Pares ``(posición, objeto)`` de una secuencia de objetos MessagePack"""
+    unpacker = msgpack.Unpacker(raw=False, strict_map_key=False, max_buffer_size=16 * chunk_size)
+    position = 0
+    fed = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        try:
+            unpacker.feed(chunk)
+        except msgpack.BufferFull:
+            raise IngestError(f'Objeto MessagePack de más de {16 * chunk_size} bytes')
+        fed += len(chunk)
+        try:
+            for obj in unpacker:
+                position += 1
+                yield position, obj
+        except (msgpack.ExtraData, msgpack.FormatError, msgpack.StackError, ValueError) as e:
+            raise IngestError(f'MessagePack inválido después del objeto {position}: {str(e) or type(e).__name__}')
+    if unpacker.tell() != fed:
+        raise IngestError(f'MessagePack truncado después del objeto {position}')
+
+
+def decoder_for(mimetype):
+    """Decodificador para el Content-Type, o None si no está soportado"""
+    if mimetype in NDJSON_TYPES:
+        return iter_ndjson
+    if mimetype in MSGPACK_TYPES and msgpack is not None:
+        return iter_msgpack
+    return None
+
+
+def supported_types():
+    return list(NDJSON_TYPES) + (list(MSGPACK_TYPES) if msgpack is not None else [])
+
+
+# ===== VALIDACIÓN Y AGRUPACIÓN =====
+
+class SampleBatcher:
+    """Valida muestras y las acumula en columnas de hasta ``batch_size``.
+
+    ``rejected`` cuenta las muestras descartadas (formato, rango o
+    dispositivo desconocido) y ``errors`` guarda las primeras con su
+    posición en el cuerpo.
+    """
+
+    def __init__(self, batch_size=10_000, now=None, max_errors=MAX_ERRORS):
+        self.batch_size = int(batch_size)
+        self.now = int(now if now is not None else time.time())
+        self.max_errors = max_errors
+        self.rejected = 0
+        self.errors = []
+        self._clear()
+
+    def _clear(self):
+        # Una tupla por muestra: (posición, id, timestamp, cpu, memoria, alcanzable)
+        self._rows = []
+
+    def __len__(self):
+        return len(self._rows)
+
+    def reject(self, position, message, count=1):
+        self.rejected += count
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'position': position, 'error': message})
+
+    def batches(self, samples):
+        """Consumir pares ``(posición, muestra)`` y producir columnas de
+        ``batch_size`` muestras válidas (la última puede ser menor)"""
+        rows = self._rows
+        append = rows.append
+        batch_size = self.batch_size
+        now = self.now
+        for position, sample in samples:
+            # Camino rápido en línea: muestra alcanzable con sus tres campos
+            # válidos; el resto pasa por la validación completa
+            if type(sample) is dict:
+                device_id = sample.get('device_id')
+                cpu = sample.get('cpu')
+                memory = sample.get('memory')
+                timestamp = sample.get('timestamp', now)
+                if (type(device_id) is int and 0 <= device_id < MAX_DEVICE_ID
+                        and type(cpu) in _NUMBER and 0 <= cpu <= 100
+                        and type(memory) in _NUMBER and 0 <= memory <= 100
+                        and type(timestamp) in _NUMBER and 0 < timestamp < 2 ** 32
+                        and sample.get('reachable', True) is True):
+                    append((position, device_id, timestamp, cpu, memory, True))
+                else:
+                    self._add_checked(position, sample)
+            else:
+                self._add_checked(position, sample)
+            if len(rows) >= batch_size:
+                yield self.take()
+                rows = self._rows
+                append = rows.append
+        if rows:
+            yield self.take()
+
+    def reject_many(self, positions, message):
+        """Rechazar varias muestras ya agrupadas (p. ej. dispositivos desconocidos)"""
+        self.rejected += len(positions)
+        room = max(0, self.max_errors - len(self.errors))
+        self.errors.extend({'position': int(position), 'error': message} for position in positions[:room])
+
+    def _add_checked(self, position, sample):
+        if isinstance(sample, Exception):
+            return self.reject(position, str(sample))
+        if not isinstance(sample, dict):
+            return self.reject(position, 'La muestra debe ser un objeto')
+        device_id = sample.get('device_id')
+        if type(device_id) is not int or not 0 <= device_id < MAX_DEVICE_ID:
+            return self.reject(position, 'device_id debe ser un entero no negativo')
+        reachable = sample.get('reachable', True)
+        if type(reachable) is not bool:
+            return self.reject(position, 'reachable debe ser booleano')
+        cpu = sample.get('cpu')
+        memory = sample.get('memory')
+        if reachable:
+            if not all(type(value) in _NUMBER and 0 <= value <= 100 for value in (cpu, memory)):
+                return self.reject(position, 'cpu y memory deben ser números entre 0 y 100')
+        else:
+            cpu = memory = 0
+        timestamp = sample.get('timestamp', self.now)
+        if type(timestamp) not in _NUMBER or not 0 < timestamp < 2 ** 32:
+            return self.reject(position, 'timestamp debe ser segundos epoch')
+        self._rows.append((position, device_id, timestamp, cpu, memory, reachable))
+
+    def take(self):
+        """Columnas acumuladas ordenadas por timestamp (estable) y vaciar el lote"""
+        rows = np.array(self._rows, dtype=np.float64).reshape(-1, 6)
+        self._clear()
+        rows = rows[np.argsort(rows[:, 2].astype(np.int64), kind='stable')]
+        return {
+            'positions': rows[:, 0].astype(np.int64),
+            'ids': rows[:, 1].astype(np.int64),
+            'timestamps': rows[:, 2].astype(np.int64),
+            'cpu': np.rint(rows[:, 3]).astype(np.int16),
+            'memory': np.rint(rows[:, 4]).astype(np.int16),
+            'reachable': rows[:, 5].astype(bool),
+        }
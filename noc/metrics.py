@@ -0,0 +1,132 @@
+"""
+Métricas Prometheus del servidor NOC.
+
+- ``noc_http_request_duration_seconds{endpoint, method, status}``: latencia
+  por regla de ruta (``/api/devices/<int:device_id>/history``, no por URL,
+  para acotar la cardinalidad)
+- ``noc_http_requests_in_flight{endpoint}``
+- ``noc_metrics_tick_seconds``: duración de cada paso de ``update_metrics``
+- Contadores leídos en cada scrape desde los objetos que ya los llevan
+  (caché de respuestas, clientes SSE) mediante ``register_stats``
+
+Se sirven en un puerto propio (``serve``). Con ``PROMETHEUS_MULTIPROC_DIR``
+definido (gunicorn con varios workers) cada proceso escribe sus valores en
+ese directorio y el exportador los agrega. Sin ``prometheus_client``
+instalado todo es no-op.
+"""
+
+import os
+import time
+
+from flask import g, request
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+    from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+except ImportError:  # Dependencia opcional
+    prometheus_client = None
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+TICK_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+UNMATCHED = 'unmatched'
+
+
+def multiprocess_mode():
+    return bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+
+class _StatsCollector:
+    """Colector que traduce ``fn() -> dict`` en métricas al momento del scrape"""
+
+    def __init__(self, namespace, name, fn, counters):
+        self.namespace = namespace
+        self.name = name
+        self.fn = fn
+        self.counters = counters
+
+    def collect(self):
+        for key, value in self.fn().items():
+            if not isinstance(value, (int, float)) or isinstance(value, bool):
+                continue
+            metric = f'{self.namespace}_{self.name}_{key}'
+            if key in self.counters:
+                family = CounterMetricFamily(metric, f'{self.name}: {key}')
+            else:
+                family = GaugeMetricFamily(metric, f'{self.name}: {key}')
+            family.add_metric([], value)
+            yield family
+
+
+class ServerMetrics:
+    """Instrumentación de una app Flask y del tick de métricas"""
+
+    def __init__(self, namespace='noc', enabled=True):
+        self.namespace = namespace
+        self.enabled = enabled and prometheus_client is not None
+        if not self.enabled:
+            return
+        self.request_latency = prometheus_client.Histogram(
+            f'{namespace}_http_request_duration_seconds', 'Latencia de las requests HTTP',
+            ('endpoint', 'method', 'status'), buckets=LATENCY_BUCKETS)
+        self.in_flight = prometheus_client.Gauge(
+            f'{namespace}_http_requests_in_flight', 'Requests HTTP en curso', ('endpoint',),
+            multiprocess_mode='livesum')
+        self.tick = prometheus_client.Histogram(
+            f'{namespace}_metrics_tick_seconds', 'Duración de cada paso de update_metrics',
+            buckets=TICK_BUCKETS)
+
+    # ===== FLASK =====
+
+    def init_app(self, app):
+        if not self.enabled:
+            return
+
+        @app.before_request
+        def _start_timer():
+            endpoint = request.url_rule.rule if request.url_rule is not None else UNMATCHED
+            g._metrics = (time.perf_counter(), endpoint)
+            self.in_flight.labels(endpoint).inc()
+
+        @app.after_request
+        def _observe(response):
+            started = g.get('_metrics')
+            if started is not None:
+                self.request_latency.labels(started[1], request.method, str(response.status_code)) \
+                    .observe(time.perf_counter() - started[0])
+            return response
+
+        @app.teardown_request
+        def _finish(exc):
+            started = g.pop('_metrics', None)
+            if started is not None:
+                self.in_flight.labels(started[1]).dec()
+
+    # ===== OBSERVACIONES =====
+
+    def observe_tick(self, seconds):
+        if self.enabled:
+            self.tick.observe(seconds)
+
+    def register_stats(self, name, fn, counters=()):
+        """Exponer ``fn()`` (dict de números) como ``<namespace>_<name>_<clave>``.
+
+        Las claves en ``counters`` son contadores y el resto gauges. Los
+        valores son del proceso que atiende el scrape: en modo multiproceso
+        no se agregan, así que sólo sirven para estado propio del proceso.
+        """
+        if self.enabled:
+            prometheus_client.REGISTRY.register(_StatsCollector(self.namespace, name, fn, set(counters)))
+
+    # ===== EXPORTADOR =====
+
+    def serve(self, port, addr='0.0.0.0'):
+        """Servir ``/metrics`` en ``port``; retorna False si no se pudo"""
+        if not self.enabled:
+            return False
+        registry = prometheus_client.REGISTRY
+        if multiprocess_mode():
+            registry = prometheus_client.CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        prometheus_client.start_http_server(port, addr, registry)
+        return True
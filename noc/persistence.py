@@ -0,0 +1,360 @@
+"""
+Persistencia en SQLite para el NOC
+Modo WAL, índices sobre incidencias y un hilo escritor que agrupa las
+escrituras en una sola transacción por lote
+"""
+
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from noc.codes import DEVICE_STATUSES
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS devices (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    ip TEXT NOT NULL,
+    status TEXT NOT NULL,
+    cpu INTEGER NOT NULL,
+    memory INTEGER NOT NULL,
+    location TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS incidents (
+    id INTEGER PRIMARY KEY,
+    title TEXT,
+    status TEXT NOT NULL,
+    priority TEXT NOT NULL,
+    created TEXT NOT NULL,
+    assigned TEXT,
+    resolved TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_incidents_status ON incidents (status);
+CREATE INDEX IF NOT EXISTS idx_incidents_priority ON incidents (priority);
+CREATE INDEX IF NOT EXISTS idx_incidents_created ON incidents (created);
+
+CREATE TABLE IF NOT EXISTS customers (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    plan TEXT NOT NULL,
+    status TEXT NOT NULL,
+    satisfaction REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS metric_samples (
+    device_id INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    cpu REAL NOT NULL,
+    memory REAL NOT NULL,
+    status INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_metric_samples_device_ts ON metric_samples (device_id, ts);
+CREATE INDEX IF NOT EXISTS idx_metric_samples_ts ON metric_samples (ts);
+"""
+
+UPSERT_DEVICE = ("INSERT OR REPLACE INTO devices (id, name, ip, status, cpu, memory, location) "
+                 "VALUES (:id, :name, :ip, :status, :cpu, :memory, :location)")
+UPSERT_INCIDENT = ("INSERT OR REPLACE INTO incidents (id, title, status, priority, created, assigned, resolved) "
+                   "VALUES (:id, :title, :status, :priority, :created, :assigned, :resolved)")
+
+# Columnas agregadas después de la primera versión del esquema
+MIGRATIONS = (('incidents', 'resolved', 'TEXT'),)
+UPSERT_CUSTOMER = ("INSERT OR REPLACE INTO customers (id, name, plan, status, satisfaction) "
+                   "VALUES (:id, :name, :plan, :status, :satisfaction)")
+INSERT_SAMPLE = "INSERT INTO metric_samples (device_id, ts, cpu, memory, status) VALUES (?, ?, ?, ?, ?)"
+# Borrado por tramos: cada DELETE toma el lock de escritura de SQLite por poco tiempo
+PRUNE_SAMPLES = ("DELETE FROM metric_samples WHERE rowid IN "
+                 "(SELECT rowid FROM metric_samples WHERE ts < ? LIMIT ?)")
+
+# Marcadores internos de la cola del escritor
+_RECORDS = object()
+_FLUSH = object()
+_STOP = object()
+
+
+def connect(path):
+    """Abrir una conexión configurada para escrituras concurrentes con lectores"""
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.executescript(SCHEMA)
+    for table, column, kind in MIGRATIONS:
+        existing = {row['name'] for row in conn.execute(f'PRAGMA table_info({table})')}
+        if column not in existing:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {kind}')
+    return conn
+
+
+def _incident_row(incident):
+    # 'resolved' sólo existe en las incidencias que llegaron a resolverse
+    return dict(incident, resolved=incident.get('resolved'))
+
+
+class SQLitePersistence:
+    """Almacenamiento durable de dispositivos, incidencias, clientes y métricas.
+
+    Las lecturas de los endpoints siguen sirviéndose desde memoria; esta
+    clase sólo carga el estado al arrancar y recibe escrituras a través de
+    una cola. El hilo escritor drena la cola y confirma cada lote en una
+    única transacción (executemany por tipo de registro).
+
+    Ninguna escritura bloquea al llamador (que suele tener tomado
+    ``write_lock``): los upserts de registros se coalescen por id en un
+    diccionario que el escritor vacía en cada lote, y las métricas se
+    descartan si la cola está llena. Con ``metric_retention`` (segundos) el
+    escritor además borra cada ``prune_interval`` las muestras más antiguas.
+    """
+
+    def __init__(self, path, max_batch=50000, flush_interval=1.0, max_pending=1000,
+                 metric_retention=None, prune_interval=300.0, prune_chunk=10000):
+        self.path = path
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.metric_retention = metric_retention
+        self.prune_interval = prune_interval
+        self.prune_chunk = prune_chunk
+        self._conn = connect(path)
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = None
+        # Upserts pendientes por (sentencia, id) y reset pendiente; la última
+        # versión de cada registro reemplaza a las anteriores
+        self._pending_lock = threading.Lock()
+        self._pending = {}
+        self._pending_reset = None
+        self._next_prune = 0.0
+        self.rows_written = 0
+        self.coalesced_writes = 0
+        self.pruned_samples = 0
+        self.dropped_metric_batches = 0
+
+    # ===== CARGA =====
+
+    def load(self):
+        """Retornar (devices, incidents, customers) guardados, o listas vacías.
+
+        Las métricas actuales de cada dispositivo se restauran desde su
+        última muestra registrada.
+        """
+        conn = self._conn
+        devices = [dict(row) for row in conn.execute('SELECT * FROM devices ORDER BY id')]
+        latest = conn.execute(
+            'SELECT s.device_id, s.cpu, s.memory, s.status FROM metric_samples s '
+            'JOIN (SELECT device_id, MAX(ts) AS ts FROM metric_samples GROUP BY device_id) m '
+            'ON s.device_id = m.device_id AND s.ts = m.ts'
+        )
+        last_sample = {row['device_id']: row for row in latest}
+        for device in devices:
+            sample = last_sample.get(device['id'])
+            if sample is not None:
+                device['cpu'] = int(sample['cpu'])
+                device['memory'] = int(sample['memory'])
+                device['status'] = DEVICE_STATUSES[sample['status']]
+
+        incidents = [{key: value for key, value in dict(row).items()
+                      if key != 'resolved' or value is not None}
+                     for row in conn.execute('SELECT * FROM incidents ORDER BY id')]
+        customers = [dict(row) for row in conn.execute('SELECT * FROM customers ORDER BY id')]
+        return devices, incidents, customers
+
+    # ===== ESCRITURAS ENCOLADAS =====
+
+    def save_device(self, device):
+        self._upsert(UPSERT_DEVICE, dict(device))
+
+    def save_incident(self, incident):
+        self._upsert(UPSERT_INCIDENT, _incident_row(incident))
+
+    def save_customer(self, customer):
+        self._upsert(UPSERT_CUSTOMER, dict(customer))
+
+    def replace_all(self, devices, incidents, customers):
+        """Reemplazar todo el contenido (usado por el reset de datos).
+
+        Los upserts aún no escritos quedan incluidos en el nuevo contenido y
+        se descartan.
+        """
+        payload = ([dict(d) for d in devices],
+                   [_incident_row(i) for i in incidents],
+                   [dict(c) for c in customers])
+        with self._pending_lock:
+            idle = self._idle()
+            self._pending = {}
+            self._pending_reset = payload
+        if idle:
+            self._wake()
+
+    def _upsert(self, statement, row):
+        with self._pending_lock:
+            idle = self._idle()
+            if self._pending.pop((statement, row['id']), None) is not None:
+                self.coalesced_writes += 1
+            self._pending[(statement, row['id'])] = row
+        if idle:
+            self._wake()
+
+    def _idle(self):
+        return not self._pending and self._pending_reset is None
+
+    def _wake(self):
+        # Un solo aviso por tanda de pendientes; si la cola está llena el
+        # escritor igual los vacía a más tardar en flush_interval
+        try:
+            self._queue.put_nowait((_RECORDS, None))
+        except queue.Full:
+            pass
+
+    def record_metrics(self, device_ids, timestamp, cpu, memory, status_codes):
+        """Encolar una muestra por dispositivo; nunca bloquea al recolector.
+
+        Si el escritor está saturado el lote se descarta y se contabiliza en
+        ``dropped_metric_batches``.
+        """
+        n = len(device_ids)
+        batch = (np.array(device_ids, dtype=np.int64),
+                 np.broadcast_to(np.asarray(timestamp, dtype=np.int64), (n,)).copy(),
+                 np.array(cpu, dtype=np.float64),
+                 np.array(memory, dtype=np.float64),
+                 np.array(status_codes, dtype=np.int64))
+        try:
+            self._queue.put_nowait((INSERT_SAMPLE, batch))
+        except queue.Full:
+            self.dropped_metric_batches += 1
+
+    # ===== HILO ESCRITOR =====
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='sqlite-writer', daemon=True)
+            self._thread.start()
+        return self
+
+    def flush(self, timeout=None):
+        """Esperar a que todo lo encolado hasta ahora quede confirmado"""
+        done = threading.Event()
+        self._queue.put((_FLUSH, done))
+        if self._thread is None:
+            while not done.is_set():
+                self._drain_once()
+        return done.wait(timeout)
+
+    def close(self):
+        if self._thread is not None:
+            self._queue.put((_STOP, None))
+            self._thread.join()
+            self._thread = None
+        else:
+            self.flush()
+        self._conn.close()
+
+    def _run(self):
+        while True:
+            if not self._drain_once(block=True):
+                return
+            if self.metric_retention is not None and time.monotonic() >= self._next_prune:
+                self._next_prune = time.monotonic() + self.prune_interval
+                self.prune_metrics(time.time() - self.metric_retention)
+
+    def prune_metrics(self, cutoff):
+        """Borrar las muestras con ts < cutoff en tramos de ``prune_chunk``
+        filas, confirmando cada tramo por separado"""
+        deleted = 0
+        try:
+            while True:
+                with self._conn:
+                    count = self._conn.execute(PRUNE_SAMPLES, (int(cutoff), self.prune_chunk)).rowcount
+                deleted += count
+                if count < self.prune_chunk:
+                    break
+        except sqlite3.Error as e:
+            logger.error(f"Error depurando metric_samples: {e}")
+        self.pruned_samples += deleted
+        return deleted
+
+    def _drain_once(self, block=False):
+        """Confirmar un lote; retorna False al recibir la señal de parada"""
+        try:
+            first = self._queue.get(timeout=self.flush_interval) if block else self._queue.get_nowait()
+        except queue.Empty:
+            first = (_RECORDS, None)
+
+        items = [first]
+        rows = self._rows_of(first)
+        while rows < self.max_batch:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            items.append(item)
+            rows += self._rows_of(item)
+
+        # Los pendientes tomados aquí incluyen todo lo guardado antes de
+        # cualquier _FLUSH del lote
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+            reset, self._pending_reset = self._pending_reset, None
+
+        running = True
+        waiters = []
+        grouped = {}
+        order = []
+        try:
+            with self._conn:
+                if reset is not None:
+                    self._replace_all(*reset)
+                for (statement, _), row in pending.items():
+                    if statement not in grouped:
+                        grouped[statement] = []
+                        order.append(statement)
+                    grouped[statement].append(row)
+                for kind, payload in items:
+                    if kind is _STOP:
+                        running = False
+                    elif kind is _FLUSH:
+                        waiters.append(payload)
+                    elif kind is _RECORDS:
+                        continue
+                    else:
+                        if kind not in grouped:
+                            grouped[kind] = []
+                            order.append(kind)
+                        grouped[kind].append(payload)
+                self._write_grouped(grouped, order)
+        except sqlite3.Error as e:
+            logger.error(f"Error escribiendo lote en SQLite: {e}")
+        finally:
+            for waiter in waiters:
+                waiter.set()
+        return running
+
+    @staticmethod
+    def _rows_of(item):
+        kind, payload = item
+        return len(payload[0]) if kind == INSERT_SAMPLE else 1
+
+    def _write_grouped(self, grouped, order):
+        for statement in order:
+            payloads = grouped[statement]
+            if statement == INSERT_SAMPLE:
+                for ids, ts, cpu, memory, status in payloads:
+                    self._conn.executemany(statement, zip(ids.tolist(), ts.tolist(), cpu.tolist(),
+                                                          memory.tolist(), status.tolist()))
+                    self.rows_written += len(ids)
+            else:
+                self._conn.executemany(statement, payloads)
+                self.rows_written += len(payloads)
+
+    def _replace_all(self, devices, incidents, customers):
+        for table in ('devices', 'incidents', 'customers', 'metric_samples'):
+            self._conn.execute(f'DELETE FROM {table}')
+        self._conn.executemany(UPSERT_DEVICE, devices)
+        self._conn.executemany(UPSERT_INCIDENT, incidents)
+        self._conn.executemany(UPSERT_CUSTOMER, customers)
@@ -0,0 +1,36 @@
+"""
+Profiler por muestreo a nivel de request y spans de tiempo con nombre.
+
+La implementación se comparte con el módulo de ML y vive en
+``ml-predictor/utils/profiler.py`` (su imagen sólo copia ese directorio;
+este servidor se despliega con el repositorio completo). Aquí se carga ese
+archivo y se ajusta lo propio del NOC; el formato de los stacks y el
+control por ``X-Profile`` / ``NOC_PROFILE_TOKEN`` están descritos allí.
+"""
+
+import importlib.util
+import os
+import sys
+
+_IMPLEMENTATION = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                               'ml-predictor', 'utils', 'profiler.py')
+
+
+def _load():
+    name = 'noc._sampling_profiler'
+    spec = importlib.util.spec_from_file_location(name, _IMPLEMENTATION)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+_profiler = _load()
+PROFILE_HEADER = _profiler.PROFILE_HEADER
+NO_SPAN = _profiler.NO_SPAN
+
+
+class SamplingProfiler(_profiler.SamplingProfiler):
+    """Muestreo de stacks por endpoint y tiempos de spans del servidor NOC"""
+
+    thread_name = 'noc-profiler'
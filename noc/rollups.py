@@ -0,0 +1,297 @@
+"""
+Rollups multi-resolución del historial de métricas
+Agregados min/max/promedio/conteo/p95 por minuto, hora, día, semana y mes,
+mantenidos en forma incremental a medida que llegan las muestras
+"""
+
+import numpy as np
+
+# Mismos intervalos (en minutos) que DATA_CONFIG['aggregation_intervals']
+# del ml-predictor
+AGGREGATION_INTERVALS = {'minute': 1, 'hour': 60, 'day': 1440, 'week': 10080, 'month': 43200}
+
+# Buckets retenidos por resolución (0 desactiva la resolución)
+DEFAULT_RETENTION = {'minute': 360, 'hour': 24 * 32, 'day': 400, 'week': 104, 'month': 36}
+
+# Métricas agregadas (columnas del historial) y estadísticos por bucket
+METRICS = ('cpu', 'memory')
+STATS = ('min', 'max', 'avg', 'p95')
+_MIN, _MAX, _AVG, _P95 = range(len(STATS))
+
+# Histograma de los buckets abiertos para estimar el p95 (valores en 0..100 %)
+P95_BINS = 32
+_BIN_WIDTH = 100.0 / P95_BINS
+
+
+def build_levels(intervals=None, retention=None, n_rows=1):
+    """Resoluciones activas, de la más fina a la más gruesa, encadenadas.
+
+    Cada resolución se alimenta de los buckets cerrados de la más gruesa
+    de las anteriores cuyo intervalo divide al suyo (el mes de 30 días se
+    arma con días, no con semanas); las demás reciben las muestras.
+    """
+    intervals = dict(AGGREGATION_INTERVALS, **(intervals or {}))
+    retention = dict(DEFAULT_RETENTION, **(retention or {}))
+    levels = sorted((RollupLevel(name, minutes * 60, retention.get(name, 0), n_rows)
+                     for name, minutes in intervals.items() if retention.get(name, 0) > 0),
+                    key=lambda level: level.interval)
+    for i, level in enumerate(levels):
+        sources = [finer for finer in levels[:i] if level.interval % finer.interval == 0]
+        if sources:
+            level.source = sources[-1]
+            sources[-1].targets.append(level)
+    return levels
+
+
+def histogram_bins(values):
+    """Clase del histograma de p95 de cada valor"""
+    return np.clip((values / _BIN_WIDTH).astype(np.int64), 0, P95_BINS - 1)
+
+
+def _contiguous(rows):
+    """``slice`` equivalente si las filas son consecutivas (un tick de toda
+    la flota), para operar sobre vistas en lugar de indexado avanzado"""
+    if rows.size and rows[-1] - rows[0] + 1 == rows.size and (np.diff(rows) == 1).all():
+        return slice(int(rows[0]), int(rows[-1]) + 1)
+    return rows
+
+
+def _stats(count, sums, minimum, maximum, hist):
+    """(filas x métricas x estadísticos) a partir de los acumuladores"""
+    count = count.astype(np.float64)[:, None]
+    cumulative = np.cumsum(hist, axis=-1, dtype=np.uint32)
+    target = 0.95 * count
+    index = np.argmax(cumulative >= target[..., None], axis=-1)
+    inside = np.take_along_axis(hist, index[..., None], axis=-1)[..., 0]
+    below = np.take_along_axis(cumulative, index[..., None], axis=-1)[..., 0] - inside
+    p95 = (index + (target - below) / np.maximum(inside, 1)) * _BIN_WIDTH
+
+    stats = np.empty(minimum.shape + (len(STATS),))
+    stats[..., _MIN] = minimum
+    stats[..., _MAX] = maximum
+    stats[..., _AVG] = sums / count
+    stats[..., _P95] = np.clip(p95, minimum, maximum)
+    return stats
+
+
+class RollupLevel:
+    """Una resolución: anillo de buckets cerrados más el bucket abierto.
+
+    Los buckets cerrados viven en matrices (filas x ``slots``) y el bucket
+    que empieza en ``t`` ocupa siempre el slot ``(t // interval) % slots``,
+    así que una consulta calcula directamente qué slots leer. Por bucket se
+    guardan inicio (uint32), conteo, peor estado (uint8) y min/max/promedio/
+    p95 de cada métrica en float16: ~25 bytes, frente a 9 bytes por muestra
+    cruda (un bucket horario reemplaza 360 muestras).
+
+    El bucket abierto acumula conteo, suma, extremos, peor estado y un
+    histograma de ``P95_BINS`` clases, todos combinables: al cerrarse se
+    calculan los estadísticos (el p95 interpolando dentro de la clase) y los
+    acumuladores pasan a las resoluciones más gruesas (``targets``), de modo
+    que cada muestra se procesa una sola vez.
+    """
+
+    def __init__(self, name, interval, slots, n_rows=1):
+        self.name = name
+        self.interval = int(interval)
+        self.slots = int(slots)
+        self.source = None
+        self.targets = []
+        # Muestras por bucket como máximo (a una por segundo)
+        self._count_dtype = np.uint16 if self.interval <= np.iinfo(np.uint16).max else np.uint32
+        self._allocate(max(1, int(n_rows)))
+
+    def _allocate(self, n_rows):
+        shape = (n_rows, self.slots)
+        self.start = np.zeros(shape, dtype=np.uint32)
+        self.count = np.zeros(shape, dtype=self._count_dtype)
+        self.status = np.zeros(shape, dtype=np.uint8)
+        self.stats = np.zeros(shape + (len(METRICS), len(STATS)), dtype=np.float16)
+        self.open_start = np.zeros(n_rows, dtype=np.int64)
+        self.open_count = np.zeros(n_rows, dtype=np.int64)
+        self.open_status = np.zeros(n_rows, dtype=np.uint8)
+        self.open_sum = np.zeros((n_rows, len(METRICS)))
+        self.open_min = np.full((n_rows, len(METRICS)), np.inf)
+        self.open_max = np.full((n_rows, len(METRICS)), -np.inf)
+        self.open_hist = np.zeros((n_rows, len(METRICS), P95_BINS), dtype=np.uint32)
+
+    def _arrays(self):
+        return (self.start, self.count, self.status, self.stats, self.open_start, self.open_count,
+                self.open_status, self.open_sum, self.open_min, self.open_max, self.open_hist)
+
+    def grow(self, n_rows):
+        old = self._arrays()
+        old_rows = self.start.shape[0]
+        self._allocate(n_rows)
+        for src, dst in zip(old, self._arrays()):
+            dst[:old_rows] = src
+
+    def reset(self, n_rows=1):
+        """Descartar todos los buckets dejando ``n_rows`` filas vacías"""
+        self._allocate(max(1, int(n_rows)))
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in self._arrays())
+
+    # ===== ESCRITURA =====
+
+    def add(self, rows, timestamps, values, status, bins=None):
+        """Acumular una muestra por fila (``rows`` sin repetidos).
+
+        ``values`` es una matriz (muestras x métricas); los timestamps de
+        cada fila deben llegar en orden no decreciente. ``bins`` (clase del
+        histograma de cada valor) puede precalcularse con ``histogram_bins``.
+        """
+        index = _contiguous(rows)
+        self._roll(rows, index, timestamps - timestamps % self.interval)
+        self.open_count[index] += 1
+        self.open_sum[index] += values
+        self.open_min[index] = np.minimum(self.open_min[index], values)
+        self.open_max[index] = np.maximum(self.open_max[index], values)
+        self.open_status[index] = np.maximum(self.open_status[index], status)
+        if bins is None:
+            bins = histogram_bins(values)
+        if isinstance(index, slice):
+            hist = self.open_hist[index].reshape(-1, P95_BINS)
+            hist[np.arange(hist.shape[0]), bins.ravel()] += 1
+        else:
+            self.open_hist[rows[:, None], np.arange(len(METRICS)), bins] += 1
+
+    def merge(self, rows, index, starts):
+        """Incorporar los buckets recién cerrados de ``source`` (mismas filas)"""
+        source = self.source
+        self._roll(rows, index, starts - starts % self.interval)
+        self.open_count[index] += source.open_count[index]
+        self.open_sum[index] += source.open_sum[index]
+        self.open_min[index] = np.minimum(self.open_min[index], source.open_min[index])
+        self.open_max[index] = np.maximum(self.open_max[index], source.open_max[index])
+        self.open_status[index] = np.maximum(self.open_status[index], source.open_status[index])
+        self.open_hist[index] += source.open_hist[index]
+
+    def _roll(self, rows, index, bucket):
+        """Cerrar los buckets abiertos que no corresponden a ``bucket``"""
+        rolled = (self.open_count[index] > 0) & (self.open_start[index] != bucket)
+        if rolled.all():
+            self._close(rows, index)
+        elif rolled.any():
+            self._close(rows[rolled], rows[rolled])
+        self.open_start[index] = bucket
+
+    def _close(self, rows, index):
+        starts = self.open_start[index]
+        slot = (starts // self.interval) % self.slots
+        self.start[rows, slot] = starts
+        self.count[rows, slot] = self.open_count[index]
+        self.status[rows, slot] = self.open_status[index]
+        self.stats[rows, slot] = _stats(self.open_count[index], self.open_sum[index],
+                                        self.open_min[index], self.open_max[index],
+                                        self.open_hist[index])
+        for target in self.targets:
+            target.merge(rows, index, starts)
+        self.open_count[index] = 0
+        self.open_status[index] = 0
+        self.open_sum[index] = 0.0
+        self.open_min[index] = np.inf
+        self.open_max[index] = -np.inf
+        self.open_hist[index] = 0
+
+    # ===== LECTURA =====
+
+    def _chain(self):
+        """Esta resolución y las que la alimentan, de gruesa a fina"""
+        level = self
+        while level is not None:
+            yield level
+            level = level.source
+
+    def oldest(self, last_ts):
+        """Inicio del bucket más antiguo retenido cuando el último dato es ``last_ts``"""
+        return last_ts - last_ts % self.interval - (self.slots - 1) * self.interval
+
+    def _pending(self, row):
+        """Buckets abiertos de una fila en la escala de esta resolución.
+
+        Los datos recientes siguen en los buckets abiertos de la cadena (la
+        hora en curso, el minuto en curso...); se agrupan por bucket de esta
+        resolución y se combinan. Retorna ``[(inicio, acumuladores)]``.
+        """
+        groups = {}
+        for level in self._chain():
+            if level.open_count[row] == 0:
+                continue
+            start = int(level.open_start[row])
+            start -= start % self.interval
+            parts = [level.open_count[row], level.open_sum[row].copy(), level.open_min[row].copy(),
+                     level.open_max[row].copy(), level.open_status[row], level.open_hist[row].copy()]
+            acc = groups.setdefault(start, parts)
+            if acc is not parts:
+                acc[0] += parts[0]
+                acc[1] += parts[1]
+                acc[2] = np.minimum(acc[2], parts[2])
+                acc[3] = np.maximum(acc[3], parts[3])
+                acc[4] = max(acc[4], parts[4])
+                acc[5] += parts[5]
+        return sorted(groups.items())
+
+    def read(self, row, start, end):
+        """Buckets de una fila que comienzan en [start, end], en orden.
+
+        Retorna ``(timestamps, counts, status, stats)``; los buckets aún
+        abiertos se incluyen (parciales) al final si caen en el rango.
+        """
+        first = start - start % self.interval
+        expected = np.arange(first, end + 1, self.interval, dtype=np.int64)[-self.slots:]
+        slot = (expected // self.interval) % self.slots
+        valid = (self.start[row, slot] == expected) & (self.count[row, slot] > 0)
+        pending = [(bucket, acc) for bucket, acc in self._pending(row) if first <= bucket <= end]
+        slot = slot[valid]
+        timestamps = expected[valid]
+        counts = self.count[row, slot].astype(np.int64)
+        status = self.status[row, slot]
+        stats = self.stats[row, slot].astype(np.float64)
+
+        for bucket, (count, sums, minimum, maximum, worst, hist) in pending:
+            timestamps = np.append(timestamps, bucket)
+            counts = np.append(counts, count)
+            status = np.append(status, worst)
+            stats = np.concatenate((stats, _stats(np.array([count]), sums[None], minimum[None],
+                                                  maximum[None], hist[None])))
+        return timestamps, counts, status, stats
+
+    def hourly_sums(self, lo, hi, hours_per_day):
+        """Suma y conteo de CPU por (fila, hora del día) de las filas [lo, hi);
+        requiere buckets que dividan la hora"""
+        n = hi - lo
+        hours = (self.start[lo:hi].astype(np.int64) // 3600) % hours_per_day
+        counts = self.count[lo:hi].astype(np.float64)
+        cells = (np.arange(n, dtype=np.int64)[:, None] * hours_per_day + hours).ravel()
+        size = n * hours_per_day
+        weights = (self.stats[lo:hi, :, 0, _AVG].astype(np.float64) * counts).ravel()
+        sums = np.bincount(cells, weights=weights, minlength=size)
+        totals = np.bincount(cells, weights=counts.ravel(), minlength=size)
+
+        # Buckets abiertos de la cadena (la hora y el minuto en curso)
+        for level in self._chain():
+            active = np.flatnonzero(level.open_count[lo:hi] > 0)
+            open_cells = active * hours_per_day + (level.open_start[lo + active] // 3600) % hours_per_day
+            np.add.at(sums, open_cells, level.open_sum[lo + active, 0])
+            np.add.at(totals, open_cells, level.open_count[lo + active])
+        return sums.reshape(n, hours_per_day), totals.reshape(n, hours_per_day)
+
+
+def group_rollups(starts, counts, status, stats):
+    """Combinar buckets consecutivos (``starts`` = primer bucket de cada grupo).
+
+    min/max/promedio son exactos; el p95 de un grupo de varios buckets es el
+    mayor p95 de sus buckets (cota superior del p95 real).
+    """
+    weights = stats[..., _AVG] * counts[:, None]
+    group_counts = np.add.reduceat(counts, starts)
+    grouped = {
+        'min': np.minimum.reduceat(stats[..., _MIN], starts),
+        'max': np.maximum.reduceat(stats[..., _MAX], starts),
+        'avg': np.add.reduceat(weights, starts) / group_counts[:, None],
+        'p95': np.maximum.reduceat(stats[..., _P95], starts),
+    }
+    return group_counts, np.maximum.reduceat(status, starts), grouped
@@ -0,0 +1,87 @@
+"""
+Datos sintéticos en bloque para pruebas de carga
+Genera dispositivos (como columnas), incidencias y clientes con el mismo
+vocabulario que los endpoints /api/simulate/*, de forma reproducible a
+partir de una semilla.
+"""
+
+import time
+
+import numpy as np
+
+from noc.aggregates import INCIDENT_PRIORITIES, INCIDENT_STATUSES
+from noc.analytics import RESOLVED_STATUSES
+from noc.codes import DEVICE_STATUSES, STATUS_OFFLINE
+
+DEVICE_TYPES = ('Router', 'Switch', 'Firewall', 'Access Point', 'Server')
+DEVICE_ROLES = ('Principal', 'Secundario', 'Backup')
+LOCATIONS = ('Lima Centro', 'Lima Norte', 'Lima Sur', 'Callao', 'Arequipa', 'Trujillo', 'Cusco', 'Piura')
+INCIDENT_TYPES = ('Caída de dispositivo de red', 'Alto uso de CPU', 'Memoria insuficiente',
+                  'Pérdida de paquetes', 'Falla de conectividad', 'Sobrecarga de tráfico',
+                  'Error de configuración')
+TECHNICIANS = ('Juan Pérez', 'María García', 'Carlos López', 'Ana Rodríguez', 'Luis Martínez')
+BUSINESS_NAMES = ('TechCorp', 'DataSystems', 'NetSolutions', 'CloudTech', 'InfoServices',
+                  'DigitalPro', 'CyberNet', 'SmartTech', 'ConnectPlus', 'WebMaster')
+COMPANY_TYPES = ('SAC', 'EIRL', 'SRL', 'SA')
+PLANS = ('Básico', 'Empresarial', 'Corporativo', 'Premium', 'Gubernamental')
+
+# Proporciones de estado: la mayoría en línea / resueltas, como en operación
+DEVICE_STATUS_WEIGHTS = (0.8, 0.1, 0.04, 0.06)  # en el orden de DEVICE_STATUSES
+INCIDENT_STATUS_WEIGHTS = (0.15, 0.1, 0.45, 0.3)
+INCIDENT_PRIORITY_WEIGHTS = (0.3, 0.4, 0.2, 0.1)
+
+
+def _pick(rng, values, n, weights=None):
+    return np.asarray(values, dtype=object)[rng.choice(len(values), n, p=weights)].tolist()
+
+
+def _minutes(timestamps):
+    """Segundos epoch -> 'AAAA-MM-DD HH:MM' (vectorizado)"""
+    text = np.datetime_as_string(np.asarray(timestamps, dtype='datetime64[s]').astype('datetime64[m]'),
+                                 unit='m')
+    return np.char.replace(text, 'T', ' ').tolist()
+
+
+def device_columns(n, first_id, rng):
+    """Columnas para ``FleetState.add_many`` con ids ``first_id..first_id+n-1``"""
+    ids = np.arange(first_id, first_id + n, dtype=np.int64)
+    status = rng.choice(len(DEVICE_STATUSES), n, p=DEVICE_STATUS_WEIGHTS).astype(np.uint8)
+    cpu = rng.integers(10, 96, n).astype(np.int16)
+    memory = rng.integers(20, 96, n).astype(np.int16)
+    cpu[status == STATUS_OFFLINE] = 0
+    memory[status == STATUS_OFFLINE] = 0
+    types, roles, locations = _pick(rng, DEVICE_TYPES, n), _pick(rng, DEVICE_ROLES, n), _pick(rng, LOCATIONS, n)
+    names = [f'{kind} {role} {location} {i}' for kind, role, location, i in zip(types, roles, locations, ids.tolist())]
+    ips = [f'10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}' for i in ids.tolist()]
+    return {'ids': ids, 'cpu': cpu, 'memory': memory, 'status_codes': status,
+            'names': names, 'ips': ips, 'locations': locations}
+
+
+def incidents(n, rng, days=90, now=None):
+    """``n`` incidencias sin id, creadas en los últimos ``days`` días en orden"""
+    now = int(time.time() if now is None else now)
+    created = np.sort(rng.integers(now - days * 86400, now, n))
+    statuses = _pick(rng, INCIDENT_STATUSES, n, INCIDENT_STATUS_WEIGHTS)
+    resolved = _minutes(np.minimum(created + rng.integers(600, 3 * 86400, n), now))
+    records = []
+    for title, status, priority, opened, closed, assigned in zip(
+            _pick(rng, INCIDENT_TYPES, n), statuses,
+            _pick(rng, INCIDENT_PRIORITIES, n, INCIDENT_PRIORITY_WEIGHTS),
+            _minutes(created), resolved, _pick(rng, TECHNICIANS, n)):
+        record = {'title': title, 'status': status, 'priority': priority, 'created': opened,
+                  'assigned': assigned}
+        if status in RESOLVED_STATUSES:
+            record['resolved'] = closed
+        records.append(record)
+    return records
+
+
+def customers(n, first_id, rng):
+    satisfaction = np.round(rng.uniform(3.0, 5.0, n), 1).tolist()
+    return [
+        {'id': first_id + k, 'name': f'{business} {kind}', 'plan': plan, 'status': 'active',
+         'satisfaction': score}
+        for k, (business, kind, plan, score) in enumerate(zip(
+            _pick(rng, BUSINESS_NAMES, n), _pick(rng, COMPANY_TYPES, n), _pick(rng, PLANS, n),
+            satisfaction))
+    ]
@@ -0,0 +1,59 @@
+"""
+Snapshots inmutables del estado del NOC
+Los escritores construyen la siguiente versión y la publican con una sola
+asignación; los handlers leen una versión consistente sin tomar locks
+"""
+
+import threading
+from dataclasses import dataclass, field, replace
+
+
+@dataclass(frozen=True)
+class NocSnapshot:
+    """Versión completa y consistente del estado servido por la API.
+
+    ``version`` avanza con cada publicación; cada sección tiene además su
+    propia versión para que cachés y deltas sólo se invaliden cuando esa
+    sección cambió.
+    """
+
+    version: int
+    fleet: object
+    incidents: object
+    customers: tuple
+    overview: dict = field(default_factory=dict)
+    devices_version: int = 0
+    incidents_version: int = 0
+    customers_version: int = 0
+
+
+class StateStore:
+    """Publicador de snapshots (double-buffering por referencia).
+
+    ``current`` siempre apunta a un ``NocSnapshot`` completo; la lectura de
+    un atributo es atómica, así que basta con tomarlo una vez por request.
+    Los escritores deben estar serializados entre sí (``publish`` usa su
+    propio lock para garantizar versiones estrictamente crecientes).
+    """
+
+    def __init__(self, fleet, incidents, customers, overview):
+        self._lock = threading.Lock()
+        self.current = NocSnapshot(version=1, fleet=fleet, incidents=incidents,
+                                   customers=tuple(customers), overview=overview,
+                                   devices_version=1, incidents_version=1, customers_version=1)
+
+    def publish(self, overview, fleet=None, incidents=None, customers=None):
+        """Publicar una versión nueva reemplazando sólo las secciones indicadas"""
+        with self._lock:
+            previous = self.current
+            version = previous.version + 1
+            changes = {'version': version, 'overview': overview}
+            if fleet is not None:
+                changes.update(fleet=fleet, devices_version=version)
+            if incidents is not None:
+                changes.update(incidents=incidents, incidents_version=version)
+            if customers is not None:
+                changes.update(customers=tuple(customers), customers_version=version)
+            snapshot = replace(previous, **changes)
+            self.current = snapshot
+            return snapshot
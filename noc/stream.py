@@ -0,0 +1,131 @@
+"""
+Difusión de eventos Server-Sent Events (SSE)
+Un único productor serializa cada evento una vez y todos los suscriptores
+comparten los mismos bytes
+"""
+
+import json
+import threading
+from collections import deque
+
+import numpy as np
+
+from noc.codes import DEVICE_STATUSES
+from noc.incidents import json_default
+
+
+def _encode(seq, event, data):
+    payload = json.dumps(data, separators=(',', ':'), ensure_ascii=False, default=json_default)
+    return f'id: {seq}\nevent: {event}\ndata: {payload}\n\n'.encode('utf-8')
+
+
+class EventBroadcaster:
+    """Fan-out de eventos para muchos suscriptores SSE.
+
+    Los eventos se guardan ya codificados en un buffer circular con número
+    de secuencia; cada suscriptor recuerda la última secuencia enviada y
+    espera en una condición compartida. Un suscriptor que se queda atrás más
+    allá del buffer (o tras ``invalidate``) recibe un snapshot completo.
+    """
+
+    def __init__(self, backlog=256, keepalive=15):
+        self.keepalive = keepalive
+        self._cond = threading.Condition()
+        self._events = deque(maxlen=backlog)
+        self._seq = 0
+        self._epoch = 0
+        self.subscribers = 0
+
+    def publish(self, event, data):
+        with self._cond:
+            self._seq += 1
+            self._events.append((self._seq, _encode(self._seq, event, data)))
+            self._cond.notify_all()
+
+    def invalidate(self):
+        """Forzar que todos los suscriptores reciban un snapshot nuevo"""
+        with self._cond:
+            self._epoch += 1
+            self._seq += 1
+            self._cond.notify_all()
+
+    def _pending(self, last_seq, epoch):
+        """Eventos posteriores a last_seq, o None si hace falta un snapshot"""
+        if epoch != self._epoch:
+            return None
+        if self._events and self._events[0][0] > last_seq + 1:
+            return None
+        return [payload for seq, payload in self._events if seq > last_seq]
+
+    def subscribe(self, snapshot):
+        """Generador de bytes SSE para un cliente.
+
+        ``snapshot`` es una función que retorna el estado completo; se invoca
+        al conectar y cada vez que el cliente pierde continuidad.
+        """
+        with self._cond:
+            self.subscribers += 1
+        try:
+            yield b'retry: 5000\n\n'
+            while True:
+                with self._cond:
+                    last_seq, epoch = self._seq, self._epoch
+                yield _encode(last_seq, 'snapshot', snapshot())
+
+                while True:
+                    with self._cond:
+                        self._cond.wait_for(lambda: self._seq > last_seq, timeout=self.keepalive)
+                        pending = self._pending(last_seq, epoch)
+                        current = self._seq
+                    if pending is None:
+                        break
+                    if not pending and current == last_seq:
+                        yield b': keepalive\n\n'
+                        continue
+                    last_seq = current
+                    yield b''.join(pending)
+        finally:
+            with self._cond:
+                self.subscribers -= 1
+
+
+class DeviceDeltaTracker:
+    """Calcula qué campos de la flota cambiaron desde el último snapshot publicado"""
+
+    def __init__(self, snapshot=None):
+        self._last = snapshot
+
+    def reset(self, snapshot):
+        self._last = snapshot
+
+    def delta(self, snapshot):
+        """Retornar {'changed': [...], 'added': [...]} o None si no hay cambios.
+
+        Cada elemento de ``changed`` contiene el id y sólo los campos que
+        cambiaron; ``added`` trae los dispositivos nuevos completos. Los
+        snapshots son inmutables, así que basta con conservar el anterior.
+        """
+        last, self._last = self._last, snapshot
+        known = len(last)
+        if len(snapshot) < known or not np.array_equal(snapshot.ids[:known], last.ids):
+            raise ValueError('La flota fue reemplazada; se requiere un snapshot')
+
+        cpu, memory, status = snapshot.cpu[:known], snapshot.memory[:known], snapshot.status[:known]
+        cpu_changed = cpu != last.cpu
+        memory_changed = memory != last.memory
+        status_changed = status != last.status
+        rows = np.flatnonzero(cpu_changed | memory_changed | status_changed)
+
+        changed = [{'id': device_id} for device_id in last.ids[rows].tolist()]
+        for name, mask, values in (('cpu', cpu_changed, cpu), ('memory', memory_changed, memory)):
+            for item, flag, value in zip(changed, mask[rows].tolist(), values[rows].tolist()):
+                if flag:
+                    item[name] = value
+        for item, flag, code in zip(changed, status_changed[rows].tolist(), status[rows].tolist()):
+            if flag:
+                item['status'] = DEVICE_STATUSES[code]
+
+        added = [snapshot.device(device_id) for device_id in snapshot.ids[known:].tolist()]
+        if not changed and not added:
+            return None
+        return {'changed': changed, 'added': added}
@@ -0,0 +1,380 @@
+"""
+Almacén de series temporales por dispositivo
+Buffers circulares de capacidad fija en formato columnar (struct-of-arrays),
+con rollups multi-resolución para consultas de rangos largos
+"""
+
+import threading
+
+import numpy as np
+
+from noc.codes import DEVICE_STATUSES
+from noc.rollups import METRICS, build_levels, group_rollups, histogram_bins
+
+# 2 días de muestras cada 10 segundos
+DEFAULT_CAPACITY = 2 * 24 * 3600 // 10
+
+HOURS_PER_DAY = 24
+# Muestras procesadas por bloque al calcular el perfil horario
+PROFILE_CHUNK = 4_000_000
+
+# Nombre de la resolución sin agregar en las consultas
+RAW_RESOLUTION = 'raw'
+
+
+class DeviceHistoryStore:
+    """Historial de métricas de la flota en buffers circulares NumPy.
+
+    Cada dispositivo ocupa una fila de matrices (dispositivos x capacidad):
+    timestamp (uint32, segundos epoch), cpu y memoria (float16) y código de
+    estado (uint8). Son 9 bytes por muestra, por lo que la memoria total queda
+    acotada a ``filas * capacidad * 9`` bytes sin importar el tiempo en
+    ejecución.
+
+    ``version`` avanza con cada lote que agrega muestras, lo que permite
+    memoizar cálculos derivados del historial hasta que llegan datos nuevos.
+
+    Cada muestra aceptada también se acumula en los rollups
+    (``noc.rollups``); ``query`` elige la resolución más gruesa que
+    entregue los puntos pedidos, así un rango de 30 días lee cientos de
+    buckets horarios en lugar de cientos de miles de muestras.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, initial_devices=64, rollup_intervals=None,
+                 rollup_retention=None):
+        if capacity < 1:
+            raise ValueError('capacity debe ser mayor a 0')
+        self.capacity = int(capacity)
+        self._initial_rows = max(1, int(initial_devices))
+        self.rollups = build_levels(rollup_intervals, rollup_retention, self._initial_rows)
+        self._lock = threading.Lock()
+        # Tabla id de dispositivo -> fila (-1 si no registrado); los ids del
+        # NOC son enteros secuenciales, así que la tabla se mantiene compacta
+        self._row_of = np.full(self._initial_rows + 1, -1, dtype=np.int64)
+        self._n_rows = 0
+        self._allocate(self._initial_rows)
+        self.version = 0
+
+    def clear(self):
+        """Descartar todo el historial y los rollups y liberar sus filas.
+
+        Se usa al resetear la flota: ``next_id`` reutiliza ids, así que un
+        dispositivo nuevo no debe heredar la historia del anterior.
+        """
+        with self._lock:
+            self._row_of = np.full(self._initial_rows + 1, -1, dtype=np.int64)
+            self._n_rows = 0
+            self._allocate(self._initial_rows)
+            for level in self.rollups:
+                level.reset(self._initial_rows)
+            self.version += 1
+
+    def _allocate(self, n_rows):
+        shape = (n_rows, self.capacity)
+        self._ts = np.zeros(shape, dtype=np.uint32)
+        self._cpu = np.zeros(shape, dtype=np.float16)
+        self._memory = np.zeros(shape, dtype=np.float16)
+        self._status = np.zeros(shape, dtype=np.uint8)
+        self._head = np.zeros(n_rows, dtype=np.int64)
+        self._count = np.zeros(n_rows, dtype=np.int64)
+        self._last_ts = np.zeros(n_rows, dtype=np.int64)
+
+    def _grow(self, min_rows):
+        """Ampliar el número de filas (~25%) conservando los datos existentes"""
+        old_rows = self._ts.shape[0]
+        new_rows = max(min_rows, old_rows + max(old_rows // 4, 64))
+        old = (self._ts, self._cpu, self._memory, self._status,
+               self._head, self._count, self._last_ts)
+        self._allocate(new_rows)
+        new = (self._ts, self._cpu, self._memory, self._status,
+               self._head, self._count, self._last_ts)
+        for src, dst in zip(old, new):
+            dst[:old_rows] = src
+        for level in self.rollups:
+            level.grow(new_rows)
+
+    def _rows_for(self, device_ids):
+        """Traducir ids de dispositivo a filas, registrando los nuevos"""
+        ids = np.asarray(device_ids, dtype=np.int64)
+        if ids.size and ids.min() < 0:
+            raise ValueError('Los ids de dispositivo deben ser no negativos')
+        if ids.size and ids.max() >= self._row_of.size:
+            lookup = np.full(max(int(ids.max()) + 1, self._row_of.size * 2), -1, dtype=np.int64)
+            lookup[:self._row_of.size] = self._row_of
+            self._row_of = lookup
+
+        rows = self._row_of[ids]
+        if (rows < 0).any():
+            new_ids = np.unique(ids[rows < 0])
+            n_rows = self._n_rows + new_ids.size
+            # Ampliar antes de registrar: si la asignación falla (MemoryError)
+            # la tabla de filas queda consistente con los buffers
+            if n_rows > self._ts.shape[0]:
+                self._grow(n_rows)
+            self._row_of[new_ids] = np.arange(self._n_rows, n_rows)
+            self._n_rows = n_rows
+            rows = self._row_of[ids]
+        return rows
+
+    def _row(self, device_id):
+        if 0 <= device_id < self._row_of.size and self._row_of[device_id] >= 0:
+            return int(self._row_of[device_id])
+        return None
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self._ts, self._cpu, self._memory, self._status))
+
+    @property
+    def rollup_nbytes(self):
+        return sum(level.nbytes for level in self.rollups)
+
+    @property
+    def row_nbytes(self):
+        """Bytes que ocupa cada dispositivo (muestras crudas y rollups)"""
+        return (self.nbytes + self.rollup_nbytes) // self._ts.shape[0]
+
+    def __contains__(self, device_id):
+        return self._row(device_id) is not None
+
+    def __len__(self):
+        return self._n_rows
+
+    def append_many(self, device_ids, timestamps, cpu, memory, status_codes):
+        """Agregar una muestra por elemento; retorna cuántas fueron aceptadas.
+
+        Las muestras con timestamp anterior a la última registrada para su
+        dispositivo se descartan para mantener cada buffer ordenado en el
+        tiempo (requisito de las búsquedas binarias en ``query``).
+        """
+        return int(self.accept_many(device_ids, timestamps, cpu, memory, status_codes).sum())
+
+    def accept_many(self, device_ids, timestamps, cpu, memory, status_codes):
+        """Como ``append_many``, pero retorna la máscara de las muestras
+        aceptadas (False en las descartadas por llegar fuera de orden)"""
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        cpu = np.asarray(cpu, dtype=np.float16)
+        memory = np.asarray(memory, dtype=np.float16)
+        status_codes = np.asarray(status_codes, dtype=np.uint8)
+        if timestamps.ndim == 0:
+            timestamps = np.full(len(device_ids), timestamps, dtype=np.int64)
+
+        with self._lock:
+            rows = self._rows_for(device_ids)
+            accepted = np.zeros(rows.size, dtype=bool)
+            if not rows.size:
+                return accepted
+            if np.bincount(rows).max() <= 1:
+                self._write(np.arange(rows.size), rows, timestamps, cpu, memory, status_codes, accepted)
+            else:
+                # Un dispositivo repetido en el lote se escribe por rondas de
+                # filas únicas para que cada ronda sea una asignación vectorial
+                pending = np.arange(rows.size)
+                while pending.size:
+                    _, first = np.unique(rows[pending], return_index=True)
+                    batch = pending[np.sort(first)]
+                    pending = np.setdiff1d(pending, batch, assume_unique=True)
+                    self._write(batch, rows, timestamps, cpu, memory, status_codes, accepted)
+            self.version += bool(accepted.any())
+            return accepted
+
+    def _write(self, batch, rows, timestamps, cpu, memory, status_codes, accepted):
+        r = rows[batch]
+        ts = timestamps[batch]
+        ok = (self._count[r] == 0) | (ts >= self._last_ts[r])
+        if not ok.all():
+            batch, r, ts = batch[ok], r[ok], ts[ok]
+        accepted[batch] = True
+
+        slot = self._head[r]
+        self._ts[r, slot] = ts
+        self._cpu[r, slot] = cpu[batch]
+        self._memory[r, slot] = memory[batch]
+        self._status[r, slot] = status_codes[batch]
+        self._head[r] = (slot + 1) % self.capacity
+        self._count[r] = np.minimum(self._count[r] + 1, self.capacity)
+        self._last_ts[r] = ts
+        if self.rollups and batch.size:
+            values = np.column_stack((cpu[batch], memory[batch])).astype(np.float64)
+            bins = histogram_bins(values)
+            for level in self.rollups:
+                if level.source is None:
+                    level.add(r, ts, values, status_codes[batch], bins)
+
+    def _profile_level(self):
+        """Resolución más gruesa que todavía separa las horas del día"""
+        levels = [level for level in self.rollups if 3600 % level.interval == 0]
+        return levels[-1] if levels else None
+
+    def hourly_profile(self):
+        """Perfil diario de CPU de todas las filas en una sola pasada.
+
+        Retorna ``(version, device_ids, profile, last_cpu)`` donde
+        ``profile`` es una matriz (filas x 24) con el promedio de CPU por
+        hora del día UTC (NaN en las horas sin muestras) y ``last_cpu`` es
+        la última muestra de cada fila. Si hay rollups horarios se leen
+        éstos (un bucket por hora y más días de historia) en lugar de las
+        muestras crudas.
+        """
+        with self._lock:
+            n = self._n_rows
+            level = self._profile_level()
+            sums = np.zeros((n, HOURS_PER_DAY))
+            counts = np.zeros((n, HOURS_PER_DAY))
+            # Bloques de filas para acotar la memoria temporal
+            step = max(1, PROFILE_CHUNK // (level.slots if level else self.capacity))
+            for lo in range(0, n, step):
+                hi = min(n, lo + step)
+                if level is not None:
+                    sums[lo:hi], counts[lo:hi] = level.hourly_sums(lo, hi, HOURS_PER_DAY)
+                    continue
+                ts = self._ts[lo:hi]
+                valid = ts != 0
+                cells = (np.arange(hi - lo, dtype=np.int64)[:, None] * HOURS_PER_DAY
+                         + (ts // 3600) % HOURS_PER_DAY)[valid]
+                size = (hi - lo) * HOURS_PER_DAY
+                weights = self._cpu[lo:hi][valid].astype(np.float64)
+                sums[lo:hi] = np.bincount(cells, weights=weights, minlength=size).reshape(-1, HOURS_PER_DAY)
+                counts[lo:hi] = np.bincount(cells, minlength=size).reshape(-1, HOURS_PER_DAY)
+            last_slot = (self._head[:n] - 1) % self.capacity
+            last_cpu = self._cpu[np.arange(n), last_slot].astype(np.float64)
+            known = np.flatnonzero(self._row_of >= 0)
+            device_ids = np.empty(n, dtype=np.int64)
+            device_ids[self._row_of[known]] = known
+            version = self.version
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            profile = sums / counts
+        return version, device_ids, profile, last_cpu
+
+    def _ordered(self, row):
+        """Copiar el contenido de una fila en orden cronológico"""
+        count = int(self._count[row])
+        head = int(self._head[row])
+        start = (head - count) % self.capacity
+        columns = (self._ts[row], self._cpu[row], self._memory[row], self._status[row])
+        if start + count <= self.capacity:
+            return tuple(c[start:start + count].copy() for c in columns)
+        return tuple(np.concatenate((c[start:], c[:head])) for c in columns)
+
+    def _choose_level(self, row, start, end, points):
+        """Rollup más grueso que entregue ``points`` intervalos sobre el rango
+        (None = muestras crudas)"""
+        step = (end - start + 1) / points
+        raw_covers = (self._count[row] < self.capacity
+                      or int(self._ts[row, self._head[row]]) <= start)
+        if raw_covers and (not self.rollups or step < self.rollups[0].interval):
+            return None
+        last = int(self._last_ts[row])
+        covering = [level for level in self.rollups if level.oldest(last) <= start]
+        fitting = [level for level in covering if level.interval <= step]
+        if fitting:
+            return fitting[-1]
+        if raw_covers or not self.rollups:
+            return None
+        # Ninguna resolución retiene el inicio: la que llegue más atrás
+        return covering[0] if covering else self.rollups[-1]
+
+    def query(self, device_id, start, end, points=300, resolution=None):
+        """Obtener el historial en [start, end] reducido a ``points`` intervalos.
+
+        Cada intervalo de tiempo reporta mínimo, máximo, promedio y p95 de
+        CPU y memoria, y el peor estado observado. ``resolution`` fuerza
+        'raw' o el nombre de un rollup; por defecto se elige el rollup más
+        grueso que alcance para ``points`` intervalos, o las muestras crudas
+        si ninguno alcanza. Un dispositivo sin historial produce series
+        vacías.
+        """
+        levels = {level.name: level for level in self.rollups}
+        if resolution not in (None, RAW_RESOLUTION, *levels):
+            raise ValueError(f"resolution debe ser uno de: {', '.join((RAW_RESOLUTION, *levels))}")
+        points = max(1, int(points))
+
+        level = None
+        with self._lock:
+            row = self._row(device_id)
+            if row is None:
+                ts, cpu, memory, status = (self._ts[0, :0], self._cpu[0, :0],
+                                           self._memory[0, :0], self._status[0, :0])
+            else:
+                if resolution is None:
+                    level = self._choose_level(row, start, end, points)
+                elif resolution != RAW_RESOLUTION:
+                    level = levels[resolution]
+                if level is None:
+                    ts, cpu, memory, status = self._ordered(row)
+                else:
+                    bucket_ts, counts, status, stats = level.read(row, start, end)
+
+        result = {
+            'device_id': device_id,
+            'start': int(start),
+            'end': int(end),
+            'resolution': RAW_RESOLUTION if level is None else level.name,
+        }
+        if level is not None:
+            return self._rollup_result(result, bucket_ts, counts, status, stats, start, end, points)
+
+        lo = np.searchsorted(ts, start, side='left')
+        hi = np.searchsorted(ts, end, side='right')
+        ts, status = ts[lo:hi].astype(np.int64), status[lo:hi]
+        cpu, memory = cpu[lo:hi].astype(np.float64), memory[lo:hi].astype(np.float64)
+
+        if ts.size <= points:
+            starts = np.arange(ts.size)
+            bucket_ts = ts
+        else:
+            edges = np.linspace(start, end + 1, points + 1)
+            bounds = np.searchsorted(ts, edges[:-1], side='left')
+            starts = np.unique(bounds[bounds < ts.size])
+            bucket_ts = ts[starts]
+
+        result['samples'] = int(ts.size)
+        result['timestamps'] = bucket_ts.tolist()
+        for name, values in (('cpu', cpu), ('memory', memory)):
+            if starts.size:
+                sums = np.add.reduceat(values, starts)
+                counts = np.diff(np.append(starts, values.size))
+                result[name] = {
+                    'min': np.minimum.reduceat(values, starts).round(1).tolist(),
+                    'max': np.maximum.reduceat(values, starts).round(1).tolist(),
+                    'avg': (sums / counts).round(1).tolist(),
+                    'p95': _group_p95(values, starts).round(1).tolist(),
+                }
+            else:
+                result[name] = {'min': [], 'max': [], 'avg': [], 'p95': []}
+        worst = np.maximum.reduceat(status, starts) if starts.size else status[:0]
+        result['status'] = [DEVICE_STATUSES[c] for c in worst.tolist()]
+        return result
+
+    @staticmethod
+    def _rollup_result(result, bucket_ts, counts, status, stats, start, end, points):
+        if bucket_ts.size <= points:
+            starts = np.arange(bucket_ts.size)
+        else:
+            # El primer bucket puede comenzar antes de ``start``
+            edges = np.linspace(start, end + 1, points + 1)
+            bounds = np.searchsorted(np.maximum(bucket_ts, start), edges[:-1], side='left')
+            starts = np.unique(bounds[bounds < bucket_ts.size])
+
+        result['samples'] = int(counts.sum())
+        result['timestamps'] = bucket_ts[starts].tolist()
+        if not starts.size:
+            for name in METRICS:
+                result[name] = {'min': [], 'max': [], 'avg': [], 'p95': []}
+            result['status'] = []
+            return result
+
+        _, worst, grouped = group_rollups(starts, counts, status, stats)
+        for i, name in enumerate(METRICS):
+            result[name] = {stat: values[:, i].round(1).tolist() for stat, values in grouped.items()}
+        result['status'] = [DEVICE_STATUSES[c] for c in worst.tolist()]
+        return result
+
+
+def _group_p95(values, starts):
+    """Percentil 95 (rango más cercano) de cada grupo consecutivo de ``values``"""
+    sizes = np.diff(np.append(starts, values.size))
+    groups = np.repeat(np.arange(starts.size), sizes)
+    ordered = values[np.lexsort((values, groups))]
+    return ordered[starts + np.ceil(0.95 * sizes).astype(np.int64) - 1]
@@ -4,24 +4,66 @@ WIN NOC - Sistema Simplificado
 Centro de Operaciones de Red para WIN Telecomunicaciones
 """
 
-from flask import Flask, render_template, jsonify, request, redirect, url_for, session
+from flask import Flask, Response, render_template, jsonify, request, redirect, url_for, session
+from flask.json.provider import DefaultJSONProvider
 import json
-import sqlite3
+import logging
 import os
-from datetime import datetime, timedelta
+from datetime import datetime
 import random
 import threading
 import time
+import atexit
+
+import numpy as np
+
+from noc.aggregates import INCIDENT_PRIORITIES, INCIDENT_STATUSES, DashboardAggregates
+from noc.analytics import DEFAULT_SLA_HOURS, RESOLVED_STATUSES, IncidentAnalytics
+from noc.codes import STATUS_OFFLINE, STATUS_ONLINE
+from noc.collector import DeviceCollector, make_probe
+from noc.fleet import FleetState, classify
+from noc.forecast import DEFAULT_HORIZON, MAX_HORIZON, FleetForecaster, risk_level
+from noc.httpcache import ResponseCache
+from noc.incidents import IncidentRecord, IncidentStore, InvalidQuery
+from noc.metrics import ServerMetrics
+from noc.persistence import SQLitePersistence
+from noc.profiler import SamplingProfiler
+from noc import ingest, seed
+from noc.state import StateStore
+from noc.stream import DeviceDeltaTracker, EventBroadcaster
+from noc.timeseries import DeviceHistoryStore
+
+logger = logging.getLogger(__name__)
+
+class NocJSONProvider(DefaultJSONProvider):
+    """JSON de Flask que además serializa los registros compactos de incidencias"""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, IncidentRecord):
+            return o.to_dict()
+        return DefaultJSONProvider.default(o)
 
 app = Flask(__name__)
+app.json = NocJSONProvider(app)
 app.secret_key = 'win-noc-secret-2024'
 
 # Configuración
 DATABASE = 'win_noc.db'
 app.config['DATABASE'] = DATABASE
 
+# Historial de métricas: capacidad por dispositivo (por defecto 2 días a 10 s)
+METRICS_INTERVAL = 10
+HISTORY_CAPACITY = int(os.environ.get('NOC_HISTORY_CAPACITY', 2 * 24 * 3600 // METRICS_INTERVAL))
+# Buckets retenidos por rollup (minute/hour/day/week/month); NOC_ROLLUP_RETENTION
+# acepta un JSON parcial, p. ej. '{"minute": 0}' para desactivar una resolución
+ROLLUP_RETENTION = json.loads(os.environ.get('NOC_ROLLUP_RETENTION', '{}'))
+history_store = DeviceHistoryStore(capacity=HISTORY_CAPACITY, rollup_retention=ROLLUP_RETENTION)
+# Pronóstico vectorizado sobre el historial, memoizado hasta la próxima muestra
+forecaster = FleetForecaster(history_store)
+
 # Datos simulados en memoria
-network_devices = [
+DEFAULT_DEVICES = [
     {'id': 1, 'name': 'Router Principal Lima', 'ip': '192.168.1.1', 'status': 'online', 'cpu': 45, 'memory': 67, 'location': 'Lima Centro'},
     {'id': 2, 'name': 'Switch Core Callao', 'ip': '192.168.1.2', 'status': 'online', 'cpu': 32, 'memory': 54, 'location': 'Callao'},
     {'id': 3, 'name': 'Firewall Perimetral', 'ip': '192.168.1.3', 'status': 'warning', 'cpu': 78, 'memory': 89, 'location': 'Lima Norte'},
@@ -29,35 +71,239 @@ network_devices = [
     {'id': 5, 'name': 'Switch Trujillo', 'ip': '192.168.3.1', 'status': 'online', 'cpu': 23, 'memory': 41, 'location': 'Trujillo'},
 ]
 
-incidents = [
+DEFAULT_INCIDENTS = [
     {'id': 1, 'title': 'Caída de Router Arequipa', 'status': 'open', 'priority': 'critical', 'created': '2024-12-26 10:30', 'assigned': 'Juan Pérez'},
     {'id': 2, 'title': 'Alto uso de CPU en Firewall', 'status': 'in_progress', 'priority': 'high', 'created': '2024-12-26 11:15', 'assigned': 'María García'},
     {'id': 3, 'title': 'Latencia elevada en Lima Norte', 'status': 'resolved', 'priority': 'medium', 'created': '2024-12-26 09:45', 'assigned': 'Carlos López'},
 ]
 
-customers = [
+DEFAULT_CUSTOMERS = [
     {'id': 1, 'name': 'Empresa ABC SAC', 'plan': 'Corporativo', 'status': 'active', 'satisfaction': 4.2},
     {'id': 2, 'name': 'Retail XYZ EIRL', 'plan': 'Empresarial', 'status': 'active', 'satisfaction': 4.7},
     {'id': 3, 'name': 'Gobierno Regional', 'plan': 'Gubernamental', 'status': 'active', 'satisfaction': 3.8},
 ]
 
+# Objetivos de resolución por prioridad (horas); NOC_SLA_HOURS acepta un
+# JSON parcial, p. ej. '{"critical": 2}'
+SLA_HOURS = dict(DEFAULT_SLA_HOURS, **json.loads(os.environ.get('NOC_SLA_HOURS', '{}')))
+
+# Persistencia en SQLite (NOC_PERSISTENCE=0 la desactiva); los endpoints
+# siguen leyendo de memoria y las escrituras se agrupan en un hilo aparte
+PERSISTENCE_ENABLED = os.environ.get('NOC_PERSISTENCE', '1') != '0'
+PERSIST_METRICS = os.environ.get('NOC_PERSIST_METRICS', '1') != '0'
+# Días de muestras crudas conservados en metric_samples (0 = sin depuración)
+METRIC_RETENTION_DAYS = float(os.environ.get('NOC_METRIC_RETENTION_DAYS', 7))
+persistence = None
+stored_devices, stored_incidents, stored_customers = [], [], []
+
+if PERSISTENCE_ENABLED:
+    persistence = SQLitePersistence(
+        DATABASE, metric_retention=METRIC_RETENTION_DAYS * 86400 or None).start()
+    atexit.register(persistence.close)
+    stored_devices, stored_incidents, stored_customers = persistence.load()
+    if not stored_devices:
+        persistence.replace_all(DEFAULT_DEVICES, DEFAULT_INCIDENTS, DEFAULT_CUSTOMERS)
+
+# Flota en columnas NumPy; los diccionarios se materializan al serializar
+fleet = FleetState.from_devices(stored_devices or DEFAULT_DEVICES)
+# Incidencias indexadas por estado, prioridad, asignado y fecha
+incident_store = IncidentStore(stored_incidents if stored_devices else DEFAULT_INCIDENTS)
+customers = stored_customers if stored_devices else [dict(c) for c in DEFAULT_CUSTOMERS]
+# Las filas cargadas ya están copiadas en columnas y registros compactos
+stored_devices = stored_incidents = None
+
+# Contadores incrementales del overview; las escrituras sobre los datos se
+# serializan con write_lock para que los contadores se mantengan exactos
+aggregates = DashboardAggregates()
+write_lock = threading.RLock()
+aggregates.rebuild(fleet.status, incident_store.values(), customers)
+# Buckets diarios de incidencias para /api/analytics/incidents
+incident_analytics = IncidentAnalytics(SLA_HOURS)
+incident_analytics.rebuild(incident_store.values())
+
+# Snapshots inmutables y versionados: los escritores publican la versión
+# siguiente con una sola asignación y los handlers leen state.current sin
+# tomar write_lock (nunca esperan al tick)
+state = StateStore(fleet.snapshot(), incident_store.view, customers, aggregates.overview())
+
+# Difusión SSE: un solo productor publica deltas para todos los clientes
+broadcaster = EventBroadcaster()
+device_tracker = DeviceDeltaTracker(state.current.fleet)
+
+# Respuestas serializadas y comprimidas una vez por versión del snapshot
+response_cache = ResponseCache(lambda data: app.json.response(data).get_data())
+
+# Métricas Prometheus en un puerto propio (NOC_METRICS=0 las desactiva)
+METRICS_PORT = int(os.environ.get('NOC_METRICS_PORT', 8001))
+server_metrics = ServerMetrics(enabled=os.environ.get('NOC_METRICS', '1') != '0')
+server_metrics.init_app(app)
+server_metrics.register_stats('response_cache', response_cache.stats,
+                              counters=('hits', 'misses', 'not_modified'))
+server_metrics.register_stats('stream', lambda: {'subscribers': broadcaster.subscribers})
+
+# Profiler por muestreo: encabezado X-Profile con NOC_PROFILE_TOKEN o
+# activación desde /api/admin/profiler; stacks colapsados en NOC_PROFILE_DIR
+PROFILE_TOKEN = os.environ.get('NOC_PROFILE_TOKEN')
+profiler = SamplingProfiler(
+    output_dir=os.environ.get('NOC_PROFILE_DIR', 'profiles'),
+    interval=float(os.environ.get('NOC_PROFILE_INTERVAL_MS', 5)) / 1000,
+    sample_rate=float(os.environ.get('NOC_PROFILE_SAMPLE_RATE', 0.01)),
+    token=PROFILE_TOKEN,
+)
+profiler.init_app(app)
+atexit.register(profiler.flush)
+
+def publish_changes(*sections, invalidate=False):
+    """Publicar una versión nueva del estado y difundir los cambios por SSE.
+    
+    ``sections`` indica qué partes cambiaron ('devices', 'incidents',
+    'customers'); el overview se recalcula siempre. Con ``invalidate`` los
+    clientes SSE reciben un snapshot completo en lugar de deltas.
+    """
+    with write_lock:
+        previous = state.current
+        snapshot = state.publish(
+            aggregates.overview(),
+            fleet=fleet.snapshot() if 'devices' in sections else None,
+            incidents=incident_store.view if 'incidents' in sections else None,
+            customers=customers if 'customers' in sections else None
+        )
+        if invalidate:
+            device_tracker.reset(snapshot.fleet)
+            broadcaster.invalidate()
+            return snapshot
+        
+        if 'devices' in sections:
+            try:
+                delta = device_tracker.delta(snapshot.fleet)
+            except ValueError:
+                broadcaster.invalidate()
+                delta = None
+            if delta:
+                broadcaster.publish('devices', delta)
+        
+        if snapshot.overview != previous.overview:
+            broadcaster.publish('overview', snapshot.overview)
+        return snapshot
+
+# Incidencias más recientes incluidas en el snapshot del flujo SSE
+SNAPSHOT_INCIDENTS = 100
+
+def stream_snapshot():
+    """Estado completo enviado al conectar un cliente SSE"""
+    snapshot = state.current
+    return {
+        'overview': snapshot.overview,
+        'devices': snapshot.fleet.to_dicts(),
+        'incidents': snapshot.incidents.query(sort='-id', limit=SNAPSHOT_INCIDENTS)[0]
+    }
+
+def add_device(device):
+    """Registrar un dispositivo en la flota y en los agregados"""
+    with write_lock:
+        fleet.add(device)
+        aggregates.device_added(device['status'])
+        publish_changes('devices')
+        if persistence:
+            persistence.save_device(device)
+    return device
+
+def add_incident(incident):
+    """Registrar una incidencia y actualizar los agregados"""
+    with write_lock:
+        incident_store.add(incident)
+        aggregates.incident_added(incident)
+        incident_analytics.incident_added(incident)
+        publish_changes('incidents')
+        broadcaster.publish('incident', incident)
+        if persistence:
+            persistence.save_incident(incident)
+    return incident
+
+def add_customer(customer):
+    """Registrar un cliente y actualizar los agregados"""
+    with write_lock:
+        customers.append(customer)
+        aggregates.customer_added(customer)
+        publish_changes('customers')
+        if persistence:
+            persistence.save_customer(customer)
+    return customer
+
+# Ingesta externa (/api/metrics/batch): mientras lleguen lotes la simulación
+# se detiene; vuelve INGEST_HOLD segundos después del último
+INGEST_HOLD = 3 * METRICS_INTERVAL
+INGEST_BATCH = int(os.environ.get('NOC_INGEST_BATCH', 10_000))
+INGEST_TOKEN = os.environ.get('NOC_INGEST_TOKEN')
+last_ingest = float('-inf')
+
 # Función para simular datos en tiempo real
 def update_metrics():
     while True:
-        for device in network_devices:
-            if device['status'] == 'online':
-                device['cpu'] = max(10, min(95, device['cpu'] + random.randint(-5, 5)))
-                device['memory'] = max(20, min(95, device['memory'] + random.randint(-3, 3)))
-                
-                # Cambiar estado basado en métricas
-                if device['cpu'] > 90 or device['memory'] > 90:
-                    device['status'] = 'critical'
-                elif device['cpu'] > 80 or device['memory'] > 80:
-                    device['status'] = 'warning'
-                else:
-                    device['status'] = 'online'
+        started = time.perf_counter()
+        # Un error en un tick (p. ej. MemoryError al ampliar el historial) se
+        # registra y el hilo continúa con el siguiente
+        try:
+            metrics_tick()
+        except Exception:
+            logger.exception("Error en el ciclo de actualización de métricas")
+        server_metrics.observe_tick(time.perf_counter() - started)
+        
+        time.sleep(METRICS_INTERVAL)  # Actualizar cada 10 segundos
+
+def metrics_tick():
+    with profiler.span('update_metrics'):
+        if collector is not None and collector.running:
+            # Métricas reales: el colector ya aplicó sus lecturas
+            snapshot = state.current.fleet
+        elif time.monotonic() - last_ingest < INGEST_HOLD:
+            # Métricas recibidas por /api/metrics/batch: ya están en el
+            # historial con sus propios timestamps
+            snapshot = None
+        else:
+            # Paso vectorizado sobre toda la flota (simulación)
+            with write_lock:
+                _, previous, current = fleet.tick()
+                aggregates.device_transitions(previous, current)
+                snapshot = publish_changes('devices').fleet
         
-        time.sleep(10)  # Actualizar cada 10 segundos
+        # Registrar la muestra del tick en el historial
+        if snapshot is not None:
+            now = int(time.time())
+            history_store.append_many(snapshot.ids, now, snapshot.cpu, snapshot.memory, snapshot.status)
+            if persistence and PERSIST_METRICS:
+                persistence.record_metrics(snapshot.ids, now, snapshot.cpu, snapshot.memory, snapshot.status)
+
+def apply_readings(ids, cpu, memory, reachable):
+    """Aplicar un lote de lecturas del colector y publicarlo"""
+    with write_lock:
+        _, previous, current = fleet.apply(ids, cpu, memory, reachable)
+        aggregates.device_transitions(previous, current)
+        publish_changes('devices')
+
+def collector_targets():
+    snapshot = state.current.fleet
+    return snapshot.ids, snapshot.ips
+
+# Colector de telemetría (NOC_COLLECTOR=1): sondea la IP de cada dispositivo
+# con NOC_COLLECTOR_PROBE (agent, tcp o icmp) en lugar de simular; si no
+# puede iniciar, update_metrics sigue con la simulación
+collector = None
+if os.environ.get('NOC_COLLECTOR', '0') == '1':
+    collector = DeviceCollector(
+        make_probe(os.environ.get('NOC_COLLECTOR_PROBE', 'agent'),
+                   port=int(os.environ.get('NOC_COLLECTOR_PORT', 0)) or None,
+                   agent=os.environ.get('NOC_COLLECTOR_AGENT')),
+        apply_readings, collector_targets,
+        interval=float(os.environ.get('NOC_COLLECTOR_INTERVAL', METRICS_INTERVAL)),
+        concurrency=int(os.environ.get('NOC_COLLECTOR_CONCURRENCY', 1000)),
+        timeout=float(os.environ.get('NOC_COLLECTOR_TIMEOUT', 2.0)),
+        flush_interval=float(os.environ.get('NOC_COLLECTOR_FLUSH_MS', 1000)) / 1000,
+    ).start()
+    atexit.register(collector.stop)
+    server_metrics.register_stats('collector', collector.stats,
+                                  counters=('polls', 'failures', 'timeouts', 'batches', 'sink_errors',
+                                            'probe_errors'))
 
 # Iniciar hilo para actualización de métricas
 metrics_thread = threading.Thread(target=update_metrics, daemon=True)
@@ -86,95 +332,209 @@ def api_login():
         return jsonify({'success': False, 'message': 'Credenciales inválidas'}), 401
 
 @app.route('/api/dashboard/overview')
+@profiler.timed('dashboard_overview')
 def dashboard_overview():
-    online_devices = len([d for d in network_devices if d['status'] == 'online'])
-    total_devices = len(network_devices)
-    open_incidents = len([i for i in incidents if i['status'] == 'open'])
-    avg_satisfaction = sum([c['satisfaction'] for c in customers]) / len(customers)
-    
-    return jsonify({
-        'devices_online': online_devices,
-        'devices_total': total_devices,
-        'availability': round((online_devices / total_devices) * 100, 1),
-        'open_incidents': open_incidents,
-        'avg_satisfaction': round(avg_satisfaction, 1),
-        'network_health': 'Good' if online_devices > total_devices * 0.8 else 'Warning'
-    })
+    snapshot = state.current
+    return response_cache.respond('overview', snapshot.version, lambda: snapshot.overview)
+
+@app.route('/api/stream')
+def api_stream():
+    """Flujo SSE: snapshot inicial y luego sólo deltas"""
+    return Response(
+        broadcaster.subscribe(stream_snapshot),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 @app.route('/api/devices')
 def api_devices():
-    return jsonify(network_devices)
+    snapshot = state.current
+    return response_cache.respond('devices', snapshot.devices_version, snapshot.fleet.to_dicts)
+
+@app.route('/api/devices/<int:device_id>/history')
+def device_history(device_id):
+    """Historial de métricas de un dispositivo, reducido a `points` intervalos.
+    
+    La resolución (muestras crudas o rollup) se elige según el rango, salvo
+    que se indique `resolution`.
+    """
+    if device_id not in state.current.fleet:
+        return jsonify({'error': 'Dispositivo no encontrado'}), 404
+    
+    now = int(time.time())
+    try:
+        end = int(request.args.get('end', now))
+        start = int(request.args.get('start', end - 24 * 3600))
+        points = min(int(request.args.get('points', 300)), 5000)
+    except ValueError:
+        return jsonify({'error': 'start, end y points deben ser enteros'}), 400
+    
+    if start > end or points < 1:
+        return jsonify({'error': 'Rango de tiempo inválido'}), 400
+    
+    try:
+        history = history_store.query(device_id, start, end, points, request.args.get('resolution'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(history)
 
 @app.route('/api/incidents')
 def api_incidents():
-    return jsonify(incidents)
+    """Listar incidencias con filtros, orden y paginación por cursor.
+    
+    Sin parámetros retorna todas las incidencias ordenadas por id. El cursor
+    de la página siguiente se envía en el header X-Next-Cursor.
+    """
+    args = request.args
+    try:
+        limit = int(args['limit']) if 'limit' in args else None
+        page, next_cursor = state.current.incidents.query(
+            status=args.get('status'),
+            priority=args.get('priority'),
+            assigned=args.get('assigned'),
+            created_from=args.get('created_from'),
+            created_to=args.get('created_to'),
+            sort=args.get('sort', 'id'),
+            limit=limit,
+            cursor=args.get('cursor')
+        )
+    except ValueError as e:
+        message = str(e) if isinstance(e, InvalidQuery) else 'limit debe ser un entero'
+        return jsonify({'error': message}), 400
+    
+    response = jsonify(page)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+@app.route('/api/incidents/<int:incident_id>')
+def get_incident(incident_id):
+    incident = state.current.incidents.get(incident_id)
+    if incident is None:
+        return jsonify({'error': 'Incidencia no encontrada'}), 404
+    return jsonify(incident)
 
 @app.route('/api/customers')
 def api_customers():
-    return jsonify(customers)
+    snapshot = state.current
+    return response_cache.respond('customers', snapshot.customers_version,
+                                  lambda: list(snapshot.customers))
 
 @app.route('/api/incidents', methods=['POST'])
 def create_incident():
-    data = request.get_json()
+    data = request.get_json() or {}
+    status = data.get('status', 'open')
+    priority = data.get('priority', 'medium')
+    # Los agregados sólo cuentan los valores conocidos
+    if status not in INCIDENT_STATUSES:
+        return jsonify({'success': False, 'message': 'Estado de incidencia inválido'}), 400
+    if priority not in INCIDENT_PRIORITIES:
+        return jsonify({'success': False, 'message': 'Prioridad de incidencia inválida'}), 400
+    
+    now = datetime.now().strftime('%Y-%m-%d %H:%M')
     new_incident = {
-        'id': len(incidents) + 1,
         'title': data.get('title'),
-        'status': 'open',
-        'priority': data.get('priority', 'medium'),
-        'created': datetime.now().strftime('%Y-%m-%d %H:%M'),
+        'status': status,
+        'priority': priority,
+        'created': now,
         'assigned': data.get('assigned', 'Sin asignar')
     }
-    incidents.append(new_incident)
+    if status in RESOLVED_STATUSES:
+        new_incident['resolved'] = now
+    add_incident(new_incident)
     return jsonify({'success': True, 'incident': new_incident})
 
+@app.route('/api/incidents/<int:incident_id>', methods=['PATCH'])
+def update_incident(incident_id):
+    """Actualizar estado, prioridad o asignación de una incidencia"""
+    data = request.get_json() or {}
+    if 'status' in data and data['status'] not in INCIDENT_STATUSES:
+        return jsonify({'success': False, 'message': 'Estado de incidencia inválido'}), 400
+    if 'priority' in data and data['priority'] not in INCIDENT_PRIORITIES:
+        return jsonify({'success': False, 'message': 'Prioridad de incidencia inválida'}), 400
+    
+    changes = {field: data[field] for field in ('status', 'priority', 'assigned') if field in data}
+    with write_lock:
+        current = incident_store.get(incident_id)
+        if current is None:
+            return jsonify({'success': False, 'message': 'Incidencia no encontrada'}), 404
+        
+        # Registrar el momento de resolución (y limpiarlo si se reabre)
+        was_resolved = current['status'] in RESOLVED_STATUSES
+        is_resolved = changes.get('status', current['status']) in RESOLVED_STATUSES
+        if is_resolved and not was_resolved:
+            changes['resolved'] = datetime.now().strftime('%Y-%m-%d %H:%M')
+        elif was_resolved and not is_resolved and current.get('resolved'):
+            changes['resolved'] = None
+        
+        before, incident = incident_store.update(incident_id, changes)
+        aggregates.incident_updated(before, incident)
+        incident_analytics.incident_updated(before, incident)
+        publish_changes('incidents')
+        broadcaster.publish('incident', incident)
+        if persistence:
+            persistence.save_incident(incident)
+    return jsonify({'success': True, 'incident': incident})
+
 @app.route('/api/predict/network')
+@profiler.timed('predict_network')
 def predict_network():
-    # Simulación de predicción con IA
-    predictions = []
-    for device in network_devices:
-        if device['status'] == 'online':
-            # Simular predicción de CPU para las próximas 24 horas
-            future_cpu = []
-            current_cpu = device['cpu']
-            for hour in range(24):
-                # Simular patrón diario con algo de ruido
-                base_pattern = 50 + 20 * abs(((hour - 12) / 12))  # Patrón en U
-                noise = random.randint(-10, 10)
-                predicted_cpu = max(10, min(95, base_pattern + noise))
-                future_cpu.append(predicted_cpu)
-            
-            predictions.append({
-                'device_id': device['id'],
-                'device_name': device['name'],
-                'current_cpu': current_cpu,
-                'predicted_cpu': future_cpu,
-                'risk_level': 'high' if max(future_cpu) > 85 else 'medium' if max(future_cpu) > 70 else 'low'
-            })
+    """Pronóstico de CPU por hora de los dispositivos en línea.
+    
+    Parámetros opcionales: ``device_id`` (un solo dispositivo, cualquiera
+    sea su estado), ``horizon`` en horas (1 a 168, por defecto 24) y
+    ``limit`` (máximo de dispositivos, en el orden de la flota).
+    """
+    snapshot = state.current.fleet
+    args = request.args
+    try:
+        horizon = int(args.get('horizon', DEFAULT_HORIZON))
+        limit = int(args['limit']) if 'limit' in args else None
+        device_id = int(args['device_id']) if 'device_id' in args else None
+    except ValueError:
+        return jsonify({'error': 'device_id, horizon y limit deben ser enteros'}), 400
+    if not 1 <= horizon <= MAX_HORIZON:
+        return jsonify({'error': f'horizon debe estar entre 1 y {MAX_HORIZON}'}), 400
+    if limit is not None and limit < 1:
+        return jsonify({'error': 'limit debe ser mayor a 0'}), 400
+    
+    if device_id is not None:
+        row = snapshot.row(device_id)
+        if row is None:
+            return jsonify({'error': 'Dispositivo no encontrado'}), 404
+        rows = [row]
+    else:
+        rows = np.flatnonzero(snapshot.status == STATUS_ONLINE)[:limit].tolist()
+    
+    ids = snapshot.ids[rows].tolist()
+    current = snapshot.cpu[rows].tolist()
+    with profiler.span('forecast'):
+        forecast = forecaster.predict(ids, horizon)
+    predictions = [
+        {
+            'device_id': device_id,
+            'device_name': snapshot.names[row],
+            'current_cpu': cpu,
+            'predicted_cpu': predicted,
+            'risk_level': risk_level(max(predicted))
+        }
+        for device_id, row, cpu, predicted in zip(ids, rows, current, forecast.tolist())
+    ]
     
     return jsonify({'predictions': predictions})
 
 @app.route('/api/analytics/incidents')
 def analytics_incidents():
-    # Simular datos de análisis de incidencias
-    last_30_days = []
-    for i in range(30):
-        date = (datetime.now() - timedelta(days=i)).strftime('%Y-%m-%d')
-        incidents_count = random.randint(0, 5)
-        last_30_days.append({'date': date, 'incidents': incidents_count})
-    
-    return jsonify({
-        'daily_incidents': last_30_days,
-        'by_priority': {
-            'critical': random.randint(5, 15),
-            'high': random.randint(10, 25),
-            'medium': random.randint(20, 40),
-            'low': random.randint(15, 30)
-        },
-        'resolution_time': {
-            'avg_hours': round(random.uniform(2.5, 8.5), 1),
-            'sla_compliance': round(random.uniform(85, 95), 1)
-        }
-    })
+    """Incidencias por día y prioridad, tiempos de resolución y cumplimiento
+    de SLA para los últimos ``days`` días (1 a 365, por defecto 30)"""
+    try:
+        days = int(request.args.get('days', 30))
+    except ValueError:
+        return jsonify({'error': 'days debe ser un entero'}), 400
+    try:
+        return jsonify(incident_analytics.report(days))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
 # Endpoints para simulación y testing
 @app.route('/api/simulate/add-device', methods=['POST'])
@@ -184,7 +544,7 @@ def simulate_add_device():
     locations = ['Lima Centro', 'Lima Norte', 'Lima Sur', 'Callao', 'Arequipa', 'Trujillo', 'Cusco', 'Piura']
     
     new_device = {
-        'id': len(network_devices) + 1,
+        'id': fleet.next_id(),
         'name': f"{random.choice(device_types)} {random.choice(['Principal', 'Secundario', 'Backup'])} {random.choice(locations)}",
         'ip': f"192.168.{random.randint(1, 10)}.{random.randint(1, 254)}",
         'status': random.choice(['online', 'warning', 'offline']),
@@ -193,7 +553,7 @@ def simulate_add_device():
         'location': random.choice(locations)
     }
     
-    network_devices.append(new_device)
+    add_device(new_device)
     return jsonify({'success': True, 'device': new_device, 'message': 'Dispositivo agregado exitosamente'})
 
 @app.route('/api/simulate/add-incident', methods=['POST'])
@@ -214,7 +574,6 @@ def simulate_add_incident():
     technicians = ['Juan Pérez', 'María García', 'Carlos López', 'Ana Rodríguez', 'Luis Martínez']
     
     new_incident = {
-        'id': len(incidents) + 1,
         'title': random.choice(incident_types),
         'status': 'open',
         'priority': random.choice(priorities),
@@ -222,7 +581,7 @@ def simulate_add_incident():
         'assigned': random.choice(technicians)
     }
     
-    incidents.append(new_incident)
+    add_incident(new_incident)
     return jsonify({'success': True, 'incident': new_incident, 'message': 'Incidencia agregada exitosamente'})
 
 @app.route('/api/simulate/add-customer', methods=['POST'])
@@ -243,7 +602,7 @@ def simulate_add_customer():
         'satisfaction': round(random.uniform(3.0, 5.0), 1)
     }
     
-    customers.append(new_customer)
+    add_customer(new_customer)
     return jsonify({'success': True, 'customer': new_customer, 'message': 'Cliente agregado exitosamente'})
 
 @app.route('/api/simulate/generate-load', methods=['POST'])
@@ -261,6 +620,7 @@ def simulate_generate_load():
     for _ in range(4):
         simulate_add_customer()
     
+    snapshot = state.current
     return jsonify({
         'success': True,
         'message': 'Carga de datos simulados generada exitosamente',
@@ -268,48 +628,225 @@ def simulate_generate_load():
             'devices_added': 5,
             'incidents_added': 3,
             'customers_added': 4,
-            'total_devices': len(network_devices),
-            'total_incidents': len(incidents),
-            'total_customers': len(customers)
+            'total_devices': len(snapshot.fleet),
+            'total_incidents': len(snapshot.incidents),
+            'total_customers': len(snapshot.customers)
+        }
+    })
+
+def apply_samples(columns):
+    """Aplicar un lote validado de muestras (ordenado por timestamp).
+    
+    Las muestras van al historial y el estado actual toma la última de cada
+    dispositivo. Retorna ``(unknown, stale)``: posiciones de las muestras de
+    dispositivos desconocidos y de las anteriores a la última registrada
+    para su dispositivo (fuera de orden); ninguna se aplica ni se persiste.
+    """
+    known = state.current.fleet.rows(columns['ids']) >= 0
+    positions, ids, timestamps, cpu, memory, reachable = (
+        columns[name][known] for name in ('positions', 'ids', 'timestamps', 'cpu', 'memory', 'reachable'))
+    stale = positions[:0]
+    if ids.size:
+        status = np.where(reachable, classify(cpu, memory), STATUS_OFFLINE).astype(np.uint8)
+        in_order = history_store.accept_many(ids, timestamps, cpu, memory, status)
+        if not in_order.all():
+            stale = positions[~in_order]
+            ids, timestamps, cpu, memory, reachable, status = (
+                column[in_order] for column in (ids, timestamps, cpu, memory, reachable, status))
+    if ids.size:
+        _, last = np.unique(ids[::-1], return_index=True)
+        last = ids.size - 1 - last
+        with write_lock:
+            _, previous, current = fleet.apply(ids[last], cpu[last], memory[last], reachable[last])
+            aggregates.device_transitions(previous, current)
+        if persistence and PERSIST_METRICS:
+            persistence.record_metrics(ids, timestamps, cpu, memory, status)
+    return columns['positions'][~known], stale
+
+@app.route('/api/metrics/batch', methods=['POST'])
+def ingest_metrics_batch():
+    """Muestras de métricas en NDJSON o MessagePack (ver ``noc.ingest``).
+    
+    El cuerpo se decodifica en streaming y se aplica en lotes de
+    INGEST_BATCH muestras; el estado se publica una vez al final. Con
+    NOC_INGEST_TOKEN definido se exige el encabezado X-Ingest-Token.
+    """
+    global last_ingest
+    if INGEST_TOKEN is not None and request.headers.get('X-Ingest-Token') != INGEST_TOKEN:
+        return jsonify({'success': False, 'message': 'No autorizado'}), 401
+    decoder = ingest.decoder_for(request.mimetype)
+    if decoder is None:
+        return jsonify({
+            'success': False,
+            'message': f'Content-Type no soportado: {request.mimetype or "(ninguno)"}',
+            'supported': ingest.supported_types()
+        }), 415
+    
+    started = time.perf_counter()
+    batcher = ingest.SampleBatcher(INGEST_BATCH)
+    accepted = batches = 0
+    error = None
+    
+    def apply(columns):
+        nonlocal accepted, batches
+        unknown, stale = apply_samples(columns)
+        batcher.reject_many(unknown, 'Dispositivo desconocido')
+        batcher.reject_many(stale, 'Timestamp anterior a la última muestra del dispositivo')
+        accepted += len(columns['ids']) - len(unknown) - len(stale)
+        batches += 1
+    
+    try:
+        for columns in batcher.batches(decoder(request.stream)):
+            apply(columns)
+    except ingest.IngestError as e:
+        error = str(e)
+        # Las muestras válidas previas al error también se aplican
+        if len(batcher):
+            apply(batcher.take())
+    if accepted:
+        last_ingest = time.monotonic()
+        publish_changes('devices')
+    
+    return jsonify({
+        'success': error is None,
+        'message': error or 'Lote procesado',
+        'accepted': accepted,
+        'rejected': batcher.rejected,
+        'batches': batches,
+        'errors': batcher.errors,
+        'seconds': round(time.perf_counter() - started, 3)
+    }), 400 if error else 200
+
+# Límite de la carga masiva por request (NOC_SEED_MAX)
+SEED_MAX = int(os.environ.get('NOC_SEED_MAX', 2_000_000))
+# Memoria máxima del historial de métricas (NOC_HISTORY_BUDGET_MB): cada
+# dispositivo ocupa HISTORY_CAPACITY muestras más sus rollups, así que la
+# carga masiva se rechaza si la flota resultante no cabe
+HISTORY_BUDGET = int(os.environ.get('NOC_HISTORY_BUDGET_MB', 8192)) * 1024 * 1024
+
+@app.route('/api/simulate/bulk-seed', methods=['POST'])
+def simulate_bulk_seed():
+    """Agregar en bloque ``devices``, ``incidents`` y ``customers`` sintéticos
+    (reproducibles con ``seed``) publicando una sola versión nueva.
+    
+    Pensado para pruebas de carga: sólo se persiste con ``persist: true``.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        counts = {name: int(data.get(name, 0)) for name in ('devices', 'incidents', 'customers')}
+        rng = np.random.default_rng(int(data['seed']) if 'seed' in data else None)
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'devices, incidents, customers y seed deben ser enteros'}), 400
+    if any(not 0 <= count <= SEED_MAX for count in counts.values()):
+        return jsonify({'success': False, 'message': f'Las cantidades deben estar entre 0 y {SEED_MAX}'}), 400
+    history_bytes = (len(state.current.fleet) + counts['devices']) * history_store.row_nbytes
+    if counts['devices'] and history_bytes > HISTORY_BUDGET:
+        return jsonify({
+            'success': False,
+            'message': (f'El historial de {counts["devices"]} dispositivos más la flota actual requiere '
+                        f'{history_bytes // 2**20} MB y supera NOC_HISTORY_BUDGET_MB '
+                        f'({HISTORY_BUDGET // 2**20} MB)')
+        }), 400
+    
+    started = time.perf_counter()
+    with write_lock:
+        first_device = fleet.next_id()
+        if counts['devices']:
+            fleet.add_many(**seed.device_columns(counts['devices'], first_device, rng))
+        new_incidents = seed.incidents(counts['incidents'], rng) if counts['incidents'] else []
+        if new_incidents:
+            incident_store.add_many(new_incidents)
+        new_customers = seed.customers(counts['customers'], len(customers) + 1, rng)
+        customers.extend(new_customers)
+        aggregates.rebuild(fleet.status, incident_store.values(), customers)
+        incident_analytics.rebuild(incident_store.values())
+        snapshot = publish_changes('devices', 'incidents', 'customers', invalidate=True)
+        if persistence and data.get('persist'):
+            persistence.replace_all(snapshot.fleet.to_dicts(), incident_store.values(), customers)
+    
+    return jsonify({
+        'success': True,
+        'message': 'Carga masiva generada exitosamente',
+        'seconds': round(time.perf_counter() - started, 3),
+        'summary': {
+            'devices_added': counts['devices'],
+            'incidents_added': counts['incidents'],
+            'customers_added': counts['customers'],
+            'total_devices': len(snapshot.fleet),
+            'total_incidents': len(snapshot.incidents),
+            'total_customers': len(snapshot.customers)
         }
     })
 
 @app.route('/api/simulate/reset-data', methods=['POST'])
 def simulate_reset_data():
     """Resetear datos a valores iniciales"""
-    global network_devices, incidents, customers
-    
-    # Restaurar datos iniciales
-    network_devices = [
-        {'id': 1, 'name': 'Router Principal Lima', 'ip': '192.168.1.1', 'status': 'online', 'cpu': 45, 'memory': 67, 'location': 'Lima Centro'},
-        {'id': 2, 'name': 'Switch Core Callao', 'ip': '192.168.1.2', 'status': 'online', 'cpu': 32, 'memory': 54, 'location': 'Callao'},
-        {'id': 3, 'name': 'Firewall Perimetral', 'ip': '192.168.1.3', 'status': 'warning', 'cpu': 78, 'memory': 89, 'location': 'Lima Norte'},
-        {'id': 4, 'name': 'Router Arequipa', 'ip': '192.168.2.1', 'status': 'offline', 'cpu': 0, 'memory': 0, 'location': 'Arequipa'},
-        {'id': 5, 'name': 'Switch Trujillo', 'ip': '192.168.3.1', 'status': 'online', 'cpu': 23, 'memory': 41, 'location': 'Trujillo'},
-    ]
-    
-    incidents = [
-        {'id': 1, 'title': 'Caída de Router Arequipa', 'status': 'open', 'priority': 'critical', 'created': '2024-12-26 10:30', 'assigned': 'Juan Pérez'},
-        {'id': 2, 'title': 'Alto uso de CPU en Firewall', 'status': 'in_progress', 'priority': 'high', 'created': '2024-12-26 11:15', 'assigned': 'María García'},
-        {'id': 3, 'title': 'Latencia elevada en Lima Norte', 'status': 'resolved', 'priority': 'medium', 'created': '2024-12-26 09:45', 'assigned': 'Carlos López'},
-    ]
-    
-    customers = [
-        {'id': 1, 'name': 'Empresa ABC SAC', 'plan': 'Corporativo', 'status': 'active', 'satisfaction': 4.2},
-        {'id': 2, 'name': 'Retail XYZ EIRL', 'plan': 'Empresarial', 'status': 'active', 'satisfaction': 4.7},
-        {'id': 3, 'name': 'Gobierno Regional', 'plan': 'Gubernamental', 'status': 'active', 'satisfaction': 3.8},
-    ]
+    # Restaurar datos iniciales y publicarlos como una sola versión nueva
+    with write_lock:
+        fleet.reset(DEFAULT_DEVICES)
+        # Los ids se reutilizan: la historia de la flota anterior no aplica
+        history_store.clear()
+        incident_store.reset(DEFAULT_INCIDENTS)
+        customers[:] = [dict(c) for c in DEFAULT_CUSTOMERS]
+        aggregates.rebuild(fleet.status, incident_store.values(), customers)
+        incident_analytics.rebuild(incident_store.values())
+        snapshot = publish_changes('devices', 'incidents', 'customers', invalidate=True)
+        if persistence:
+            persistence.replace_all(DEFAULT_DEVICES, DEFAULT_INCIDENTS, customers)
     
     return jsonify({
         'success': True,
         'message': 'Datos reseteados a valores iniciales',
         'summary': {
-            'total_devices': len(network_devices),
-            'total_incidents': len(incidents),
-            'total_customers': len(customers)
+            'total_devices': len(snapshot.fleet),
+            'total_incidents': len(snapshot.incidents),
+            'total_customers': len(snapshot.customers)
         }
     })
 
+# Administración del profiler y del colector (sesión de administrador o
+# X-Profile-Token)
+def admin_authorized():
+    user = session.get('user') or {}
+    token = request.headers.get('X-Profile-Token')
+    return user.get('role') == 'admin' or (PROFILE_TOKEN is not None and token == PROFILE_TOKEN)
+
+@app.route('/api/admin/profiler', methods=['GET', 'POST', 'DELETE'])
+def admin_profiler():
+    """Estado del profiler; POST {enabled, sample_rate, flush} lo configura y
+    DELETE descarta las muestras acumuladas"""
+    if not admin_authorized():
+        return jsonify({'error': 'No autorizado'}), 403
+    if request.method == 'DELETE':
+        profiler.reset()
+    elif request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        try:
+            profiler.configure(data.get('enabled'), data.get('sample_rate'))
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
+        if data.get('flush'):
+            return jsonify(dict(profiler.status(), written=profiler.flush()))
+    return jsonify(profiler.status())
+
+@app.route('/api/admin/profiler/stacks')
+def admin_profiler_stacks():
+    """Stacks colapsados (flamegraph.pl / speedscope); ``endpoint`` filtra,
+    p. ej. ``GET:/api/devices``"""
+    if not admin_authorized():
+        return jsonify({'error': 'No autorizado'}), 403
+    return Response(profiler.collapsed(request.args.get('endpoint')), mimetype='text/plain')
+
+@app.route('/api/admin/collector')
+def admin_collector():
+    """Estado del colector de telemetría (sondeos, fallas, latencia de planificación)"""
+    if not admin_authorized():
+        return jsonify({'error': 'No autorizado'}), 403
+    if collector is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(collector.stats(), enabled=True, probe=collector.probe.name,
+                        interval=collector.interval))
+
 if __name__ == '__main__':
     # Crear directorio de templates si no existe
     os.makedirs('templates', exist_ok=True)
@@ -325,4 +862,12 @@ if __name__ == '__main__':
     
     # Configuración para producción en Render
     debug_mode = os.environ.get('FLASK_ENV') != 'production'
+    
+    # Con el reloader de debug el exportador corre sólo en el proceso hijo
+    if not debug_mode or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        try:
+            if server_metrics.serve(METRICS_PORT):
+                print(f"📈 Métricas Prometheus en puerto: {METRICS_PORT}")
+        except OSError as e:
+            print(f"⚠️  No se pudo abrir el puerto de métricas {METRICS_PORT}: {e}")
     app.run(debug=debug_mode, host='0.0.0.0', port=port)
\ No newline at end of file